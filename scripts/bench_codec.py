@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vfactory.common import CODECS, decode_payload, json_dumps, now_ts  # noqa: E402
+
+
+SAMPLES = {
+    "telemetry": {
+        "device_id": "robot_arm",
+        "device_type": "robot_arm",
+        "sensor": "temperature",
+        "unit": "C",
+        "value": 48.37,
+        "seq": 18231,
+        "ts": now_ts(),
+    },
+    "alarm": {
+        "device_id": "press",
+        "device_type": "press",
+        "sensor": "pressure",
+        "unit": "bar",
+        "value": 153.2,
+        "limit": 150.0,
+        "alarm_type": "high",
+        "severity": "warning",
+        "ts": now_ts(),
+    },
+    "state": {"device_id": "conveyor", "device_type": "conveyor", "state": "running", "ts": now_ts()},
+    "frame": {
+        "device_id": "robot_arm",
+        "device_type": "robot_arm",
+        "seq": 912,
+        "ts": now_ts(),
+        "sensors": {
+            "temperature": {"value": 48.37, "unit": "C"},
+            "vibration": {"value": 1.61, "unit": "mm/s"},
+            "current": {"value": 12.4, "unit": "A"},
+            "torque": {"value": 35.9, "unit": "Nm"},
+        },
+    },
+}
+
+
+def rate(func, payload, seconds: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(1000):
+            func(payload)
+        count += 1000
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def legacy_decode(raw: bytes) -> dict:
+    return json.loads(raw.decode("utf-8"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare JSON and binary payload codecs")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time budget per measurement")
+    args = parser.parse_args()
+
+    print(f"{'payload':<10} {'codec':<8} {'bytes':>6} {'encode/s':>12} {'decode/s':>12}")
+    for name, payload in SAMPLES.items():
+        legacy = json_dumps(payload).encode("utf-8")
+        encode_rate = rate(json_dumps, payload, args.seconds)
+        decode_rate = rate(legacy_decode, legacy, args.seconds)
+        print(f"{name:<10} {'json':<8} {len(legacy):>6} {encode_rate:>12,.0f} {decode_rate:>12,.0f}")
+
+        codec = CODECS["binary"]
+        encoded = codec.encode(payload)
+        if decode_payload(encoded) != payload:
+            raise SystemExit(f"binary round trip mismatch for {name}")
+        encode_rate = rate(codec.encode, payload, args.seconds)
+        decode_rate = rate(decode_payload, encoded, args.seconds)
+        print(f"{name:<10} {'binary':<8} {len(encoded):>6} {encode_rate:>12,.0f} {decode_rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
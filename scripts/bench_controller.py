@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vfactory.common import (  # noqa: E402
+    QOS_ALARM,
+    QOS_STATUS,
+    connect,
+    create_client,
+    decode_payload,
+    encode_payload,
+    epoch_ns,
+    topic,
+)
+from vfactory.device import alarm_payload, status_payload  # noqa: E402
+from vfactory.mqtt_asyncio import AsyncioMQTT  # noqa: E402
+
+
+SENSOR = {"name": "temperature", "unit": "C"}
+ALARM = {"limit": 65.0, "type": "high"}
+
+
+class CommandLog:
+    """Commands seen per device, checked for loss, duplicates and per-device ordering by the alarm's ts_ns."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.members: set[str] = set()
+        self.last_ns: dict[str, int] = {}
+        self.last_seen = 0.0
+
+    def on_message(self, _client, _userdata, msg) -> None:
+        payload = decode_payload(msg.payload)
+        device_id = payload["device_id"]
+        alarm_ns = payload.get("alarm_ts_ns", 0)
+        previous = self.last_ns.get(device_id, 0)
+        if alarm_ns == previous:
+            self.duplicates += 1
+        elif alarm_ns < previous:
+            self.reordered += 1
+        else:
+            self.last_ns[device_id] = alarm_ns
+        self.members.add(payload.get("member", "controller"))
+        self.count += 1
+        self.last_seen = time.monotonic()
+
+
+async def connected(loop: asyncio.AbstractEventLoop, mqtt_loop: AsyncioMQTT, client_id: str):
+    client = create_client(client_id=client_id, clean_session=True)
+    future = loop.create_future()
+    client.on_connect = lambda _c, _u, _f, rc: future.done() or future.set_result(rc)
+    mqtt_loop.attach(client)
+    connect(client)
+    if await future != 0:
+        raise SystemExit(f"{client_id} could not connect")
+    return client
+
+
+async def measure(args: argparse.Namespace, workers: int) -> dict:
+    command = [
+        sys.executable,
+        "-m",
+        "vfactory.controller",
+        "--workers",
+        str(workers),
+        "--command-retry",
+        "0",
+        "--report-interval",
+        "0",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    loop = asyncio.get_running_loop()
+    mqtt_loop = AsyncioMQTT(loop, read_batch=256)
+    try:
+        commands = CommandLog()
+        subscriber = await connected(loop, mqtt_loop, "bench-commands")
+        subscriber.on_message = commands.on_message
+        subscriber.subscribe(topic("commands/controller/#"), qos=1)
+        devices = [await connected(loop, mqtt_loop, f"bench-{index:04d}") for index in range(args.devices)]
+        # Pool members find devices through their retained status, as they would for a real fleet.
+        for index, client in enumerate(devices):
+            status_topic = topic(f"status/bench-{index:04d}")
+            online = encode_payload(status_topic, status_payload(f"bench-{index:04d}", "online"))
+            client.publish(status_topic, online, qos=QOS_STATUS, retain=True)
+        await asyncio.sleep(args.settle + workers * 0.5)
+
+        started = time.monotonic()
+        for seq in range(args.alarms):
+            index = seq % args.devices
+            device_id = f"bench-{index:04d}"
+            alarm_topic = topic(f"alarms/{device_id}/temperature")
+            payload = alarm_payload(device_id, "bench", SENSOR, 70.0, ALARM, ts_ns=epoch_ns())
+            devices[index].publish(alarm_topic, encode_payload(alarm_topic, payload), qos=QOS_ALARM)
+            if seq % 200 == 0:
+                while any(client.want_write() for client in devices):
+                    await asyncio.sleep(0)
+        published = time.monotonic() - started
+        while commands.count < args.alarms and time.monotonic() - max(commands.last_seen, started) < args.idle:
+            await asyncio.sleep(0.05)
+        elapsed = (commands.last_seen or time.monotonic()) - started
+        for index, client in enumerate(devices):
+            client.publish(topic(f"status/bench-{index:04d}"), b"", qos=QOS_STATUS, retain=True)
+        while any(client.want_write() for client in devices):
+            await asyncio.sleep(0)
+    finally:
+        mqtt_loop.stop()
+        process.terminate()
+        process.wait()
+    return {
+        "workers": workers,
+        "commands": commands.count,
+        "lost": args.alarms - commands.count + commands.duplicates,
+        "duplicates": commands.duplicates,
+        "reordered": commands.reordered,
+        "members": len(commands.members),
+        "publish_s": published,
+        "rate": commands.count / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"{args.alarms} alarms from {args.devices} devices, one command expected per alarm")
+    print(
+        f"{'workers':>7} {'members':>7} {'commands':>8} {'lost':>6} {'dup':>5} {'reorder':>7} "
+        f"{'publish s':>9} {'cmd/s':>8}"
+    )
+    for workers in (int(value) for value in args.workers.split(",")):
+        result = await measure(args, workers)
+        print(
+            f"{result['workers']:>7} {result['members']:>7} {result['commands']:>8} {result['lost']:>6} "
+            f"{result['duplicates']:>5} {result['reordered']:>7} {result['publish_s']:>9.2f} {result['rate']:>8,.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Controller throughput: single process vs sharded pool members")
+    parser.add_argument("--workers", default="0,2,4", help="Comma-separated --workers values (0 = single controller)")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--alarms", type=int, default=20_000)
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to let the controller subscribe")
+    parser.add_argument("--idle", type=float, default=3.0, help="Stop waiting after this long without a command")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
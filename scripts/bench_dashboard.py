@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vfactory.common import connect, create_client, encode_payload, topic  # noqa: E402
+from vfactory.device import telemetry_payload  # noqa: E402
+from vfactory.mqtt_asyncio import AsyncioMQTT  # noqa: E402
+
+
+SENSOR = {"name": "temperature", "unit": "C"}
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as response:
+                if (await response.json()).get("broker_status") == "connected":
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"dashboard at {url} did not come up")
+
+
+async def browser(session: aiohttp.ClientSession, url: str, frames: list[int]) -> None:
+    async with session.ws_connect(url, max_msg_size=0) as ws:
+        async for _ in ws:
+            frames[0] += 1
+
+
+async def publish(devices: int, messages: int) -> float:
+    loop = asyncio.get_running_loop()
+    mqtt_loop = AsyncioMQTT(loop)
+    device_ids = [f"bench-{index:04d}" for index in range(devices)]
+    clients = []
+    for device_id in device_ids:
+        client = create_client(client_id=device_id, clean_session=True)
+        connected = loop.create_future()
+        client.on_connect = lambda _c, _u, _f, rc, fut=connected: fut.done() or fut.set_result(rc)
+        mqtt_loop.attach(client)
+        connect(client)
+        if await connected != 0:
+            raise SystemExit("publisher connect failed")
+        clients.append(client)
+    started = loop.time()
+    for seq in range(messages):
+        client = clients[seq % devices]
+        device_id = device_ids[seq % devices]
+        topic_name = topic(f"telemetry/{device_id}/temperature")
+        payload = telemetry_payload(device_id, "bench", SENSOR, 20.0 + seq % 100, seq)
+        client.publish(topic_name, encode_payload(topic_name, payload), qos=0)
+        if seq % 500 == 0:
+            while any(c.want_write() for c in clients):
+                await asyncio.sleep(0)
+    while any(c.want_write() for c in clients):
+        await asyncio.sleep(0.01)
+    elapsed = loop.time() - started
+    mqtt_loop.stop()
+    return elapsed
+
+
+async def measure(args: argparse.Namespace, driver: str) -> dict:
+    base = f"http://127.0.0.1:{args.port}"
+    command = [
+        sys.executable,
+        "-m",
+        "vfactory.dashboard",
+        "--port",
+        str(args.port),
+        "--mqtt-driver",
+        driver,
+        "--report-interval",
+        "0",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_ready(session, f"{base}/api/stats", 15.0)
+            frames = [0]
+            browsers = [asyncio.create_task(browser(session, f"{base}/ws", frames)) for _ in range(args.browsers)]
+            await asyncio.sleep(1.0)
+            async with session.get(f"{base}/api/stats") as response:
+                before = await response.json()
+            started = time.monotonic()
+            publish_seconds = await publish(args.devices, args.messages)
+            ingested = 0
+            last_change = time.monotonic()
+            finished = started
+            while time.monotonic() - last_change < 1.0:
+                await asyncio.sleep(0.05)
+                async with session.get(f"{base}/api/stats") as response:
+                    stats = await response.json()
+                count = stats["messages"] - before["messages"]
+                if count != ingested:
+                    ingested = count
+                    last_change = finished = time.monotonic()
+                if ingested >= args.messages:
+                    break
+            for task in browsers:
+                task.cancel()
+            await asyncio.gather(*browsers, return_exceptions=True)
+    finally:
+        process.terminate()
+        process.wait()
+    elapsed = finished - started
+    return {
+        "driver": driver,
+        "ingested": ingested,
+        "dropped": stats["bridge_dropped"],
+        "publish_s": publish_seconds,
+        "rate": ingested / elapsed if elapsed > 0 else 0.0,
+        "cpu_us": (stats["cpu_seconds"] - before["cpu_seconds"]) / max(ingested, 1) * 1e6,
+        "frames": frames[0],
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"{args.messages} telemetry messages from {args.devices} devices, {args.browsers} browsers connected")
+    print(
+        f"{'driver':<8} {'ingested':>9} {'dropped':>8} {'publish s':>10} {'msg/s':>9} {'cpu us/msg':>11} "
+        f"{'ws frames':>10}"
+    )
+    for driver in args.drivers.split(","):
+        result = await measure(args, driver)
+        print(
+            f"{result['driver']:<8} {result['ingested']:>9} {result['dropped']:>8} "
+            f"{result['publish_s']:>10.2f} {result['rate']:>9,.0f} {result['cpu_us']:>11.1f} {result['frames']:>10}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dashboard MQTT ingest rate: paho network thread vs asyncio driver")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--browsers", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--drivers", default="thread,asyncio", help="Comma-separated --mqtt-driver values to compare")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
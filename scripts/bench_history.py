@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vfactory import history  # noqa: E402
+from vfactory.history import METHODS, HistoryStore  # noqa: E402
+
+
+def fill(store: HistoryStore, sensors: int, samples: int, interval_ms: int) -> None:
+    start_ms = int(time.time() * 1000) - samples * interval_ms
+    for index in range(sensors):
+        device_id = f"press-{index // 4:05d}"
+        sensor = f"sensor{index % 4}"
+        value = 50.0
+        for sample in range(samples):
+            value += random.gauss(0.0, 1.0)
+            store.record(device_id, sensor, start_ms + sample * interval_ms, value)
+
+
+def measure(store: HistoryStore, sensors: int, queries: int, points: int, method: str) -> tuple[float, float]:
+    timings = []
+    for _ in range(queries):
+        index = random.randrange(sensors)
+        started = time.perf_counter()
+        store.query(f"press-{index // 4:05d}", f"sensor{index % 4}", None, None, points, method)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e3, timings[int(len(timings) * 0.99)] * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dashboard history ring buffers: memory and query latency")
+    parser.add_argument("--sensors", type=int, default=10_000)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--sample-interval", type=float, default=1.5)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=300)
+    parser.add_argument("--no-numpy", action="store_true", help="Measure the pure-Python fallback")
+    args = parser.parse_args()
+
+    if args.no_numpy:
+        history.np = None
+    capacity = int(args.hours * 3600 / args.sample_interval)
+    store = HistoryStore(capacity)
+    started = time.perf_counter()
+    fill(store, args.sensors, capacity + capacity // 10, int(args.sample_interval * 1000))
+    elapsed = time.perf_counter() - started
+    records = args.sensors * (capacity + capacity // 10)
+    print(
+        f"{args.sensors} sensors x {capacity} points: {args.sensors * store.bytes_per_series / 2**20:.1f} MiB, "
+        f"filled at {elapsed / records * 1e6:.2f} us/record ({'python' if history.np is None else 'numpy'})"
+    )
+    print(f"{'method':<8} {'points':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for method in METHODS:
+        p50, p99 = measure(store, args.sensors, args.queries, args.points, method)
+        print(f"{method:<8} {args.points:>6} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
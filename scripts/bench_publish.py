@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vfactory import common  # noqa: E402
+from vfactory.common import QOS_ALARM, QOS_TELEMETRY, encode_payload, topic  # noqa: E402
+from vfactory.device import (  # noqa: E402
+    PublishPlan,
+    Tick,
+    alarm_payload,
+    check_alarm,
+    resolve_config,
+    telemetry_payload,
+)
+from vfactory.sim_engine import create_engine  # noqa: E402
+
+
+class SinkClient:
+    def __init__(self) -> None:
+        self.messages = 0
+        self.last = None
+
+    def publish(self, topic_name, payload, qos=0, retain=False):
+        self.messages += 1
+        self.last = (topic_name, payload)
+
+
+def legacy_tick(
+    client: SinkClient, device_id: str, device_type: str, sensors: list[dict], values: list[float], seq: int
+) -> int:
+    for sensor, value in zip(sensors, values):
+        seq += 1
+        telemetry_topic = topic(f"telemetry/{device_id}/{sensor['name']}")
+        payload = telemetry_payload(device_id, device_type, sensor, value, seq)
+        client.publish(telemetry_topic, encode_payload(telemetry_topic, payload), qos=QOS_TELEMETRY, retain=False)
+        alarm = check_alarm(sensor, value)
+        if alarm:
+            alarm_topic = topic(f"alarms/{device_id}/{sensor['name']}")
+            payload = alarm_payload(device_id, device_type, sensor, value, alarm)
+            client.publish(alarm_topic, encode_payload(alarm_topic, payload), qos=QOS_ALARM, retain=False)
+    return seq
+
+
+def plan_tick(client: SinkClient, plan: PublishPlan, values: list[float], alarms: list[int], seq: int) -> int:
+    _sent, seq = plan.publish_telemetry(client, values, alarms, seq, False, Tick())
+    return seq
+
+
+def verify(device_id: str, config: dict) -> None:
+    device_type = config.get("type", "environment")
+    plan = PublishPlan(device_id, device_type, config["sensors"])
+    tick = Tick()
+    for sensor_plan, sensor in zip(plan.sensors, config["sensors"]):
+        for value in (0.0, 1.5, 42.37, 1234.56):
+            expected = encode_payload(
+                sensor_plan.telemetry_topic, telemetry_payload(device_id, device_type, sensor, value, 7, tick.ts)
+            )
+            if isinstance(expected, str):
+                expected = expected.encode("utf-8")
+            if plan.telemetry(sensor_plan, value, 7, tick) != expected:
+                raise SystemExit(f"plan payload differs from legacy payload for {sensor['name']}={value}")
+
+
+def measure(func, seconds: float) -> tuple[int, float]:
+    start = time.perf_counter()
+    deadline = start + seconds
+    messages = 0
+    while True:
+        messages += func()
+        now = time.perf_counter()
+        if now >= deadline:
+            return messages, now - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-core publish throughput: per-message dicts vs publish plans")
+    parser.add_argument("--device", default="robot_arm")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--ticks", type=int, default=1000, help="Pre-generated ticks replayed by both paths")
+    args = parser.parse_args()
+
+    config = resolve_config(args.device)
+    if not config:
+        raise SystemExit(f"Unknown device: {args.device}")
+    sensors = config["sensors"]
+    device_type = config.get("type", "environment")
+
+    values, alarms = create_engine("python", sensors, devices=args.ticks, anomaly=True, seed=1).generate()
+
+    for codec in ("json", "binary"):
+        common.CODEC = codec
+        verify(args.device, config)
+        plan = PublishPlan(args.device, device_type, sensors)
+        legacy_client = SinkClient()
+        plan_client = SinkClient()
+
+        def run_legacy() -> int:
+            before = legacy_client.messages
+            seq = 0
+            for row in values:
+                seq = legacy_tick(legacy_client, args.device, device_type, sensors, row, seq)
+            return legacy_client.messages - before
+
+        def run_plan() -> int:
+            before = plan_client.messages
+            seq = 0
+            for row, codes in zip(values, alarms):
+                seq = plan_tick(plan_client, plan, row, codes, seq)
+            return plan_client.messages - before
+
+        legacy_messages, legacy_elapsed = measure(run_legacy, args.seconds)
+        plan_messages, plan_elapsed = measure(run_plan, args.seconds)
+        legacy_rate = legacy_messages / legacy_elapsed
+        plan_rate = plan_messages / plan_elapsed
+        print(
+            f"{codec:<7} legacy={legacy_rate:>10,.0f} msg/s  plan={plan_rate:>10,.0f} msg/s  "
+            f"speedup={plan_rate / legacy_rate:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
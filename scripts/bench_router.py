@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vfactory.common import TopicRouter, topic  # noqa: E402
+
+
+SENSORS = ("temperature", "vibration", "current", "torque")
+
+
+def build_topics(devices: int) -> list[str]:
+    topics = []
+    for index in range(devices):
+        device_id = f"robot_arm-{index:05d}"
+        topics.extend(topic(f"telemetry/{device_id}/{sensor}") for sensor in SENSORS)
+        topics.append(topic(f"alarms/{device_id}/temperature"))
+        topics.append(topic(f"state/{device_id}"))
+        topics.append(topic(f"status/{device_id}"))
+        topics.append(topic(f"commands/controller/{device_id}"))
+    return topics
+
+
+def legacy_dispatch(counts: list[int]):
+    def dispatch(topic_name: str) -> None:
+        if topic_name.startswith(topic("telemetry/")):
+            counts[0] += 1
+        elif topic_name.startswith(topic("alarms/")):
+            counts[1] += 1
+        elif topic_name.startswith(topic("status/")):
+            counts[2] += 1
+        elif topic_name.startswith(topic("state/")):
+            counts[3] += 1
+
+    return dispatch
+
+
+def router_dispatch(counts: list[int], max_cached: int):
+    def on_telemetry(path) -> None:
+        counts[0] += 1
+
+    def on_alarm(path) -> None:
+        counts[1] += 1
+
+    def on_status(path) -> None:
+        counts[2] += 1
+
+    def on_state(path) -> None:
+        counts[3] += 1
+
+    router = TopicRouter(max_cached=max_cached)
+    router.route(topic("telemetry/#"), on_telemetry)
+    router.route(topic("alarms/#"), on_alarm)
+    router.route(topic("status/#"), on_status)
+    router.route(topic("state/#"), on_state)
+    return router.dispatch
+
+
+def rate(dispatch, stream: list[str], seconds: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for topic_name in stream:
+            dispatch(topic_name)
+        count += len(stream)
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="on_message dispatch: startswith chain vs compiled topic router")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--target", type=float, default=100_000, help="Messages/sec the router must sustain")
+    args = parser.parse_args()
+
+    topics = build_topics(args.devices)
+    stream = [random.choice(topics) for _ in range(100_000)]
+
+    legacy_counts = [0, 0, 0, 0]
+    router_counts = [0, 0, 0, 0]
+    legacy = legacy_dispatch(legacy_counts)
+    router = router_dispatch(router_counts, 65536)
+    for topic_name in stream:
+        legacy(topic_name)
+        router(topic_name)
+    if legacy_counts != router_counts:
+        raise SystemExit(f"router and legacy dispatch disagree: {router_counts} != {legacy_counts}")
+
+    results = [
+        ("startswith chain", rate(legacy_dispatch([0, 0, 0, 0]), stream, args.seconds)),
+        ("router (cached)", rate(router_dispatch([0, 0, 0, 0], 65536), stream, args.seconds)),
+        ("router (trie only)", rate(router_dispatch([0, 0, 0, 0], 0), stream, args.seconds)),
+    ]
+    print(f"{len(topics)} distinct topics, {len(stream)} message stream")
+    for name, value in results:
+        print(f"{name:<20} {value:>12,.0f} msg/s")
+    if results[1][1] < args.target:
+        raise SystemExit(f"router below target of {args.target:,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,10 +21,21 @@ def main() -> None:
     parser.add_argument("--controller-session", choices=["clean", "persistent"], default="clean")
     parser.add_argument("--no-dashboard", action="store_true")
     parser.add_argument("--no-observer", action="store_true")
+    parser.add_argument(
+        "--local-broker",
+        action="store_true",
+        help="Start vfactory.broker with config/acl instead of relying on the Mosquitto container",
+    )
     args = parser.parse_args()
 
     processes = []
 
+    if args.local_broker:
+        acl = os.path.join(os.path.dirname(__file__), "..", "config", "acl")
+        broker_cmd = [sys.executable, "-m", "vfactory.broker", "--acl", acl]
+        processes.append(("broker", start_process("broker", broker_cmd)))
+        time.sleep(0.5)
+
     for device in DEVICES:
         cmd = [sys.executable, "-m", "vfactory.device", "--device", device]
         if args.anomaly:
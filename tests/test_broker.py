@@ -0,0 +1,177 @@
+import asyncio
+import struct
+
+import pytest
+
+from vfactory.broker import CONNACK, CONNECT, PUBLISH, SUBACK, Acl, Broker, encode_length
+
+
+ACL = """\
+topic read factory/#
+topic deny factory/commands/secret/#
+pattern write factory/status/%c
+pattern write factory/commands/%c/#
+
+user controller
+topic readwrite factory/#
+"""
+
+
+def string(value: str | bytes) -> bytes:
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(header: int, body: bytes) -> bytes:
+    return bytes((header,)) + encode_length(len(body)) + body
+
+
+def connect_packet(client_id: str, will: tuple[str, bytes] | None = None, username: str | None = None) -> bytes:
+    flags = 0x02
+    payload = string(client_id)
+    if will is not None:
+        flags |= 0x04
+        payload += string(will[0]) + string(will[1])
+    if username is not None:
+        flags |= 0x80
+        payload += string(username)
+    return packet(CONNECT, string("MQTT") + bytes((4, flags)) + struct.pack("!H", 60) + payload)
+
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    header = (await reader.readexactly(1))[0]
+    length = 0
+    multiplier = 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        multiplier *= 128
+        if not byte & 0x80:
+            break
+    return header, await reader.readexactly(length)
+
+
+class Client:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, broker: Broker, client_id: str, **options) -> "Client":
+        reader, writer = await asyncio.open_connection("127.0.0.1", broker.port)
+        writer.write(connect_packet(client_id, **options))
+        header, body = await read_packet(reader)
+        assert header == CONNACK and body[1] == 0
+        return cls(reader, writer)
+
+    async def subscribe(self, sub_filter: str, qos: int = 0) -> int:
+        self.writer.write(packet(0x82, struct.pack("!H", 1) + string(sub_filter) + bytes((qos,))))
+        header, body = await read_packet(self.reader)
+        assert header == SUBACK
+        return body[2]
+
+    def publish(self, topic_name: str, payload: bytes) -> None:
+        self.writer.write(packet(PUBLISH, string(topic_name) + payload))
+
+    async def receive(self, timeout: float = 0.3) -> tuple[str, bytes] | None:
+        try:
+            header, body = await asyncio.wait_for(read_packet(self.reader), timeout)
+        except asyncio.TimeoutError:
+            return None
+        assert header & 0xF0 == PUBLISH
+        (length,) = struct.unpack_from("!H", body)
+        start = 2 + length + (2 if header & 0x06 else 0)
+        return body[2 : 2 + length].decode("utf-8"), body[start:]
+
+    def drop(self) -> None:
+        """Close the socket without DISCONNECT, so the broker publishes the will."""
+        self.writer.transport.abort()
+
+
+def run_with_broker(acl_text: str | None, scenario, tmp_path) -> Broker:
+    async def main() -> Broker:
+        acl = Acl()
+        if acl_text is not None:
+            path = tmp_path / "acl"
+            path.write_text(acl_text)
+            acl = Acl.load(str(path))
+        broker = Broker(acl)
+        await broker.start(port=0)
+        try:
+            await scenario(broker)
+        finally:
+            await broker.stop()
+        return broker
+
+    return asyncio.run(main())
+
+
+def test_acl_topic_rules_before_first_user_are_anonymous_only(tmp_path):
+    path = tmp_path / "acl"
+    path.write_text(ACL)
+    acl = Acl.load(str(path))
+    read, write, deny = acl.rules_for("press", None)
+    assert read == ["factory/#"]
+    assert write == ["factory/status/press", "factory/commands/press/#"]
+    assert deny == ["factory/commands/secret/#"]
+    read, write, deny = acl.rules_for("controller-1", "controller")
+    assert read == ["factory/#"]
+    assert write == ["factory/#", "factory/status/controller-1", "factory/commands/controller-1/#"]
+    assert deny == []
+
+
+def test_acl_rejects_unknown_lines(tmp_path):
+    path = tmp_path / "acl"
+    path.write_text("topic read factory/#\nallow everything\n")
+    with pytest.raises(ValueError, match=":2:"):
+        Acl.load(str(path))
+
+
+def test_acl_denies_publish_and_deny_overrides_read(tmp_path):
+    async def scenario(broker: Broker) -> None:
+        subscriber = await Client.connect(broker, "watcher")
+        assert await subscriber.subscribe("factory/commands/#") == 0
+        assert await subscriber.subscribe("factory/commands/secret/#") == 0x80
+        conveyor = await Client.connect(broker, "conveyor")
+        conveyor.publish("factory/commands/controller/press", b"stop")
+        conveyor.publish("factory/commands/conveyor/press", b"stop")
+        assert await subscriber.receive() == ("factory/commands/conveyor/press", b"stop")
+        assert await subscriber.receive() is None
+
+    broker = run_with_broker(ACL, scenario, tmp_path)
+    assert broker.denied == 1
+
+
+def test_will_is_published_when_client_drops(tmp_path):
+    async def scenario(broker: Broker) -> None:
+        subscriber = await Client.connect(broker, "watcher")
+        await subscriber.subscribe("factory/status/#")
+        conveyor = await Client.connect(broker, "conveyor", will=("factory/status/conveyor", b"offline"))
+        conveyor.drop()
+        assert await subscriber.receive(1.0) == ("factory/status/conveyor", b"offline")
+
+    run_with_broker(ACL, scenario, tmp_path)
+
+
+def test_will_on_topic_denied_by_acl_is_dropped(tmp_path):
+    async def scenario(broker: Broker) -> None:
+        subscriber = await Client.connect(broker, "watcher")
+        await subscriber.subscribe("factory/commands/#")
+        conveyor = await Client.connect(broker, "conveyor", will=("factory/commands/controller/press", b"stop"))
+        conveyor.drop()
+        assert await subscriber.receive(0.5) is None
+
+    broker = run_with_broker(ACL, scenario, tmp_path)
+    assert broker.denied == 1
+
+
+def test_will_is_not_published_after_clean_disconnect(tmp_path):
+    async def scenario(broker: Broker) -> None:
+        subscriber = await Client.connect(broker, "watcher")
+        await subscriber.subscribe("factory/status/#")
+        conveyor = await Client.connect(broker, "conveyor", will=("factory/status/conveyor", b"offline"))
+        conveyor.writer.write(bytes((0xE0, 0)))
+        await conveyor.writer.drain()
+        assert await subscriber.receive(0.5) is None
+
+    run_with_broker(ACL, scenario, tmp_path)
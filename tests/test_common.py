@@ -0,0 +1,117 @@
+import itertools
+
+import pytest
+
+from vfactory.broker import filter_matches
+from vfactory.common import (
+    BinaryCodec,
+    JsonCodec,
+    TopicRouter,
+    decode_payload,
+    msgpack_dumps,
+    msgpack_loads,
+    valid_filter,
+)
+
+
+TELEMETRY = {
+    "device_id": "press-1",
+    "device_type": "press",
+    "sensor": "temperature",
+    "unit": "C",
+    "value": 71.25,
+    "seq": 42,
+    "ts": "2026-10-18T12:00:00Z",
+}
+
+
+def test_binary_telemetry_round_trips_with_and_without_ts_ns():
+    codec = BinaryCodec()
+    for payload in (TELEMETRY, {**TELEMETRY, "ts_ns": 1_792_324_800_123_456_789}):
+        raw = codec.encode(payload)
+        assert raw[:1] == b"\xc1"
+        assert decode_payload(raw) == payload
+
+
+def test_binary_codec_falls_back_to_msgpack_for_other_objects():
+    codec = BinaryCodec()
+    payloads = (
+        {**TELEMETRY, "value": 71},
+        {**TELEMETRY, "ts": "yesterday"},
+        {"status": "online", "nested": {"list": [1, -1, 300, 70_000, 2**40, -(2**40), None, True, 1.5]}},
+        {"text": "x" * 40, "long": "y" * 300, "blob": b"\x00\x01", "many": list(range(20))},
+    )
+    for payload in payloads:
+        raw = codec.encode(payload)
+        assert raw[:1] != b"\xc1"
+        assert decode_payload(raw) == payload
+
+
+def test_binary_codec_keeps_non_object_payloads_json():
+    codec = BinaryCodec()
+    for payload in ([1, 2, 3], "online", 12.5, None):
+        raw = codec.encode(payload)
+        assert isinstance(raw, str)
+        assert decode_payload(raw.encode("utf-8")) == payload
+    assert JsonCodec().decode(JsonCodec().encode(TELEMETRY).encode("utf-8")) == TELEMETRY
+
+
+def test_malformed_binary_payloads_raise_value_error():
+    raw = BinaryCodec().encode(TELEMETRY)
+    with pytest.raises(ValueError, match="telemetry"):
+        decode_payload(raw[:-3])
+    packed = msgpack_dumps({"name": "z" * 40})
+    with pytest.raises(ValueError, match="truncated"):
+        msgpack_loads(packed[:-1])
+    with pytest.raises(ValueError, match="truncated"):
+        msgpack_loads(b"\x81\xa4na")
+    with pytest.raises(ValueError, match="trailing"):
+        msgpack_loads(packed + b"\x00")
+    with pytest.raises(ValueError, match="empty"):
+        decode_payload(b"")
+
+
+def test_valid_filter():
+    for sub_filter in ("#", "+", "factory/#", "factory/+/press-1/+", "factory//x", "/"):
+        assert valid_filter(sub_filter), sub_filter
+    for sub_filter in ("", "factory/#/x", "factory#", "factory/press+", "+x/y", "#/"):
+        assert not valid_filter(sub_filter), sub_filter
+
+
+def test_router_matches_like_the_broker_for_every_valid_filter():
+    words = ("factory", "x", "", "+", "#")
+    candidates = ["/".join(levels) for size in (1, 2, 3) for levels in itertools.product(words, repeat=size)]
+    filters = [sub_filter for sub_filter in candidates if valid_filter(sub_filter)]
+    topics = ["/".join(levels) for size in (1, 2, 3) for levels in itertools.product(("factory", "x", ""), repeat=size)]
+    topics += ["$SYS", "$SYS/x", "$SYS/factory/x"]
+    for max_cached in (0, 65536):
+        router = TopicRouter(max_cached=max_cached)
+        handlers = {}
+        for sub_filter in filters:
+            handlers[sub_filter] = handler = lambda path, name=sub_filter: name
+            router.route(sub_filter, handler)
+        for _ in range(2):
+            for topic_name in topics:
+                path, found = router.match(topic_name)
+                expected = [handlers[sub_filter] for sub_filter in filters if filter_matches(sub_filter, topic_name)]
+                assert found == tuple(expected), topic_name
+                assert path.levels == topic_name.split("/")
+        assert len(router._cache) == (len(topics) if max_cached else 0)
+
+
+def test_router_dispatch_runs_each_handler_once_in_registration_order():
+    router = TopicRouter()
+    calls = []
+
+    def first(path, payload) -> None:
+        calls.append(("first", path.device, path.sensor, payload))
+
+    def second(path, payload) -> None:
+        calls.append(("second", path.device, path.sensor, payload))
+
+    router.route("factory/telemetry/+/+", second)
+    router.route("factory/telemetry/#", first)
+    router.route("factory/telemetry/press-1/+", second)
+    assert router.dispatch("factory/telemetry/press-1/rpm", 3000) is not None
+    assert calls == [("second", "press-1", "rpm", 3000), ("first", "press-1", "rpm", 3000)]
+    assert router.dispatch("factory/alarms/press-1/rpm", 1) is None
@@ -0,0 +1,77 @@
+from vfactory.controller import AlarmGate, ShardRing, Subscriptions
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, object]] = []
+
+    def subscribe(self, sub_filter, qos: int = 0) -> None:
+        self.calls.append(("subscribe", sub_filter))
+
+    def unsubscribe(self, sub_filter) -> None:
+        self.calls.append(("unsubscribe", sub_filter))
+
+
+def test_alarm_gate_reports_episodes_opening_and_ending():
+    episodes = []
+    gate = AlarmGate(hysteresis=0.1, clear_after=30.0, on_episode=lambda *event: episodes.append(event))
+    assert gate.alarm("press-1", "temperature", "high", 100.0, now=0.0)
+    assert gate.alarm("press-1", "temperature", "high", 100.0, now=1.0)
+    gate.reading("press-1", "temperature", 95.0)
+    assert episodes == [("press-1", "temperature", True)]
+    gate.reading("press-1", "temperature", 89.0)
+    assert episodes[-1] == ("press-1", "temperature", False)
+    gate.alarm("press-1", "pressure", "low", 2.0, now=10.0)
+    gate.expire(now=39.0)
+    assert gate.sensors
+    gate.expire(now=41.0)
+    assert not gate.sensors
+    assert episodes[-1] == ("press-1", "pressure", False)
+    assert gate.cleared == 2
+
+
+def test_alarm_gate_debounces_and_suppresses_repeated_commands():
+    gate = AlarmGate(debounce=2.0, retry=10.0)
+    assert not gate.alarm("press-1", "temperature", "high", 100.0, now=0.0)
+    assert gate.alarm("press-1", "temperature", "high", 100.0, now=2.5)
+    assert gate.command("press-1", "stop", now=2.5) == "stop"
+    assert gate.command("press-1", "maintenance", now=3.0) is None
+    gate.state("press-1", "idle")
+    assert gate.command("press-1", "stop", now=20.0) is None
+    assert gate.commands == 1
+
+
+def test_subscriptions_are_reference_counted_and_restored_on_resume():
+    client = FakeClient()
+    subs = Subscriptions(client)
+    subs.want("a/+")
+    subs.want("a/+")
+    assert client.calls == []
+    subs.resume()
+    assert client.calls == [("subscribe", [("a/+", 1)])]
+    subs.release("a/+")
+    subs.want("b")
+    subs.release("a/+")
+    assert client.calls[1:] == [("subscribe", "b"), ("unsubscribe", "a/+")]
+    subs.pause()
+    subs.release("b")
+    subs.want("c")
+    assert len(client.calls) == 3
+    subs.resume()
+    assert client.calls[3:] == [("unsubscribe", ["b"]), ("subscribe", [("c", 1)])]
+
+
+def test_shard_ring_moves_only_the_leaving_members_devices():
+    ring = ShardRing()
+    assert ring.owner("press-1") is None
+    for member in ("controller-0", "controller-1", "controller-2"):
+        ring.update(member, True)
+    devices = [f"press-{index}" for index in range(300)]
+    before = {device: ring.owner(device) for device in devices}
+    assert set(before.values()) == {"controller-0", "controller-1", "controller-2"}
+    ring.update("controller-1", False)
+    for device in devices:
+        if before[device] != "controller-1":
+            assert ring.owner(device) == before[device]
+        else:
+            assert ring.owner(device) in ("controller-0", "controller-2")
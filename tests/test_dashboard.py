@@ -0,0 +1,29 @@
+from vfactory.dashboard import RATE_PRUNE_MIN, TrafficSubscription
+
+
+def test_rate_cap_per_topic_and_loosest_cap_wins():
+    subscription = TrafficSubscription()
+    subscription.unsubscribe("#")
+    subscription.subscribe("factory/telemetry/#", 1.0)
+    assert subscription.allows("factory/telemetry/press-1/temperature", 0.0)
+    assert not subscription.allows("factory/telemetry/press-1/temperature", 0.5)
+    assert subscription.allows("factory/telemetry/press-2/temperature", 0.5)
+    assert subscription.allows("factory/telemetry/press-1/temperature", 1.0)
+    assert not subscription.allows("factory/alarms/press-1/temperature", 1.0)
+    subscription.subscribe("factory/+/press-1/#", None)
+    assert subscription.allows("factory/telemetry/press-1/temperature", 1.1)
+    assert not subscription.allows("factory/telemetry/press-2/temperature", 1.1)
+
+
+def test_last_sent_is_pruned_on_unsubscribe_and_when_it_grows():
+    subscription = TrafficSubscription()
+    subscription.unsubscribe("#")
+    subscription.subscribe("factory/telemetry/#", 10.0)
+    for index in range(RATE_PRUNE_MIN - 1):
+        subscription.allows(f"factory/telemetry/press-{index}/temperature", 0.0)
+    assert len(subscription.last_sent) == RATE_PRUNE_MIN - 1
+    subscription.allows("factory/telemetry/press-new/temperature", 1.0)
+    assert list(subscription.last_sent) == ["factory/telemetry/press-new/temperature"]
+    subscription.unsubscribe("factory/telemetry/#")
+    assert subscription.last_sent == {}
+    assert subscription.describe()["filters"] == {}
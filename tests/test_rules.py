@@ -0,0 +1,72 @@
+import pytest
+
+from vfactory.rules import DEFAULT_RULES, RuleEngine, Window
+
+
+def test_default_rules_subscribe_to_alarms_only():
+    assert RuleEngine(DEFAULT_RULES).subscriptions() == ["factory/alarms/+/+"]
+
+
+def test_subscriptions_are_minimal_and_scoped_to_a_device():
+    engine = RuleEngine(
+        [
+            {"name": "hot", "on": "alarm", "sensor": "temperature", "alarm_type": "high", "command": "stop"},
+            {"name": "rpm", "device": "press-1", "sensor": "rpm", "above": 3000, "command": "stop"},
+            {"name": "any", "on": "alarm", "command": "maintenance"},
+        ]
+    )
+    assert engine.subscriptions() == [
+        "factory/telemetry/press-1",
+        "factory/telemetry/press-1/rpm",
+        "factory/alarms/+/+",
+    ]
+    assert engine.subscriptions("press-1") == [
+        "factory/telemetry/press-1",
+        "factory/telemetry/press-1/rpm",
+        "factory/alarms/press-1/+",
+    ]
+    assert engine.subscriptions("press-2") == ["factory/alarms/press-2/+"]
+
+
+def test_first_matching_rule_wins():
+    engine = RuleEngine(DEFAULT_RULES)
+    assert engine.on_alarm("press-1", "press", "temperature", "high").name == "critical-high"
+    assert engine.on_alarm("press-1", "press", "temperature", "low").name == "low"
+    assert engine.on_alarm("press-1", "press", "vibration", "high").name == "alarm"
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError, match="above"):
+        RuleEngine([{"name": "x", "on": "telemetry", "command": "stop"}])
+    with pytest.raises(ValueError, match="window"):
+        RuleEngine([{"name": "x", "aggregate": "mean", "above": 1, "command": "stop"}])
+    with pytest.raises(ValueError, match="invalid device"):
+        RuleEngine([{"name": "x", "on": "alarm", "device": "a/b", "command": "stop"}])
+
+
+def test_window_reports_only_after_a_full_window():
+    window = Window("mean", 10.0, None)
+    assert window.add(0.0, 1.0) is None
+    assert window.add(5.0, 3.0) is None
+    assert window.add(10.0, 5.0) == pytest.approx(3.0)
+    assert window.add(16.0, 7.0) == pytest.approx(6.0)
+
+
+def test_time_above_and_rate_windows():
+    above = Window("time_above", 10.0, 50.0)
+    for time_s, value in ((0.0, 60.0), (4.0, 40.0), (6.0, 70.0), (10.0, 70.0)):
+        result = above.add(time_s, value)
+    assert result == pytest.approx(8.0)
+    rate = Window("rate", 4.0, None)
+    for time_s in range(6):
+        result = rate.add(float(time_s), 2.0 * time_s)
+    assert result == pytest.approx(2.0)
+
+
+def test_windowed_telemetry_rule_fires_per_device():
+    engine = RuleEngine(
+        [{"name": "mean", "sensor": "temperature", "aggregate": "mean", "window": 2, "above": 50, "command": "stop"}]
+    )
+    fired = [engine.on_reading("press-1", "press", "temperature", 60.0, float(second)) for second in range(4)]
+    assert [rule and rule.name for rule in fired] == [None, None, "mean", "mean"]
+    assert engine.on_reading("press-2", "press", "temperature", 60.0, 3.0) is None
@@ -0,0 +1,62 @@
+import pytest
+
+from vfactory.scheduler import CATCH_UP, SKIP, Scheduler
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_skip_policy_fires_once_and_counts_missed_ticks():
+    clock = FakeClock()
+    scheduler = Scheduler(clock)
+    ticks = []
+    timer = scheduler.every(1.0, lambda: ticks.append(clock.now), name="poll", policy=SKIP)
+    clock.now = 3.5
+    assert scheduler.run_due() == 1
+    assert (timer.fired, timer.skipped, timer.deadline) == (1, 2, 4.0)
+    assert timer.late_max == pytest.approx(2.5)
+    clock.now = 4.0
+    assert scheduler.run_due() == 1
+    assert (timer.fired, timer.skipped, timer.deadline) == (2, 2, 5.0)
+    assert scheduler.report() == "poll ticks=2 late_mean=1250.00ms late_max=2500.00ms skipped=2"
+    assert scheduler.report() == "poll ticks=0 late_mean=0.00ms late_max=0.00ms skipped=0"
+
+
+def test_catch_up_policy_fires_every_missed_tick_on_the_original_cadence():
+    clock = FakeClock()
+    scheduler = Scheduler(clock)
+    timer = scheduler.every(1.0, lambda: None, policy=CATCH_UP)
+    clock.now = 3.5
+    assert scheduler.run_due() == 3
+    assert (timer.fired, timer.skipped, timer.deadline) == (3, 0, 4.0)
+    assert timer.late_sum == pytest.approx(2.5 + 1.5 + 0.5)
+    clock.now = 10.0
+    assert scheduler.run_due(limit=2) == 2
+    assert timer.deadline == 6.0
+
+
+def test_once_and_cancelled_timers():
+    clock = FakeClock()
+    scheduler = Scheduler(clock)
+    fired = []
+    scheduler.once(1.0, lambda: fired.append("once"))
+    cancelled = scheduler.every(0.5, lambda: fired.append("cancelled"), first=0.0)
+    scheduler.cancel(cancelled)
+    assert scheduler.next_deadline() == 1.0
+    clock.now = 5.0
+    assert scheduler.run_due() == 1
+    assert fired == ["once"]
+    assert scheduler.next_deadline() is None
+
+
+def test_invalid_timers_are_rejected():
+    scheduler = Scheduler(FakeClock())
+    with pytest.raises(ValueError, match="positive"):
+        scheduler.every(0, lambda: None)
+    with pytest.raises(ValueError, match="policy"):
+        scheduler.every(1.0, lambda: None, policy="burst")
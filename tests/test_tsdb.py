@@ -0,0 +1,88 @@
+import threading
+import time
+from array import array
+
+from vfactory.tsdb import TSDB
+
+
+def raw_columns(store: TSDB, device_id: str, series: str) -> list[tuple[array, array]]:
+    columns = []
+    for _segment, base in store._segments(device_id, series, "raw"):
+        times = array("q", base.with_suffix(".ts").read_bytes())
+        values = array("d", base.with_suffix(".val").read_bytes())
+        columns.append((times, values))
+    return columns
+
+
+def test_points_across_segment_boundary(tmp_path):
+    store = TSDB(str(tmp_path), segment_seconds=10, rollup_seconds=1)
+    for index in range(30):
+        store.append("press-1", "temperature", 1_000 * index, float(index))
+    store.flush(force=True)
+    assert len(store._segments("press-1", "temperature", "raw")) == 3
+    times, values = store.points("press-1", "temperature", 5_000, 24_000)
+    assert list(times) == [1_000 * index for index in range(5, 25)]
+    assert list(values) == [float(index) for index in range(5, 25)]
+    assert store.series() == [("press-1", "temperature")]
+
+
+def test_unflushed_rollover_is_written_and_late_samples_are_clamped(tmp_path):
+    store = TSDB(str(tmp_path), segment_seconds=10, rollup_seconds=1)
+    store.append("press-1", "temperature", 9_000, 1.0)
+    store.append("press-1", "temperature", 8_000, 2.0)
+    store.append("press-1", "temperature", 10_000, 3.0)
+    times, _values = store.points("press-1", "temperature", 0, 20_000)
+    assert list(times) == [9_000, 9_000]
+    store.flush(force=True)
+    times, values = store.points("press-1", "temperature", 0, 20_000)
+    assert list(times) == [9_000, 9_000, 10_000]
+    assert list(values) == [1.0, 2.0, 3.0]
+
+
+def test_aggregate_merges_rollups_and_raw(tmp_path):
+    store = TSDB(str(tmp_path), segment_seconds=10, rollup_seconds=5)
+    for index in range(40):
+        store.append("press-1", "temperature", 1_000 * index, float(index % 10))
+    store.flush(force=True)
+    stats = store.compact(raw_retention_ms=15_000, retention_ms=10**12, now_ms=40_000)
+    assert stats["segments"] == 2
+    rows = store.aggregate("press-1", "temperature", 0, 39_999, 10_000)
+    assert [row[0] for row in rows] == [0, 10_000, 20_000, 30_000]
+    for _key, low, high, mean, count in rows:
+        assert (low, high, mean, count) == (0.0, 9.0, 4.5, 10)
+
+
+def test_concurrent_flush_keeps_segments_sorted(tmp_path, monkeypatch):
+    store = TSDB(str(tmp_path), segment_seconds=1, rollup_seconds=1)
+    done = threading.Event()
+    samples = 20_000
+    write = TSDB._write
+
+    def slow_write(self, key, pending) -> None:
+        # Slow down flushes so a segment rollover in the appending thread lands while one is still writing.
+        if threading.current_thread() is thread:
+            time.sleep(0.001)
+        write(self, key, pending)
+
+    monkeypatch.setattr(TSDB, "_write", slow_write)
+
+    def flusher() -> None:
+        while not done.is_set():
+            store.flush(force=True)
+
+    thread = threading.Thread(target=flusher)
+    thread.start()
+    try:
+        for index in range(samples):
+            store.append("press-1", "temperature", index * 10, float(index))
+    finally:
+        done.set()
+        thread.join()
+    store.flush(force=True)
+    total = 0
+    for times, values in raw_columns(store, "press-1", "temperature"):
+        assert len(times) == len(values)
+        assert list(times) == sorted(times)
+        assert list(values) == sorted(values)
+        total += len(times)
+    assert total == samples
@@ -0,0 +1,745 @@
+import argparse
+import asyncio
+import struct
+import time
+from collections import deque
+
+from vfactory.common import BROKER_PORT, log, valid_filter
+
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+PUBREC = 0x50
+PUBREL = 0x60
+PUBCOMP = 0x70
+SUBSCRIBE = 0x80
+SUBACK = 0x90
+UNSUBSCRIBE = 0xA0
+UNSUBACK = 0xB0
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+CONNACK_ACCEPTED = 0
+CONNACK_BAD_PROTOCOL = 1
+CONNACK_BAD_CLIENT_ID = 2
+SUBACK_FAILURE = 0x80
+
+HIGH_WATER = 4 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def filter_matches(sub_filter: str, topic_name: str) -> bool:
+    if topic_name.startswith("$") and sub_filter[:1] in ("+", "#"):
+        return False
+    sub_levels = sub_filter.split("/")
+    topic_levels = topic_name.split("/")
+    for index, level in enumerate(sub_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(sub_levels) == len(topic_levels)
+
+
+def filters_overlap(first: str, second: str) -> bool:
+    first_levels = first.split("/")
+    second_levels = second.split("/")
+    for index, level in enumerate(first_levels):
+        if level == "#":
+            return True
+        if index >= len(second_levels):
+            return False
+        other = second_levels[index]
+        if other == "#":
+            return True
+        if level != "+" and other != "+" and level != other:
+            return False
+    return len(first_levels) == len(second_levels)
+
+
+class TopicTrie:
+    """Subscription index: one node per topic level with dedicated '+' and '#' edges."""
+
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self) -> None:
+        self.children: dict[str, TopicTrie] = {}
+        self.subscribers: dict[str, int] = {}
+
+    def add(self, sub_filter: str, client_id: str, qos: int) -> None:
+        node = self
+        for level in sub_filter.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = TopicTrie()
+            node = child
+        node.subscribers[client_id] = qos
+
+    def remove(self, sub_filter: str, client_id: str) -> None:
+        path = []
+        node = self
+        for level in sub_filter.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                return
+            path.append((node, level))
+            node = child
+        node.subscribers.pop(client_id, None)
+        for parent, level in reversed(path):
+            child = parent.children[level]
+            if child.subscribers or child.children:
+                break
+            del parent.children[level]
+
+    def match(self, topic_name: str) -> dict[str, int]:
+        found: dict[str, int] = {}
+        levels = topic_name.split("/")
+        skip_wildcards = topic_name.startswith("$")
+        self._match(levels, 0, found, skip_wildcards)
+        return found
+
+    def _match(self, levels: list[str], index: int, found: dict[str, int], skip_wildcards: bool) -> None:
+        children = self.children
+        if not skip_wildcards:
+            hash_node = children.get("#")
+            if hash_node is not None:
+                _merge(found, hash_node.subscribers)
+        if index == len(levels):
+            _merge(found, self.subscribers)
+            return
+        child = children.get(levels[index])
+        if child is not None:
+            child._match(levels, index + 1, found, False)
+        if not skip_wildcards:
+            plus = children.get("+")
+            if plus is not None:
+                plus._match(levels, index + 1, found, False)
+
+
+def _merge(found: dict[str, int], subscribers: dict[str, int]) -> None:
+    for client_id, qos in subscribers.items():
+        if found.get(client_id, -1) < qos:
+            found[client_id] = qos
+
+
+class RetainedStore:
+    """Retained messages kept in a topic-level trie so wildcard lookups only walk matching branches."""
+
+    __slots__ = ("children", "message")
+
+    def __init__(self) -> None:
+        self.children: dict[str, RetainedStore] = {}
+        self.message: Message | None = None
+
+    def set(self, message: "Message") -> None:
+        node = self
+        for level in message.topic.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = RetainedStore()
+            node = child
+        node.message = message if message.payload else None
+
+    def match(self, sub_filter: str) -> list["Message"]:
+        out: list[Message] = []
+        self._match(sub_filter.split("/"), 0, out)
+        return out
+
+    def _match(self, levels: list[str], index: int, out: list) -> None:
+        if index == len(levels):
+            if self.message is not None:
+                out.append(self.message)
+            return
+        level = levels[index]
+        if level == "#":
+            self._collect(out, index == 0)
+        elif level == "+":
+            for name, child in self.children.items():
+                if index == 0 and name.startswith("$"):
+                    continue
+                child._match(levels, index + 1, out)
+        else:
+            child = self.children.get(level)
+            if child is not None:
+                child._match(levels, index + 1, out)
+
+    def _collect(self, out: list, root: bool) -> None:
+        if self.message is not None and not root:
+            out.append(self.message)
+        for name, child in self.children.items():
+            if root and name.startswith("$"):
+                continue
+            child._collect(out, False)
+
+
+class Acl:
+    """Mosquitto ACL semantics: `topic` lines before the first `user` line apply to anonymous clients only, later
+    ones to that user; `pattern` lines apply to every client; `deny` wins over any grant for read and write.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.topic_rules: list[tuple[str | None, str, str]] = []
+        self.pattern_rules: list[tuple[str, str]] = []
+
+    @classmethod
+    def load(cls, path: str) -> "Acl":
+        acl = cls()
+        acl.enabled = True
+        user = None
+        with open(path, encoding="utf-8") as handle:
+            for number, raw in enumerate(handle, 1):
+                line = raw.strip()
+                if not line or line.startswith("#"):
+                    continue
+                words = line.split(None, 2)
+                keyword = words[0]
+                if keyword == "user" and len(words) >= 2:
+                    user = line.split(None, 1)[1]
+                    continue
+                if keyword not in ("topic", "pattern") or len(words) < 2:
+                    raise ValueError(f"{path}:{number}: unsupported ACL line {line!r}")
+                if len(words) == 2:
+                    access, rule = "readwrite", words[1]
+                elif words[1] in ("read", "write", "readwrite", "deny"):
+                    access, rule = words[1], words[2]
+                else:
+                    access, rule = "readwrite", line.split(None, 1)[1]
+                if keyword == "topic":
+                    acl.topic_rules.append((user, access, rule))
+                else:
+                    acl.pattern_rules.append((access, rule))
+        return acl
+
+    def rules_for(self, client_id: str, username: str | None) -> tuple[list[str], list[str], list[str]]:
+        """(read, write, deny) filters for one client."""
+        read: list[str] = []
+        write: list[str] = []
+        deny: list[str] = []
+        for user, access, rule in self.topic_rules:
+            if user != username:
+                continue
+            _assign(access, rule, read, write, deny)
+        for access, rule in self.pattern_rules:
+            if "%u" in rule:
+                if username is None:
+                    continue
+                rule = rule.replace("%u", username)
+            _assign(access, rule.replace("%c", client_id), read, write, deny)
+        return read, write, deny
+
+
+def _assign(access: str, rule: str, read: list[str], write: list[str], deny: list[str]) -> None:
+    if access == "deny":
+        deny.append(rule)
+    if access in ("read", "readwrite"):
+        read.append(rule)
+    if access in ("write", "readwrite"):
+        write.append(rule)
+
+
+class Message:
+    __slots__ = ("topic", "payload", "qos", "retain", "_encoded")
+
+    def __init__(self, topic_name: str, payload: bytes, qos: int, retain: bool) -> None:
+        self.topic = topic_name
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self._encoded = encode_string(topic_name)
+
+    def packet(self, qos: int, retain: bool, mid: int = 0, dup: bool = False) -> bytes:
+        flags = PUBLISH | (qos << 1) | (1 if retain else 0) | (0x08 if dup else 0)
+        if qos:
+            body_len = len(self._encoded) + 2 + len(self.payload)
+            return b"".join(
+                (bytes((flags,)), encode_length(body_len), self._encoded, struct.pack("!H", mid), self.payload)
+            )
+        body_len = len(self._encoded) + len(self.payload)
+        return b"".join((bytes((flags,)), encode_length(body_len), self._encoded, self.payload))
+
+
+class Session:
+    def __init__(self, client_id: str, clean: bool, max_queued: int) -> None:
+        self.client_id = client_id
+        self.clean = clean
+        self.subscriptions: dict[str, int] = {}
+        self.inflight: dict[int, tuple[Message, int, bool]] = {}
+        self.queued: deque = deque(maxlen=max_queued)
+        self.connection: "Connection | None" = None
+        self.read_rules: list[str] | None = None
+        self.write_rules: list[str] | None = None
+        self.deny_rules: list[str] = []
+        self.write_cache: dict[str, bool] = {}
+        self.read_cache: dict[str, bool] = {}
+        self.next_mid = 0
+        self.dropped = 0
+
+    def allocate_mid(self) -> int:
+        for _ in range(65535):
+            self.next_mid = self.next_mid % 65535 + 1
+            if self.next_mid not in self.inflight:
+                return self.next_mid
+        raise ProtocolError("no free message ids")
+
+    def can_write(self, topic_name: str) -> bool:
+        if self.write_rules is None:
+            return True
+        return _check(self.write_cache, self.write_rules, self.deny_rules, topic_name)
+
+    def can_read(self, topic_name: str) -> bool:
+        if self.read_rules is None:
+            return True
+        return _check(self.read_cache, self.read_rules, self.deny_rules, topic_name)
+
+    def can_subscribe(self, sub_filter: str) -> bool:
+        if self.read_rules is None:
+            return True
+        if any(filter_matches(rule, sub_filter) for rule in self.deny_rules):
+            return False
+        return any(filters_overlap(rule, sub_filter) for rule in self.read_rules)
+
+
+def _check(cache: dict[str, bool], rules: list[str], deny: list[str], topic_name: str) -> bool:
+    allowed = cache.get(topic_name)
+    if allowed is None:
+        allowed = not any(filter_matches(rule, topic_name) for rule in deny) and any(
+            filter_matches(rule, topic_name) for rule in rules
+        )
+        if len(cache) > 4096:
+            cache.clear()
+        cache[topic_name] = allowed
+    return allowed
+
+
+class Connection(asyncio.Protocol):
+    def __init__(self, broker: "Broker") -> None:
+        self.broker = broker
+        self.transport: asyncio.Transport | None = None
+        self.buffer = bytearray()
+        self.session: Session | None = None
+        self.will: Message | None = None
+        self.keepalive = 0
+        self.last_packet = time.monotonic()
+        self.closed = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+        self.broker.connections.add(self)
+
+    def connection_lost(self, _exc: Exception | None) -> None:
+        self.closed = True
+        self.broker.connections.discard(self)
+        self.broker.client_gone(self)
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        self.last_packet = time.monotonic()
+        buffer = self.buffer
+        try:
+            while True:
+                size = len(buffer)
+                if size < 2:
+                    break
+                multiplier = 1
+                length = 0
+                pos = 1
+                while True:
+                    if pos >= size:
+                        return
+                    byte = buffer[pos]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    pos += 1
+                    if not byte & 0x80:
+                        break
+                    if pos > 4:
+                        raise ProtocolError("malformed remaining length")
+                end = pos + length
+                if size < end:
+                    break
+                header = buffer[0]
+                body = bytes(buffer[pos:end])
+                del buffer[:end]
+                self.handle(header, body)
+                if self.closed:
+                    return
+        except (ProtocolError, struct.error, UnicodeDecodeError, IndexError) as exc:
+            log("broker", f"protocol error: {exc}")
+            self.abort()
+
+    def send(self, data: bytes) -> None:
+        if not self.closed:
+            self.transport.write(data)
+
+    def congested(self) -> bool:
+        return self.transport.get_write_buffer_size() > HIGH_WATER
+
+    def abort(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.transport.close()
+
+    def handle(self, header: int, body: bytes) -> None:
+        kind = header & 0xF0
+        if self.session is None and kind != CONNECT:
+            raise ProtocolError("first packet must be CONNECT")
+        if kind == PUBLISH:
+            self.on_publish(header, body)
+        elif kind == PUBACK:
+            (mid,) = struct.unpack_from("!H", body)
+            self.broker.acknowledge(self.session, mid)
+        elif kind == PUBREL:
+            self.send(bytes((PUBCOMP, 2)) + body[:2])
+        elif kind == PUBREC:
+            self.send(bytes((PUBREL | 0x02, 2)) + body[:2])
+        elif kind == PUBCOMP:
+            (mid,) = struct.unpack_from("!H", body)
+            self.broker.acknowledge(self.session, mid)
+        elif kind == PINGREQ:
+            self.send(bytes((PINGRESP, 0)))
+        elif kind == SUBSCRIBE:
+            self.on_subscribe(body)
+        elif kind == UNSUBSCRIBE:
+            self.on_unsubscribe(body)
+        elif kind == DISCONNECT:
+            self.will = None
+            self.abort()
+        elif kind == CONNECT:
+            if self.session is not None:
+                raise ProtocolError("duplicate CONNECT")
+            self.on_connect(body)
+        else:
+            raise ProtocolError(f"unexpected packet 0x{header:02x}")
+
+    def on_connect(self, body: bytes) -> None:
+        pos = 0
+        (name_len,) = struct.unpack_from("!H", body, pos)
+        pos += 2
+        protocol_name = body[pos : pos + name_len]
+        pos += name_len
+        level = body[pos]
+        flags = body[pos + 1]
+        (self.keepalive,) = struct.unpack_from("!H", body, pos + 2)
+        pos += 4
+        if protocol_name not in (b"MQTT", b"MQIsdp") or level not in (3, 4):
+            self.send(bytes((CONNACK, 2, 0, CONNACK_BAD_PROTOCOL)))
+            self.abort()
+            return
+        client_id, pos = _read_string(body, pos)
+        clean = bool(flags & 0x02)
+        if flags & 0x04:
+            will_topic, pos = _read_string(body, pos)
+            (will_len,) = struct.unpack_from("!H", body, pos)
+            pos += 2
+            will_payload = body[pos : pos + will_len]
+            pos += will_len
+            self.will = Message(will_topic, will_payload, (flags >> 3) & 0x03, bool(flags & 0x20))
+        username = None
+        if flags & 0x80:
+            username, pos = _read_string(body, pos)
+        if not client_id:
+            if not clean:
+                self.send(bytes((CONNACK, 2, 0, CONNACK_BAD_CLIENT_ID)))
+                self.abort()
+                return
+            client_id = f"auto-{id(self):x}"
+        self.broker.attach(self, client_id, clean, username)
+
+    def on_publish(self, header: int, body: bytes) -> None:
+        qos = (header >> 1) & 0x03
+        topic_name, pos = _read_string(body, 0)
+        mid = 0
+        if qos:
+            (mid,) = struct.unpack_from("!H", body, pos)
+            pos += 2
+        if not topic_name or "+" in topic_name or "#" in topic_name:
+            raise ProtocolError("invalid publish topic")
+        message = Message(topic_name, body[pos:], min(qos, 1), bool(header & 0x01))
+        if self.session.can_write(topic_name):
+            self.broker.publish(message)
+        else:
+            self.broker.denied += 1
+        if qos == 1:
+            self.send(struct.pack("!BBH", PUBACK, 2, mid))
+        elif qos == 2:
+            self.send(struct.pack("!BBH", PUBREC, 2, mid))
+
+    def on_subscribe(self, body: bytes) -> None:
+        (mid,) = struct.unpack_from("!H", body)
+        pos = 2
+        granted = bytearray()
+        accepted = []
+        while pos < len(body):
+            sub_filter, pos = _read_string(body, pos)
+            qos = min(body[pos] & 0x03, 1)
+            pos += 1
+            if valid_filter(sub_filter) and self.session.can_subscribe(sub_filter):
+                granted.append(qos)
+                accepted.append((sub_filter, qos))
+            else:
+                granted.append(SUBACK_FAILURE)
+        self.send(bytes((SUBACK,)) + encode_length(2 + len(granted)) + struct.pack("!H", mid) + bytes(granted))
+        for sub_filter, qos in accepted:
+            self.broker.subscribe(self.session, sub_filter, qos)
+
+    def on_unsubscribe(self, body: bytes) -> None:
+        (mid,) = struct.unpack_from("!H", body)
+        pos = 2
+        while pos < len(body):
+            sub_filter, pos = _read_string(body, pos)
+            self.broker.unsubscribe(self.session, sub_filter)
+        self.send(struct.pack("!BBH", UNSUBACK, 2, mid))
+
+
+def _read_string(body: bytes, pos: int) -> tuple[str, int]:
+    (length,) = struct.unpack_from("!H", body, pos)
+    pos += 2
+    if pos + length > len(body):
+        raise ProtocolError("truncated string")
+    return body[pos : pos + length].decode("utf-8"), pos + length
+
+
+class Broker:
+    """MQTT 3.1.1 stand-in for Mosquitto: QoS 0/1 (QoS 2 publishes are accepted and delivered at QoS 1), retained
+    messages, wills, clean and persistent sessions and Mosquitto-style ACLs. QoS 0 fan-out to a client whose socket
+    buffer is over HIGH_WATER is dropped and counted rather than queued. Like Mosquitto's max_inflight_messages and
+    max_queued_messages, each session has at most `max_inflight` unacknowledged QoS 1 messages; the rest wait in a
+    queue of `max_queued` that drops the oldest, so one slow subscriber costs bounded memory.
+    """
+
+    def __init__(self, acl: Acl | None = None, max_queued: int = 1000, max_inflight: int = 1000) -> None:
+        self.acl = acl or Acl()
+        self.max_queued = max_queued
+        self.max_inflight = max_inflight
+        self.sessions: dict[str, Session] = {}
+        self.subscriptions = TopicTrie()
+        self.retained = RetainedStore()
+        self.connections: set[Connection] = set()
+        self.server: asyncio.AbstractServer | None = None
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.denied = 0
+        self._keepalive_task: asyncio.Task | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = BROKER_PORT) -> None:
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: Connection(self), host, port)
+        self._keepalive_task = asyncio.create_task(self._check_keepalives())
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for connection in list(self.connections):
+            connection.abort()
+
+    def attach(self, connection: Connection, client_id: str, clean: bool, username: str | None) -> None:
+        session = self.sessions.get(client_id)
+        if session and session.connection is not None:
+            old = session.connection
+            self.publish_will(old, session)
+            session.connection = None
+            old.session = None
+            old.abort()
+        session_present = False
+        if session and (clean or session.clean):
+            self.drop_session(session)
+            session = None
+        if session is None:
+            session = Session(client_id, clean, self.max_queued)
+            self.sessions[client_id] = session
+        else:
+            session_present = True
+        if self.acl.enabled:
+            session.read_rules, session.write_rules, session.deny_rules = self.acl.rules_for(client_id, username)
+            session.write_cache.clear()
+            session.read_cache.clear()
+        session.connection = connection
+        connection.session = session
+        connection.send(bytes((CONNACK, 2, 1 if session_present else 0, CONNACK_ACCEPTED)))
+        for mid, (message, qos, retain) in list(session.inflight.items()):
+            connection.send(message.packet(qos, retain, mid, dup=True))
+        self.release(session)
+
+    def client_gone(self, connection: Connection) -> None:
+        session = connection.session
+        if session is None:
+            return
+        connection.session = None
+        session.connection = None
+        self.publish_will(connection, session)
+        if session.clean:
+            self.drop_session(session)
+
+    def publish_will(self, connection: Connection, session: Session) -> None:
+        """Publish the will under the ACL of the session it belongs to; drop a will the client could not publish."""
+        will = connection.will
+        connection.will = None
+        if will is None:
+            return
+        if not session.can_write(will.topic):
+            self.denied += 1
+            return
+        self.publish(will)
+
+    def drop_session(self, session: Session) -> None:
+        for sub_filter in session.subscriptions:
+            self.subscriptions.remove(sub_filter, session.client_id)
+        session.subscriptions.clear()
+        self.sessions.pop(session.client_id, None)
+
+    def subscribe(self, session: Session, sub_filter: str, qos: int) -> None:
+        session.subscriptions[sub_filter] = qos
+        self.subscriptions.add(sub_filter, session.client_id, qos)
+        for message in self.retained.match(sub_filter):
+            if session.can_read(message.topic):
+                self.deliver(session, message, min(qos, message.qos), True)
+
+    def unsubscribe(self, session: Session, sub_filter: str) -> None:
+        if session.subscriptions.pop(sub_filter, None) is not None:
+            self.subscriptions.remove(sub_filter, session.client_id)
+
+    def publish(self, message: Message) -> None:
+        self.received += 1
+        if message.retain:
+            self.retained.set(message)
+        targets = self.subscriptions.match(message.topic)
+        if not targets:
+            return
+        qos0_packet = None
+        sessions = self.sessions
+        for client_id, sub_qos in targets.items():
+            session = sessions.get(client_id)
+            if session is None or not session.can_read(message.topic):
+                continue
+            qos = sub_qos if sub_qos < message.qos else message.qos
+            if qos == 0:
+                connection = session.connection
+                if connection is None:
+                    continue
+                if connection.congested():
+                    self.dropped += 1
+                    continue
+                if qos0_packet is None:
+                    qos0_packet = message.packet(0, False)
+                connection.send(qos0_packet)
+                self.delivered += 1
+            else:
+                self.deliver(session, message, qos, False)
+
+    def deliver(self, session: Session, message: Message, qos: int, retain: bool) -> None:
+        connection = session.connection
+        if qos and (connection is None or session.queued or len(session.inflight) >= self.max_inflight):
+            if len(session.queued) == session.queued.maxlen:
+                session.dropped += 1
+                self.dropped += 1
+            session.queued.append((message, qos, retain))
+            return
+        if connection is None:
+            return
+        if qos:
+            mid = session.allocate_mid()
+            session.inflight[mid] = (message, qos, retain)
+            connection.send(message.packet(qos, retain, mid))
+        else:
+            connection.send(message.packet(0, retain))
+        self.delivered += 1
+
+    def release(self, session: Session) -> None:
+        """Move queued QoS 1 messages into the inflight window while there is room."""
+        connection = session.connection
+        while session.queued and connection is not None and len(session.inflight) < self.max_inflight:
+            message, qos, retain = session.queued.popleft()
+            mid = session.allocate_mid()
+            session.inflight[mid] = (message, qos, retain)
+            connection.send(message.packet(qos, retain, mid))
+            self.delivered += 1
+
+    def acknowledge(self, session: Session, mid: int) -> None:
+        if session.inflight.pop(mid, None) is not None and session.queued:
+            self.release(session)
+
+    async def _check_keepalives(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            for connection in list(self.connections):
+                if connection.keepalive and now - connection.last_packet > connection.keepalive * 1.5:
+                    log("broker", "keepalive timeout")
+                    connection.abort()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    try:
+        acl = Acl.load(args.acl) if args.acl else None
+    except (OSError, ValueError) as exc:
+        raise SystemExit(f"Invalid ACL {args.acl}: {exc}")
+    broker = Broker(acl=acl, max_queued=args.max_queued, max_inflight=args.max_inflight)
+    await broker.start(args.host, args.port)
+    log("broker", f"listening on {args.host}:{broker.port} (acl={'on' if acl else 'off'})")
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            log(
+                "broker",
+                f"clients={len(broker.connections)} sessions={len(broker.sessions)} "
+                f"received={broker.received} delivered={broker.delivered} "
+                f"dropped={broker.dropped} denied={broker.denied}",
+            )
+    finally:
+        await broker.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-process MQTT broker stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=BROKER_PORT)
+    parser.add_argument("--acl", default=None, help="Mosquitto-style ACL file (e.g. config/acl)")
+    parser.add_argument(
+        "--max-queued", type=int, default=1000, help="Queued QoS 1 messages per offline or saturated session"
+    )
+    parser.add_argument("--max-inflight", type=int, default=1000, help="Unacknowledged QoS 1 messages per session")
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
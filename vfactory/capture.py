@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import struct
+import time
+from typing import Iterator
+
+import paho.mqtt.client as mqtt
+
+from vfactory.common import BASE_TOPIC, BROKER_HOST, BROKER_PORT, KEEPALIVE, connect, create_client, log
+from vfactory.mqtt_asyncio import AsyncioMQTT
+
+
+RECORD = struct.Struct("<qBHI")
+INDEX_ENTRY = struct.Struct("<qQ")
+FLAG_RETAIN = 0x04
+SEGMENT_BYTES = 64 * 1024 * 1024
+INDEX_EVERY = 256
+INDEX_INTERVAL_NS = 1_000_000_000
+
+
+class CaptureWriter:
+    """Appends messages to numbered segment files, each with a sparse time index and a topic summary.
+
+    Segment layout (little endian), one record per message:
+        recv_ns int64 | flags uint8 (qos | 0x04 retain) | topic_len uint16 | payload_len uint32 | topic | payload
+    `.idx` holds (recv_ns, offset) pairs every INDEX_EVERY records or INDEX_INTERVAL_NS, and `.topics`
+    (written when the segment closes) maps each topic to count/bytes/first_ns/last_ns for the segment.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES, flush_interval: float = 1.0) -> None:
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        existing = sorted(self.directory.glob("segment-*.log"))
+        self.segment_number = int(existing[-1].stem.split("-")[1]) if existing else 0
+        self.records = 0
+        self._data = None
+        self._index = None
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self.segment_number += 1
+        base = self.directory / f"segment-{self.segment_number:06d}"
+        self._base = base
+        self._data = open(base.with_suffix(".log"), "ab", buffering=1024 * 1024)
+        self._index = open(base.with_suffix(".idx"), "ab", buffering=64 * 1024)
+        self._offset = self._data.tell()
+        self._since_index = INDEX_EVERY
+        self._last_index_ns = 0
+        self._last_flush = time.monotonic()
+        self._topics: dict[str, list[int]] = {}
+
+    def append(self, topic_name: str, payload: bytes, qos: int, retain: bool, recv_ns: int | None = None) -> None:
+        recv_ns = time.time_ns() if recv_ns is None else recv_ns
+        topic_bytes = topic_name.encode("utf-8")
+        if self._since_index >= INDEX_EVERY or recv_ns - self._last_index_ns >= INDEX_INTERVAL_NS:
+            self._index.write(INDEX_ENTRY.pack(recv_ns, self._offset))
+            self._since_index = 0
+            self._last_index_ns = recv_ns
+        flags = (qos & 0x03) | (FLAG_RETAIN if retain else 0)
+        header = RECORD.pack(recv_ns, flags, len(topic_bytes), len(payload))
+        self._data.write(header)
+        self._data.write(topic_bytes)
+        self._data.write(payload)
+        size = RECORD.size + len(topic_bytes) + len(payload)
+        self._offset += size
+        self._since_index += 1
+        self.records += 1
+
+        stats = self._topics.get(topic_name)
+        if stats is None:
+            self._topics[topic_name] = [1, size, recv_ns, recv_ns]
+        else:
+            stats[0] += 1
+            stats[1] += size
+            stats[3] = recv_ns
+
+        if self._offset >= self.segment_bytes:
+            self._close_segment()
+            self._open_segment()
+        elif time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._data.flush()
+        self._index.flush()
+        self._last_flush = time.monotonic()
+
+    def _close_segment(self) -> None:
+        self._data.close()
+        self._index.close()
+        write_topics(self._base.with_suffix(".topics"), self._topics)
+
+    def close(self) -> None:
+        self._close_segment()
+
+
+def write_topics(path: pathlib.Path, topics: dict[str, list[int]]) -> None:
+    summary = {
+        name: {"count": count, "bytes": size, "first_ns": first, "last_ns": last}
+        for name, (count, size, first, last) in topics.items()
+    }
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(summary, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class Record:
+    __slots__ = ("recv_ns", "topic", "payload", "qos", "retain")
+
+    def __init__(self, recv_ns: int, topic_name: str, payload: bytes, qos: int, retain: bool) -> None:
+        self.recv_ns = recv_ns
+        self.topic = topic_name
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class CaptureReader:
+    def __init__(self, directory: str) -> None:
+        self.directory = pathlib.Path(directory)
+        self.segments = sorted(self.directory.glob("segment-*.log"))
+        if not self.segments:
+            raise SystemExit(f"No capture segments in {directory}")
+
+    def topics(self, segment: pathlib.Path) -> dict[str, dict]:
+        path = segment.with_suffix(".topics")
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        topics: dict[str, list[int]] = {}
+        for record in self._scan(segment, 0):
+            size = RECORD.size + len(record.topic.encode("utf-8")) + len(record.payload)
+            stats = topics.setdefault(record.topic, [0, 0, record.recv_ns, record.recv_ns])
+            stats[0] += 1
+            stats[1] += size
+            stats[3] = record.recv_ns
+        return {
+            name: {"count": count, "bytes": size, "first_ns": first, "last_ns": last}
+            for name, (count, size, first, last) in topics.items()
+        }
+
+    def seek_offset(self, segment: pathlib.Path, start_ns: int) -> int:
+        path = segment.with_suffix(".idx")
+        if not path.exists():
+            return 0
+        data = path.read_bytes()
+        count = len(data) // INDEX_ENTRY.size
+        low, high, offset = 0, count - 1, 0
+        while low <= high:
+            middle = (low + high) // 2
+            recv_ns, entry_offset = INDEX_ENTRY.unpack_from(data, middle * INDEX_ENTRY.size)
+            if recv_ns <= start_ns:
+                offset = entry_offset
+                low = middle + 1
+            else:
+                high = middle - 1
+        return offset
+
+    def _scan(self, segment: pathlib.Path, offset: int) -> Iterator[Record]:
+        with open(segment, "rb", buffering=1024 * 1024) as handle:
+            handle.seek(offset)
+            while True:
+                header = handle.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    return
+                recv_ns, flags, topic_len, payload_len = RECORD.unpack(header)
+                body = handle.read(topic_len + payload_len)
+                if len(body) < topic_len + payload_len:
+                    return
+                yield Record(
+                    recv_ns,
+                    body[:topic_len].decode("utf-8"),
+                    body[topic_len:],
+                    flags & 0x03,
+                    bool(flags & FLAG_RETAIN),
+                )
+
+    def records(
+        self, filters: list[str] | None = None, start_ns: int | None = None, end_ns: int | None = None
+    ) -> Iterator[Record]:
+        for segment in self.segments:
+            topics = self.topics(segment)
+            if not topics:
+                continue
+            if start_ns is not None and max(stats["last_ns"] for stats in topics.values()) < start_ns:
+                continue
+            if end_ns is not None and min(stats["first_ns"] for stats in topics.values()) > end_ns:
+                break
+            wanted = None
+            if filters:
+                wanted = {name for name in topics if any(mqtt.topic_matches_sub(f, name) for f in filters)}
+                if not wanted:
+                    continue
+            offset = self.seek_offset(segment, start_ns) if start_ns is not None else 0
+            for record in self._scan(segment, offset):
+                if start_ns is not None and record.recv_ns < start_ns:
+                    continue
+                if end_ns is not None and record.recv_ns > end_ns:
+                    return
+                if wanted is None or record.topic in wanted:
+                    yield record
+
+
+def source_client_id(topic_name: str) -> str | None:
+    parts = topic_name.split("/")
+    if len(parts) >= 3 and parts[0] == BASE_TOPIC:
+        return parts[2]
+    return None
+
+
+def parse_broker(spec: str | None) -> tuple[str, int]:
+    """HOST[:PORT] -> (host, port); None means VF_BROKER_HOST/VF_BROKER_PORT."""
+    if spec is None:
+        return BROKER_HOST, BROKER_PORT
+    host, _, port = spec.partition(":")
+    try:
+        return host or BROKER_HOST, int(port) if port else BROKER_PORT
+    except ValueError:
+        raise SystemExit(f"--broker must be HOST[:PORT], got {spec!r}")
+
+
+async def replay(args: argparse.Namespace) -> None:
+    if args.impersonate and args.broker is None:
+        raise SystemExit(
+            "--impersonate connects with the captured devices' client ids, which disconnects live clients using "
+            "them; name the target broker explicitly with --broker HOST[:PORT]"
+        )
+    host, port = parse_broker(args.broker)
+    if args.impersonate:
+        log("replay", f"impersonating captured devices on {host}:{port}; live clients with those ids get disconnected")
+    reader = CaptureReader(args.directory)
+    loop = asyncio.get_running_loop()
+    mqtt_loop = AsyncioMQTT(loop)
+    clients: dict[str, mqtt.Client] = {}
+
+    async def client_for(topic_name: str) -> mqtt.Client:
+        client_id = args.client_id
+        if args.impersonate:
+            client_id = source_client_id(topic_name) or args.client_id
+        client = clients.get(client_id)
+        if client is None:
+            client = create_client(client_id=client_id, clean_session=True)
+            connected = loop.create_future()
+            client.on_connect = lambda _c, _u, _f, rc: connected.done() or connected.set_result(rc)
+            mqtt_loop.attach(client)
+            connect(client, KEEPALIVE, host, port)
+            rc = await connected
+            if rc != 0:
+                raise SystemExit(f"replay client {client_id} connect failed rc={rc}")
+            clients[client_id] = client
+        return client
+
+    start_ns = int(args.start * 1e9) if args.start else None
+    end_ns = int(args.end * 1e9) if args.end else None
+    passes = 0
+    while True:
+        sent = 0
+        first_ns = None
+        wall_start = loop.time()
+        for record in reader.records(args.topic, start_ns, end_ns):
+            if first_ns is None:
+                first_ns = record.recv_ns
+            if args.speed > 0:
+                delay = wall_start + (record.recv_ns - first_ns) / 1e9 / args.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            client = await client_for(record.topic)
+            client.publish(record.topic, record.payload, qos=record.qos, retain=record.retain and not args.no_retain)
+            sent += 1
+            if sent % 500 == 0:
+                while any(c.want_write() for c in clients.values()):
+                    await asyncio.sleep(0)
+        elapsed = loop.time() - wall_start
+        rate = sent / elapsed if elapsed > 0 else 0.0
+        log("replay", f"pass {passes + 1}: replayed {sent} messages in {elapsed:.2f}s ({rate:.0f}/s)")
+        passes += 1
+        if not args.loop or sent == 0:
+            break
+    while any(c.want_write() for c in clients.values()):
+        await asyncio.sleep(0.01)
+    mqtt_loop.stop()
+    await asyncio.sleep(0.2)
+
+
+def info(args: argparse.Namespace) -> None:
+    reader = CaptureReader(args.directory)
+    for segment in reader.segments:
+        topics = reader.topics(segment)
+        count = sum(stats["count"] for stats in topics.values())
+        size = segment.stat().st_size
+        if topics:
+            first = min(stats["first_ns"] for stats in topics.values()) / 1e9
+            last = max(stats["last_ns"] for stats in topics.values()) / 1e9
+            span = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))} +{last - first:.1f}s"
+        else:
+            span = "empty"
+        print(f"{segment.name}: {count} messages, {size} bytes, {len(topics)} topics, {span}")
+        if args.topics:
+            for name, stats in sorted(topics.items()):
+                print(f"  {name}: {stats['count']} messages, {stats['bytes']} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect and replay traffic captured by vfactory.observer --record")
+    subparsers = parser.add_subparsers(dest="command")
+
+    replay_parser = subparsers.add_parser("replay", help="Republish a capture")
+    replay_parser.add_argument("directory")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Time scale (1 = real time, 0 = max speed)")
+    replay_parser.add_argument("--topic", action="append", help="Only replay topics matching this filter (repeatable)")
+    replay_parser.add_argument("--start", type=float, default=None, help="Start at this epoch time (seconds)")
+    replay_parser.add_argument("--end", type=float, default=None, help="Stop at this epoch time (seconds)")
+    replay_parser.add_argument("--loop", action="store_true", help="Repeat the capture until interrupted")
+    replay_parser.add_argument("--no-retain", action="store_true", help="Clear the retain flag on replay")
+    replay_parser.add_argument("--client-id", default="replay")
+    replay_parser.add_argument(
+        "--broker", default=None, help="HOST[:PORT] to replay into (default VF_BROKER_HOST:VF_BROKER_PORT)"
+    )
+    replay_parser.add_argument(
+        "--impersonate",
+        action="store_true",
+        help="Publish each topic from a client named after its device so broker ACLs accept it. The broker then "
+        "disconnects any live client with that id, so this requires an explicit --broker; never aim it at a live plant",
+    )
+
+    info_parser = subparsers.add_parser("info", help="Summarize a capture")
+    info_parser.add_argument("directory")
+    info_parser.add_argument("--topics", action="store_true", help="List per-topic counts")
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        try:
+            asyncio.run(replay(args))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "info":
+        info(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
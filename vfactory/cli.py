@@ -1,9 +1,28 @@
 import argparse
+import asyncio
 import json
+import os
+import socket
+import struct
+import subprocess
 import sys
 import time
 
-from vfactory.common import connect, create_client, log
+from vfactory.common import (
+    BROKER_HOST,
+    BROKER_PORT,
+    connect,
+    create_client,
+    encode_payload,
+    epoch_ns,
+    log,
+    payload_text,
+    topic,
+)
+from vfactory.latency import Histogram
+from vfactory.mqtt_asyncio import AsyncioMQTT
+
+BENCH_HEADER = struct.Struct("<IIq")
 
 
 def publish(args: argparse.Namespace) -> None:
@@ -15,7 +34,7 @@ def publish(args: argparse.Namespace) -> None:
             return
         payload = args.message
         if args.json:
-            payload = json.dumps(json.loads(args.message))
+            payload = encode_payload(args.topic, json.loads(args.message))
         info = client.publish(args.topic, payload, qos=args.qos, retain=args.retain)
         if info.rc != 0:
             log("cli", f"publish error rc={info.rc}")
@@ -39,7 +58,7 @@ def subscribe(args: argparse.Namespace) -> None:
             log("cli", f"connect failed rc={rc}")
 
     def on_message(_client, _userdata, msg):
-        payload = msg.payload.decode("utf-8", errors="replace")
+        payload = payload_text(msg.payload)
         log("cli", f"{msg.topic} qos={msg.qos} retain={msg.retain} {payload}")
 
     client.on_connect = on_connect
@@ -57,6 +76,216 @@ def subscribe(args: argparse.Namespace) -> None:
         client.disconnect()
 
 
+class BenchPublisher:
+    """One publisher connection: cycles over its topics and times each PUBACK (PUBCOMP at QoS 2) by mid."""
+
+    def __init__(self, index: int, client, topics: list[str], args: argparse.Namespace, acks: Histogram) -> None:
+        self.index = index
+        self.client = client
+        self.topics = topics
+        self.qos = args.qos
+        self.inflight = args.inflight
+        self.padding = bytes(max(args.payload_size - BENCH_HEADER.size, 0))
+        self.acks = acks
+        self.pending: dict[int, int] = {}
+        self.seq = 0
+
+    def ready(self) -> bool:
+        return self.qos == 0 or len(self.pending) < self.inflight
+
+    def publish(self) -> None:
+        self.seq += 1
+        topic_name = self.topics[self.seq % len(self.topics)]
+        payload = BENCH_HEADER.pack(self.index, self.seq, epoch_ns()) + self.padding
+        started = time.perf_counter_ns()
+        info = self.client.publish(topic_name, payload, qos=self.qos)
+        if self.qos:
+            self.pending[info.mid] = started
+
+    def on_publish(self, _client, _userdata, mid: int) -> None:
+        started = self.pending.pop(mid, None)
+        if started is not None:
+            self.acks.record(time.perf_counter_ns() - started)
+
+
+class BenchSubscriber:
+    """Counts deliveries by (publisher, seq) in a seen-map per publisher and times them from the embedded send time."""
+
+    def __init__(self, publishers: int, latency: Histogram) -> None:
+        self.latency = latency
+        self.seen = [bytearray() for _ in range(publishers)]
+        self.received = 0
+        self.duplicates = 0
+        self.last_ns = 0
+
+    def on_message(self, _client, _userdata, msg) -> None:
+        received = epoch_ns()
+        index, seq, sent = BENCH_HEADER.unpack_from(msg.payload)
+        self.latency.record(received - sent)
+        seen = self.seen[index]
+        if seq >= len(seen):
+            seen.extend(bytes(max(seq + 1 - len(seen), len(seen))))
+        if seen[seq]:
+            self.duplicates += 1
+        else:
+            seen[seq] = 1
+        self.received += 1
+        self.last_ns = received
+
+
+def start_local_broker() -> subprocess.Popen:
+    acl = os.path.join(os.path.dirname(__file__), "..", "config", "acl")
+    command = [sys.executable, "-m", "vfactory.broker", "--port", str(BROKER_PORT), "--acl", acl]
+    try:
+        socket.create_connection((BROKER_HOST, BROKER_PORT), timeout=0.5).close()
+    except OSError:
+        pass
+    else:
+        raise SystemExit(f"{BROKER_HOST}:{BROKER_PORT} is already in use; stop that broker or drop --local-broker")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10.0
+    while time.monotonic() < deadline:
+        # A broker that exits early (port taken meanwhile, bad ACL) must not be mistaken for whatever else listens.
+        if process.poll() is not None:
+            raise SystemExit(f"local broker exited with code {process.returncode}")
+        try:
+            socket.create_connection((BROKER_HOST, BROKER_PORT), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit(f"local broker did not start on {BROKER_HOST}:{BROKER_PORT}")
+
+
+async def run_bench(args: argparse.Namespace) -> None:
+    loop = asyncio.get_running_loop()
+    mqtt_loop = AsyncioMQTT(loop, read_batch=256)
+    acks = Histogram()
+    latency = Histogram()
+
+    async def connected(client_id: str):
+        client = create_client(client_id=client_id, clean_session=True)
+        client.max_inflight_messages_set(max(args.inflight, 1))
+        future = loop.create_future()
+        client.on_connect = lambda _c, _u, _f, rc: future.done() or future.set_result(rc)
+        mqtt_loop.attach(client)
+        connect(client)
+        rc = await future
+        if rc != 0:
+            raise SystemExit(f"{client_id}: connect failed rc={rc}")
+        return client
+
+    publishers = []
+    for index in range(args.publishers):
+        client_id = f"{args.client_id}-pub-{index:03d}"
+        # The ACL lets a client publish telemetry only under its own client id.
+        topics = [topic(f"telemetry/{client_id}/t{number}") for number in range(args.topics)]
+        publisher = BenchPublisher(index, await connected(client_id), topics, args, acks)
+        publisher.client.on_publish = publisher.on_publish
+        publishers.append(publisher)
+    subscribers = []
+    for index in range(args.subscribers):
+        client = await connected(f"{args.client_id}-sub-{index:03d}")
+        subscriber = BenchSubscriber(args.publishers, latency)
+        client.on_message = subscriber.on_message
+        subscribed = loop.create_future()
+        client.on_subscribe = lambda _c, _u, _mid, _granted, fut=subscribed: fut.done() or fut.set_result(True)
+        filters = [topic(f"telemetry/{args.client_id}-pub-{number:03d}/#") for number in range(args.publishers)]
+        client.subscribe([(sub_filter, args.qos) for sub_filter in filters])
+        await subscribed
+        subscribers.append(subscriber)
+
+    turn = 0
+
+    def next_ready() -> BenchPublisher | None:
+        """The next publisher in round-robin order with room in its inflight window, skipping full ones."""
+        nonlocal turn
+        for _ in range(len(publishers)):
+            publisher = publishers[turn % len(publishers)]
+            turn += 1
+            if publisher.ready():
+                return publisher
+        return None
+
+    log("cli", f"benchmarking {args.publishers} publishers, {args.subscribers} subscribers for {args.duration:.0f}s")
+    started = loop.time()
+    started_ns = epoch_ns()
+    deadline = started + args.duration
+    sent = 0
+    while loop.time() < deadline:
+        due = int((loop.time() - started) * args.rate) - sent if args.rate > 0 else args.batch
+        burst = 0
+        for _ in range(min(due, args.batch)):
+            publisher = next_ready()
+            if publisher is None:
+                break
+            publisher.publish()
+            sent += 1
+            burst += 1
+        while any(publisher.client.want_write() for publisher in publishers):
+            await asyncio.sleep(0)
+        # Flat-out keeps publishing while the inflight windows allow; otherwise let acks and the broker catch up.
+        await asyncio.sleep(0 if burst and args.rate <= 0 else 0.001)
+    publish_seconds = loop.time() - started
+
+    expected = sent * len(subscribers)
+    last_progress = loop.time()
+    progress = (0, 0)
+    while loop.time() - last_progress < args.drain:
+        delivered = sum(subscriber.received for subscriber in subscribers)
+        outstanding = sum(len(publisher.pending) for publisher in publishers)
+        if delivered >= expected and not outstanding:
+            break
+        if (delivered, outstanding) != progress:
+            progress = (delivered, outstanding)
+            last_progress = loop.time()
+        await asyncio.sleep(0.05)
+    mqtt_loop.stop()
+
+    delivered = sum(subscriber.received - subscriber.duplicates for subscriber in subscribers)
+    duplicates = sum(subscriber.duplicates for subscriber in subscribers)
+    lost = expected - delivered
+    delivery_ns = max((subscriber.last_ns for subscriber in subscribers), default=0) - started_ns
+    rate = "flat-out" if args.rate <= 0 else f"{args.rate:,.0f} msg/s"
+    print(
+        f"{args.publishers} publishers x {args.topics} topics -> {args.subscribers} subscribers, qos {args.qos}, "
+        f"{max(args.payload_size, BENCH_HEADER.size)} B payloads, target {rate}"
+    )
+    print(f"published {sent:>10}  {sent / publish_seconds:>12,.0f} msg/s")
+    if subscribers:
+        print(
+            f"delivered {delivered:>10}  {delivered / max(delivery_ns / 1e9, 1e-9):>12,.0f} msg/s  "
+            f"lost {lost} ({lost / max(expected, 1):.2%}) of {expected}, duplicates {duplicates}"
+        )
+    else:
+        print("delivered          -  (no subscribers)")
+    print(f"{'latency':<12} {'count':>9} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9} {'max ms':>9}")
+    for label, histogram in (("pubcomp" if args.qos == 2 else "puback", acks), ("end-to-end", latency)):
+        summary = histogram.summary()
+        if not summary["count"]:
+            continue
+        print(
+            f"{label:<12} {summary['count']:>9} {summary['p50'] / 1e6:>9.3f} {summary['p99'] / 1e6:>9.3f} "
+            f"{summary['p999'] / 1e6:>9.3f} {summary['max'] / 1e6:>9.3f}"
+        )
+
+
+def bench(args: argparse.Namespace) -> None:
+    if args.publishers < 1 or args.topics < 1:
+        raise SystemExit("--publishers and --topics must be at least 1")
+    if args.subscribers < 0:
+        raise SystemExit("--subscribers must not be negative")
+    broker = start_local_broker() if args.local_broker else None
+    try:
+        asyncio.run(run_bench(args))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if broker is not None:
+            broker.terminate()
+            broker.wait()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="MQTT CLI helper")
     subparsers = parser.add_subparsers(dest="command")
@@ -66,7 +295,9 @@ def main() -> None:
     pub_parser.add_argument("--message", required=True)
     pub_parser.add_argument("--qos", type=int, default=0)
     pub_parser.add_argument("--retain", action="store_true")
-    pub_parser.add_argument("--json", action="store_true", help="Validate message as JSON")
+    pub_parser.add_argument(
+        "--json", action="store_true", help="Validate message as JSON and encode it with the topic codec"
+    )
     pub_parser.add_argument("--client-id", default="cli-pub")
     pub_parser.set_defaults(func=publish)
 
@@ -76,6 +307,27 @@ def main() -> None:
     sub_parser.add_argument("--client-id", default="cli-sub")
     sub_parser.set_defaults(func=subscribe)
 
+    bench_parser = subparsers.add_parser("bench", help="Measure publish/subscribe throughput and latency")
+    bench_parser.add_argument("--publishers", type=int, default=4, help="Publisher connections")
+    bench_parser.add_argument(
+        "--subscribers", type=int, default=1, help="Subscriber connections, each gets all (0 = publish only)"
+    )
+    bench_parser.add_argument("--topics", type=int, default=10, help="Topics per publisher")
+    bench_parser.add_argument("--qos", type=int, choices=(0, 1, 2), default=1)
+    bench_parser.add_argument("--payload-size", type=int, default=64, help="Bytes per message (min 16)")
+    bench_parser.add_argument("--rate", type=float, default=0.0, help="Total msg/s across publishers (0 = flat-out)")
+    bench_parser.add_argument("--duration", type=float, default=10.0, help="Seconds to publish")
+    bench_parser.add_argument("--inflight", type=int, default=100, help="Unacked QoS 1/2 messages per publisher")
+    bench_parser.add_argument("--batch", type=int, default=100, help="Messages published per event loop turn")
+    bench_parser.add_argument("--drain", type=float, default=3.0, help="Stop waiting after this long without progress")
+    bench_parser.add_argument("--client-id", default="cli-bench", help="Prefix for the -pub-NNN/-sub-NNN client ids")
+    bench_parser.add_argument(
+        "--local-broker",
+        action="store_true",
+        help="Start vfactory.broker with config/acl on VF_BROKER_PORT instead of using a running broker",
+    )
+    bench_parser.set_defaults(func=bench)
+
     args = parser.parse_args()
     if not args.command:
         parser.print_help()
@@ -1,6 +1,9 @@
 import json
 import os
-from datetime import datetime
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Callable
 
 import paho.mqtt.client as mqtt
 
@@ -15,11 +18,22 @@ QOS_STATE = 1
 QOS_STATUS = 1
 QOS_COMMAND = 1
 
+CODEC = os.getenv("VF_CODEC", "json")
+CODEC_TOPICS = os.getenv("VF_CODEC_TOPICS", "")
+
 
 def now_ts() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 
+_EPOCH_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def epoch_ns() -> int:
+    """Epoch nanoseconds that never step backwards: the monotonic clock anchored to the wall clock at import."""
+    return time.monotonic_ns() + _EPOCH_OFFSET_NS
+
+
 def topic(path: str) -> str:
     return f"{BASE_TOPIC}/{path}"
 
@@ -28,6 +42,473 @@ def json_dumps(payload: dict) -> str:
     return json.dumps(payload, separators=(",", ":"))
 
 
+def topic_category(topic_name: str) -> str:
+    parts = topic_name.split("/")
+    if parts[0] == BASE_TOPIC and len(parts) > 1:
+        return parts[1]
+    return parts[0]
+
+
+TELEMETRY_TAG = 0xC1
+TELEMETRY_KEYS = ("device_id", "device_type", "sensor", "unit", "value", "seq", "ts")
+TELEMETRY_KEYS_NS = TELEMETRY_KEYS + ("ts_ns",)
+TELEMETRY_FLAG_TS_NS = 0x01
+TELEMETRY_NUMBERS = struct.Struct("<Iqd")
+TELEMETRY_TS_NS = struct.Struct("<q")
+MSGPACK_MAP_TAGS = frozenset(range(0x80, 0x90)) | {0xDE, 0xDF}
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, payload: dict) -> str:
+        return json_dumps(payload)
+
+    def decode(self, raw: bytes) -> dict:
+        return json.loads(raw.decode("utf-8"))
+
+
+class BinaryCodec:
+    """Telemetry readings use a fixed struct layout; other objects are packed as MessagePack.
+
+    Telemetry frame: 0xC1, flags, four uint8 length-prefixed strings (device_id, device_type, sensor,
+    unit), then seq (uint32), ts (int64 epoch seconds) and value (float64), all little endian. Flag 0x01
+    appends ts_ns (int64 epoch nanoseconds). Non-object payloads stay JSON, since decode_payload only recognizes
+    telemetry frames and MessagePack maps.
+    """
+
+    name = "binary"
+
+    def __init__(self) -> None:
+        self._headers: dict[tuple, bytes] = {}
+        self._ts_cache: tuple[str, int] = ("", 0)
+        self._ts_text: tuple[int, str] = (-1, "")
+
+    def encode(self, payload: dict) -> str | bytes:
+        if not isinstance(payload, dict):
+            return json_dumps(payload)
+        keys = tuple(payload)
+        if keys == TELEMETRY_KEYS or keys == TELEMETRY_KEYS_NS:
+            packed = self._encode_telemetry(payload)
+            if packed is not None:
+                return packed
+        return msgpack_dumps(payload)
+
+    def decode(self, raw: bytes) -> dict:
+        if raw[:1] == b"\xc1":
+            try:
+                return self._decode_telemetry(raw)
+            except (IndexError, struct.error, UnicodeDecodeError) as exc:
+                raise ValueError(f"invalid telemetry payload: {exc}") from exc
+        return msgpack_loads(raw)
+
+    def _encode_telemetry(self, payload: dict) -> bytes | None:
+        value = payload["value"]
+        seq = payload["seq"]
+        if type(value) is not float or type(seq) is not int or not 0 <= seq <= 0xFFFFFFFF:
+            return None
+        ts = self._ts_seconds(payload["ts"])
+        if ts is None:
+            return None
+        ts_ns = payload.get("ts_ns")
+        if ts_ns is not None and (type(ts_ns) is not int or not 0 <= ts_ns < 2**63):
+            return None
+        flags = 0 if ts_ns is None else TELEMETRY_FLAG_TS_NS
+        key = (payload["device_id"], payload["device_type"], payload["sensor"], payload["unit"], flags)
+        header = self._headers.get(key)
+        if header is None:
+            header = self.telemetry_header(*key)
+            if header is None:
+                return None
+            if len(self._headers) > 65536:
+                self._headers.clear()
+            self._headers[key] = header
+        packed = header + TELEMETRY_NUMBERS.pack(seq, ts, value)
+        if ts_ns is not None:
+            packed += TELEMETRY_TS_NS.pack(ts_ns)
+        return packed
+
+    @staticmethod
+    def telemetry_header(device_id: str, device_type: str, sensor: str, unit: str, flags: int = 0) -> bytes | None:
+        parts = [bytes((TELEMETRY_TAG, flags))]
+        for text in (device_id, device_type, sensor, unit):
+            if not isinstance(text, str):
+                return None
+            data = text.encode("utf-8")
+            if len(data) > 255:
+                return None
+            parts.append(bytes((len(data),)) + data)
+        return b"".join(parts)
+
+    def _decode_telemetry(self, raw: bytes) -> dict:
+        pos = 2
+        texts = []
+        for _ in range(4):
+            length = raw[pos]
+            texts.append(raw[pos + 1 : pos + 1 + length].decode("utf-8"))
+            pos += 1 + length
+        seq, ts, value = TELEMETRY_NUMBERS.unpack_from(raw, pos)
+        payload = {
+            "device_id": texts[0],
+            "device_type": texts[1],
+            "sensor": texts[2],
+            "unit": texts[3],
+            "value": value,
+            "seq": seq,
+            "ts": self._ts_string(ts),
+        }
+        if raw[1] & TELEMETRY_FLAG_TS_NS:
+            payload["ts_ns"] = TELEMETRY_TS_NS.unpack_from(raw, pos + TELEMETRY_NUMBERS.size)[0]
+        return payload
+
+    def _ts_string(self, ts: int) -> str:
+        if self._ts_text[0] != ts:
+            self._ts_text = (ts, datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+        return self._ts_text[1]
+
+    def _ts_seconds(self, ts: object) -> int | None:
+        if self._ts_cache[0] == ts:
+            return self._ts_cache[1]
+        if not isinstance(ts, str):
+            return None
+        try:
+            parsed = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+        self._ts_cache = (ts, int(parsed.timestamp()))
+        return self._ts_cache[1]
+
+
+def msgpack_dumps(value: object) -> bytes:
+    out = bytearray()
+    _msgpack_pack(value, out)
+    return bytes(out)
+
+
+def _msgpack_pack(value: object, out: bytearray) -> None:
+    if value is None:
+        out.append(0xC0)
+    elif value is True:
+        out.append(0xC3)
+    elif value is False:
+        out.append(0xC2)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            out.append(value)
+        elif -32 <= value < 0:
+            out.append(value & 0xFF)
+        elif 0 <= value <= 0xFFFFFFFF:
+            out += struct.pack(">BI", 0xCE, value) if value > 0xFFFF else struct.pack(">BH", 0xCD, value)
+        elif 0 <= value <= 0xFFFFFFFFFFFFFFFF:
+            out += struct.pack(">BQ", 0xCF, value)
+        elif -(2**63) <= value < 0:
+            out += struct.pack(">Bq", 0xD3, value)
+        else:
+            raise ValueError("integer out of msgpack range")
+    elif isinstance(value, float):
+        out += struct.pack(">Bd", 0xCB, value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        length = len(data)
+        if length < 32:
+            out.append(0xA0 | length)
+        elif length < 0x100:
+            out += bytes((0xD9, length))
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xDA, length)
+        else:
+            out += struct.pack(">BI", 0xDB, length)
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        length = len(value)
+        if length < 0x100:
+            out += bytes((0xC4, length))
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xC5, length)
+        else:
+            out += struct.pack(">BI", 0xC6, length)
+        out += value
+    elif isinstance(value, (list, tuple)):
+        length = len(value)
+        if length < 16:
+            out.append(0x90 | length)
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xDC, length)
+        else:
+            out += struct.pack(">BI", 0xDD, length)
+        for item in value:
+            _msgpack_pack(item, out)
+    elif isinstance(value, dict):
+        length = len(value)
+        if length < 16:
+            out.append(0x80 | length)
+        elif length < 0x10000:
+            out += struct.pack(">BH", 0xDE, length)
+        else:
+            out += struct.pack(">BI", 0xDF, length)
+        for key, item in value.items():
+            _msgpack_pack(key, out)
+            _msgpack_pack(item, out)
+    else:
+        raise TypeError(f"cannot pack {type(value).__name__}")
+
+
+def msgpack_loads(raw: bytes) -> object:
+    try:
+        value, pos = _msgpack_unpack(raw, 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as exc:
+        raise ValueError(f"invalid msgpack payload: {exc}") from exc
+    if pos != len(raw):
+        raise ValueError("trailing bytes after msgpack payload")
+    return value
+
+
+_MSGPACK_FIXED = {
+    0xCA: struct.Struct(">f"),
+    0xCB: struct.Struct(">d"),
+    0xCC: struct.Struct(">B"),
+    0xCD: struct.Struct(">H"),
+    0xCE: struct.Struct(">I"),
+    0xCF: struct.Struct(">Q"),
+    0xD0: struct.Struct(">b"),
+    0xD1: struct.Struct(">h"),
+    0xD2: struct.Struct(">i"),
+    0xD3: struct.Struct(">q"),
+}
+_MSGPACK_LENGTHS = {
+    0xC4: (1, "bin"),
+    0xC5: (2, "bin"),
+    0xC6: (4, "bin"),
+    0xD9: (1, "str"),
+    0xDA: (2, "str"),
+    0xDB: (4, "str"),
+    0xDC: (2, "array"),
+    0xDD: (4, "array"),
+    0xDE: (2, "map"),
+    0xDF: (4, "map"),
+}
+
+
+def _msgpack_unpack(raw: bytes, pos: int) -> tuple[object, int]:
+    tag = raw[pos]
+    pos += 1
+    if tag < 0x80:
+        return tag, pos
+    if tag >= 0xE0:
+        return tag - 0x100, pos
+    if tag < 0x90:
+        return _msgpack_map(raw, pos, tag & 0x0F)
+    if tag < 0xA0:
+        return _msgpack_array(raw, pos, tag & 0x0F)
+    if tag < 0xC0:
+        end = pos + (tag & 0x1F)
+        if end > len(raw):
+            raise ValueError("truncated msgpack payload")
+        return raw[pos:end].decode("utf-8"), end
+    if tag == 0xC0:
+        return None, pos
+    if tag == 0xC2:
+        return False, pos
+    if tag == 0xC3:
+        return True, pos
+    fixed = _MSGPACK_FIXED.get(tag)
+    if fixed is not None:
+        return fixed.unpack_from(raw, pos)[0], pos + fixed.size
+    sized = _MSGPACK_LENGTHS.get(tag)
+    if sized is None:
+        raise ValueError(f"unsupported msgpack tag 0x{tag:02x}")
+    width, kind = sized
+    if pos + width > len(raw):
+        raise ValueError("truncated msgpack payload")
+    length = int.from_bytes(raw[pos : pos + width], "big")
+    pos += width
+    if kind == "array":
+        return _msgpack_array(raw, pos, length)
+    if kind == "map":
+        return _msgpack_map(raw, pos, length)
+    end = pos + length
+    if end > len(raw):
+        raise ValueError("truncated msgpack payload")
+    data = raw[pos:end]
+    return (data.decode("utf-8") if kind == "str" else bytes(data)), end
+
+
+def _msgpack_array(raw: bytes, pos: int, length: int) -> tuple[list, int]:
+    items = []
+    for _ in range(length):
+        item, pos = _msgpack_unpack(raw, pos)
+        items.append(item)
+    return items, pos
+
+
+def _msgpack_map(raw: bytes, pos: int, length: int) -> tuple[dict, int]:
+    items = {}
+    for _ in range(length):
+        key, pos = _msgpack_unpack(raw, pos)
+        value, pos = _msgpack_unpack(raw, pos)
+        items[key] = value
+    return items, pos
+
+
+CODECS = {"json": JsonCodec(), "binary": BinaryCodec()}
+
+
+def _codec_overrides(spec: str) -> dict[str, str]:
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        category, _, name = item.partition("=")
+        if name not in CODECS:
+            raise ValueError(f"unknown codec {name!r} in VF_CODEC_TOPICS")
+        overrides[category.strip()] = name
+    return overrides
+
+
+_CODEC_BY_CATEGORY = _codec_overrides(CODEC_TOPICS)
+
+
+def codec_for(topic_name: str) -> JsonCodec | BinaryCodec:
+    return CODECS[_CODEC_BY_CATEGORY.get(topic_category(topic_name), CODEC)]
+
+
+def encode_payload(topic_name: str, payload: dict) -> str | bytes:
+    return codec_for(topic_name).encode(payload)
+
+
+def decode_payload(raw: bytes) -> object:
+    if not raw:
+        raise ValueError("empty payload")
+    first = raw[0]
+    if first == TELEMETRY_TAG or first in MSGPACK_MAP_TAGS:
+        return CODECS["binary"].decode(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def payload_text(raw: bytes) -> str:
+    if raw and (raw[0] == TELEMETRY_TAG or raw[0] in MSGPACK_MAP_TAGS):
+        try:
+            return json_dumps(decode_payload(raw))
+        except (ValueError, TypeError):
+            pass
+    return raw.decode("utf-8", errors="replace")
+
+
+def telemetry_readings(sensor: str | None, payload: dict) -> list[tuple[str, dict]]:
+    if sensor is not None:
+        return [(sensor, payload)]
+    readings = payload.get("sensors")
+    if not isinstance(readings, dict):
+        return []
+    return [(name, reading) for name, reading in readings.items() if isinstance(reading, dict)]
+
+
+class TopicPath:
+    """A topic split once into the factory's segments: category/device[/sensor], or commands/source/device."""
+
+    __slots__ = ("topic", "levels", "category", "device", "sensor", "source")
+
+    def __init__(self, topic_name: str) -> None:
+        levels = topic_name.split("/")
+        self.topic = topic_name
+        self.levels = levels
+        self.category = None
+        self.device = None
+        self.sensor = None
+        self.source = None
+        if levels[0] != BASE_TOPIC or len(levels) < 2:
+            return
+        self.category = levels[1]
+        if self.category == "commands":
+            self.source = levels[2] if len(levels) > 2 else None
+            self.device = levels[3] if len(levels) > 3 else None
+        else:
+            self.device = levels[2] if len(levels) > 2 else None
+            self.sensor = levels[3] if len(levels) > 3 else None
+
+
+def valid_filter(sub_filter: str) -> bool:
+    if not sub_filter:
+        return False
+    levels = sub_filter.split("/")
+    for index, level in enumerate(levels):
+        if "#" in level and (level != "#" or index != len(levels) - 1):
+            return False
+        if "+" in level and level != "+":
+            return False
+    return True
+
+
+class _RouteNode:
+    __slots__ = ("children", "handlers")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _RouteNode] = {}
+        self.handlers: list[tuple[int, Callable]] = []
+
+
+class TopicRouter:
+    """Dispatches topics to handlers registered by MQTT filter.
+
+    Filters are compiled into a level trie with '+' and '#' edges; the parsed TopicPath and the matching handlers
+    are cached per concrete topic, so steady-state dispatch is one dict lookup. `max_cached=0` disables the cache.
+    """
+
+    def __init__(self, max_cached: int = 65536) -> None:
+        self.root = _RouteNode()
+        self.max_cached = max_cached
+        self._order = 0
+        self._cache: dict[str, tuple[TopicPath, tuple[Callable, ...]]] = {}
+
+    def route(self, sub_filter: str, handler: Callable) -> None:
+        node = self.root
+        for level in sub_filter.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _RouteNode()
+            node = child
+        node.handlers.append((self._order, handler))
+        self._order += 1
+        self._cache.clear()
+
+    def match(self, topic_name: str) -> tuple[TopicPath, tuple[Callable, ...]]:
+        cached = self._cache.get(topic_name)
+        if cached is not None:
+            return cached
+        path = TopicPath(topic_name)
+        found: list[tuple[int, Callable]] = []
+        self._collect(self.root, path.levels, 0, found, topic_name.startswith("$"))
+        handlers = tuple(dict.fromkeys(handler for _order, handler in sorted(found, key=lambda item: item[0])))
+        if self.max_cached > 0:
+            if len(self._cache) >= self.max_cached:
+                self._cache.clear()
+            self._cache[topic_name] = (path, handlers)
+        return path, handlers
+
+    def _collect(self, node: _RouteNode, levels: list[str], index: int, found: list, skip_wildcards: bool) -> None:
+        children = node.children
+        if not skip_wildcards:
+            hash_node = children.get("#")
+            if hash_node is not None:
+                found.extend(hash_node.handlers)
+        if index == len(levels):
+            found.extend(node.handlers)
+            return
+        child = children.get(levels[index])
+        if child is not None:
+            self._collect(child, levels, index + 1, found, False)
+        if not skip_wildcards:
+            plus = children.get("+")
+            if plus is not None:
+                self._collect(plus, levels, index + 1, found, False)
+
+    def dispatch(self, topic_name: str, *args) -> TopicPath | None:
+        path, handlers = self.match(topic_name)
+        if not handlers:
+            return None
+        for handler in handlers:
+            handler(path, *args)
+        return path
+
+
 def log(prefix: str, message: str) -> None:
     ts = datetime.now().strftime("%H:%M:%S")
     print(f"[{ts}] {prefix}: {message}", flush=True)
@@ -43,9 +524,25 @@ def create_client(
 ) -> mqtt.Client:
     client = mqtt.Client(client_id=client_id, clean_session=clean_session, protocol=mqtt.MQTTv311)
     if lwt_topic and lwt_payload is not None:
-        client.will_set(lwt_topic, payload=json_dumps(lwt_payload), qos=lwt_qos, retain=lwt_retain)
+        client.will_set(lwt_topic, payload=encode_payload(lwt_topic, lwt_payload), qos=lwt_qos, retain=lwt_retain)
     return client
 
 
-def connect(client: mqtt.Client) -> None:
-    client.connect(BROKER_HOST, BROKER_PORT, KEEPALIVE)
+def connect(
+    client: mqtt.Client, keepalive: int = KEEPALIVE, host: str = BROKER_HOST, port: int = BROKER_PORT
+) -> None:
+    client.connect(host, port, keepalive)
+
+
+def publish_and_wait(
+    client: mqtt.Client, topic_name: str, payload: str | bytes, qos: int = 1, retain: bool = False, timeout: float = 2.0
+) -> bool:
+    """Publish and wait up to `timeout` for the broker's ack; False rather than raising when it could not be sent."""
+    info = client.publish(topic_name, payload, qos=qos, retain=retain)
+    if info.rc != mqtt.MQTT_ERR_SUCCESS:
+        return False
+    try:
+        info.wait_for_publish(timeout=timeout)
+    except (RuntimeError, ValueError):
+        return False
+    return info.is_published()
@@ -1,92 +1,758 @@
 import argparse
-import json
+import hashlib
+import multiprocessing
+import signal
+import threading
 import time
+from bisect import bisect
+from datetime import datetime, timezone
+from typing import Callable
 
 from vfactory.common import (
     QOS_COMMAND,
+    TopicPath,
+    TopicRouter,
     connect,
     create_client,
-    json_dumps,
+    decode_payload,
+    encode_payload,
+    epoch_ns,
     log,
     now_ts,
+    payload_text,
+    publish_and_wait,
+    telemetry_readings,
     topic,
 )
+from vfactory.rules import DEFAULT_RULES, RuleEngine, covers, load_rules
 
 
-def choose_command(alarm: dict) -> tuple[str, str]:
-    sensor = alarm.get("sensor")
-    alarm_type = alarm.get("alarm_type")
-    if alarm_type == "high" and sensor in {"temperature", "pressure", "current"}:
-        return "stop", "critical threshold"
-    if alarm_type == "low":
-        return "maintenance", "low threshold"
-    return "maintenance", "alarm triggered"
+LIVE_AGE = 2.0
+CATCH_UP_SAMPLE = 32
+CATCH_UP_ORDER = {"controllers": 0, "state": 1, "status": 2, "telemetry": 3, "alarms": 4}
+
+POOL_USERNAME = "controller"
+RING_REPLICAS = 64
+# Seconds a pool member waits after its factory/controllers/+ SUBACK for the other members' retained presence
+# before subscribing to the traffic it shards, so it does not start out owning every device.
+MEMBER_SETTLE = 0.5
+
+COMMAND_STATES = {"stop": "idle", "maintenance": "maintenance", "start": "running"}
+COMMAND_PRIORITY = {"maintenance": 1, "stop": 2}
+
+
+class SensorAlarm:
+    __slots__ = ("first_s", "last_s", "limit", "alarm_type")
+
+    def __init__(self, now: float, limit: float | None, alarm_type: str | None) -> None:
+        self.first_s = now
+        self.last_s = now
+        self.limit = limit
+        self.alarm_type = alarm_type
+
+
+class DeviceCommand:
+    __slots__ = ("command", "sent_s", "state", "confirmed")
+
+    def __init__(self) -> None:
+        self.command: str | None = None
+        self.sent_s = 0.0
+        self.state: str | None = None
+        self.confirmed = False
+
+
+class AlarmGate:
+    """Turns a stream of per-tick alarms into the few commands that change something.
+
+    An alarm opens an episode per device/sensor that lasts until telemetry is back inside the limit by the
+    hysteresis margin, or no alarm arrived for `clear_after` seconds. `on_episode(device, sensor, open)` is told when
+    an episode opens and ends. Alarms younger than `debounce` seconds into their episode are held back. A command is
+    suppressed while the same or a stronger one is in effect (confirmed by the device's state) or still awaiting
+    confirmation for less than `retry` seconds.
+    """
+
+    def __init__(
+        self,
+        debounce: float = 0.0,
+        hysteresis: float = 0.05,
+        clear_after: float = 30.0,
+        retry: float = 10.0,
+        on_episode: Callable[[str, str, bool], None] | None = None,
+    ) -> None:
+        self.debounce = debounce
+        self.hysteresis = hysteresis
+        self.clear_after = clear_after
+        self.retry = retry
+        self.on_episode = on_episode
+        self.sensors: dict[tuple[str, str], SensorAlarm] = {}
+        self.devices: dict[str, DeviceCommand] = {}
+        self.alarms = 0
+        self.debounced = 0
+        self.suppressed = 0
+        self.commands = 0
+        self.cleared = 0
+
+    def alarm(self, device_id: str, sensor: str, alarm_type: str | None, limit: float | None, now: float) -> bool:
+        """Record an alarm; True once its episode has outlasted the debounce window."""
+        self.alarms += 1
+        key = (device_id, sensor)
+        entry = self.sensors.get(key)
+        if entry is None or now - entry.last_s > self.clear_after:
+            if entry is not None:
+                self.cleared += 1
+            elif self.on_episode is not None:
+                self.on_episode(device_id, sensor, True)
+            entry = self.sensors[key] = SensorAlarm(now, limit, alarm_type)
+        entry.last_s = now
+        entry.limit = limit
+        entry.alarm_type = alarm_type
+        if now - entry.first_s < self.debounce:
+            self.debounced += 1
+            return False
+        return True
+
+    def reading(self, device_id: str, sensor: str, value: object) -> None:
+        entry = self.sensors.get((device_id, sensor))
+        if entry is None or entry.limit is None or type(value) not in (int, float):
+            return
+        margin = abs(entry.limit) * self.hysteresis
+        if entry.alarm_type == "low":
+            inside = value > entry.limit + margin
+        else:
+            inside = value < entry.limit - margin
+        if inside:
+            self._end(device_id, sensor)
+
+    def expire(self, now: float) -> None:
+        """End the episodes that saw no alarm for `clear_after` seconds."""
+        for device_id, sensor in [key for key, entry in self.sensors.items() if now - entry.last_s > self.clear_after]:
+            self._end(device_id, sensor)
+
+    def _end(self, device_id: str, sensor: str) -> None:
+        del self.sensors[(device_id, sensor)]
+        self.cleared += 1
+        if self.on_episode is not None:
+            self.on_episode(device_id, sensor, False)
+
+    def state(self, device_id: str, state: str | None) -> None:
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = DeviceCommand()
+        device.state = state
+        if device.command is None:
+            return
+        if state == COMMAND_STATES.get(device.command):
+            device.confirmed = True
+        elif device.confirmed:
+            device.command = None
+            device.confirmed = False
+
+    def command(self, device_id: str, command: str, now: float) -> str | None:
+        """The command to publish for a confirmed alarm, or None when it would change nothing."""
+        device = self.devices.get(device_id)
+        if device is None:
+            device = self.devices[device_id] = DeviceCommand()
+        current = device.command
+        if current is not None and COMMAND_PRIORITY.get(current, 0) >= COMMAND_PRIORITY.get(command, 0):
+            if device.state == COMMAND_STATES.get(current) or now - device.sent_s < self.retry:
+                self.suppressed += 1
+                return None
+            command = current
+        if device.state == COMMAND_STATES.get(command):
+            device.command = command
+            device.confirmed = True
+            self.suppressed += 1
+            return None
+        device.command = command
+        device.sent_s = now
+        device.confirmed = False
+        self.commands += 1
+        return command
+
+    def report(self) -> str:
+        return (
+            f"alarms={self.alarms} debounced={self.debounced} suppressed={self.suppressed} "
+            f"commands={self.commands} cleared={self.cleared} active={len(self.sensors)}"
+        )
+
+
+def payload_age(payload: dict, now: float) -> float | None:
+    """Seconds since the payload was stamped, from ts_ns or the one-second ISO ts."""
+    ts_ns = payload.get("ts_ns")
+    if type(ts_ns) is int:
+        return now - ts_ns / 1e9
+    ts = payload.get("ts")
+    if not isinstance(ts, str):
+        return None
+    try:
+        stamped = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return now - stamped.timestamp()
+
+
+def message_age(msg, now: float) -> float | None:
+    try:
+        payload = decode_payload(msg.payload)
+    except ValueError:
+        return None
+    return payload_age(payload, now) if isinstance(payload, dict) else None
+
+
+class CatchUp:
+    """Collapses the backlog a persistent session receives on reconnect before live handling resumes.
+
+    While active, messages are only stored as the latest one per topic (so per device/sensor for alarms and
+    telemetry, per device for state). Every CATCH_UP_SAMPLE-th message is decoded to see whether the stream has
+    reached live traffic. The backlog is drained once messages are live, the stream went quiet for `idle` seconds,
+    or after `max_seconds`. Alarms older than `stale_after` seconds are dropped instead of being acted on.
+    """
+
+    def __init__(self, stale_after: float, idle: float = 0.3, max_seconds: float = 30.0) -> None:
+        self.stale_after = stale_after
+        self.idle = idle
+        self.max_seconds = max_seconds
+        self.lock = threading.Lock()
+        self.active = False
+        self.backlog: dict[str, object] = {}
+        self.started = 0.0
+        self.last = 0.0
+        self.received = 0
+        self.live = 0
+        self.stale = 0
+
+    def start(self) -> None:
+        with self.lock:
+            self.active = True
+            self.backlog.clear()
+            self.started = self.last = time.monotonic()
+            self.received = self.live = self.stale = 0
+
+    def offer(self, msg) -> bool:
+        with self.lock:
+            if not self.active:
+                return False
+            self.received += 1
+            self.backlog.pop(msg.topic, None)
+            self.backlog[msg.topic] = msg
+            self.last = time.monotonic()
+            if self.received % CATCH_UP_SAMPLE == 0:
+                age = message_age(msg, time.time())
+                self.live = self.live + 1 if age is not None and age < LIVE_AGE else 0
+            return True
+
+    def due(self, now: float) -> bool:
+        return self.active and (
+            self.live >= 3 or now - self.last >= self.idle or now - self.started >= self.max_seconds
+        )
+
+    def drain(self, handle: Callable) -> str | None:
+        """Handle the collapsed backlog in order (membership, state, status, telemetry, alarms) and end catch-up."""
+        with self.lock:
+            if not self.active:
+                return None
+            drain_started = time.monotonic()
+            now = time.time()
+            pending = sorted(
+                self.backlog.values(), key=lambda msg: CATCH_UP_ORDER.get(TopicPath(msg.topic).category, 5)
+            )
+            for msg in pending:
+                if TopicPath(msg.topic).category == "alarms":
+                    age = message_age(msg, now)
+                    if age is not None and age > self.stale_after:
+                        self.stale += 1
+                        continue
+                handle(msg)
+            finished = time.monotonic()
+            self.active = False
+            self.backlog.clear()
+            return (
+                f"catch-up: {self.received} queued messages in {drain_started - self.started:.2f}s, "
+                f"collapsed to {len(pending)}, {self.stale} stale alarms dropped, "
+                f"handled in {(finished - drain_started) * 1000:.1f} ms"
+            )
+
+
+class ShardRing:
+    """Consistent-hash ring over the live pool members: each device maps to exactly one member.
+
+    Every member builds the same ring from the same membership, so ownership needs no coordination, and a member
+    joining or leaving only moves the devices on its own arcs.
+    """
+
+    def __init__(self, replicas: int = RING_REPLICAS) -> None:
+        self.replicas = replicas
+        self.members: set[str] = set()
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self._cache: dict[str, str | None] = {}
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def update(self, member: str, online: bool) -> bool:
+        if online == (member in self.members):
+            return False
+        if online:
+            self.members.add(member)
+        else:
+            self.members.discard(member)
+        ring = sorted((self.hash(f"{name}#{index}"), name) for name in self.members for index in range(self.replicas))
+        self._points = [point for point, _name in ring]
+        self._owners = [name for _point, name in ring]
+        self._cache.clear()
+        return True
+
+    def owner(self, device_id: str) -> str | None:
+        owner = self._cache.get(device_id)
+        if owner is None and self._owners:
+            index = bisect(self._points, self.hash(device_id)) % len(self._points)
+            owner = self._cache[device_id] = self._owners[index]
+        return owner
+
+
+class Subscriptions:
+    """Reference-counted topic filters: the first want() subscribes and the last release() unsubscribes.
+
+    While paused (after a reconnect, until resume()) changes are only recorded. resume() then subscribes everything
+    wanted and unsubscribes what was released meanwhile, so a clean session gets its filters back.
+    """
+
+    def __init__(self, client, qos: int = 1) -> None:
+        self.client = client
+        self.qos = qos
+        self.counts: dict[str, int] = {}
+        self.released: set[str] = set()
+        self.active = False
+        self.lock = threading.Lock()
+
+    def want(self, sub_filter: str) -> None:
+        with self.lock:
+            count = self.counts.get(sub_filter, 0)
+            self.counts[sub_filter] = count + 1
+            self.released.discard(sub_filter)
+            if count == 0 and self.active:
+                self.client.subscribe(sub_filter, qos=self.qos)
+
+    def release(self, sub_filter: str) -> None:
+        with self.lock:
+            count = self.counts.pop(sub_filter, 0)
+            if count > 1:
+                self.counts[sub_filter] = count - 1
+            elif count == 1:
+                if self.active:
+                    self.client.unsubscribe(sub_filter)
+                else:
+                    self.released.add(sub_filter)
+
+    def pause(self) -> None:
+        with self.lock:
+            self.active = False
+
+    def resume(self) -> None:
+        with self.lock:
+            self.active = True
+            if self.released:
+                self.client.unsubscribe(list(self.released))
+                self.released.clear()
+            if self.counts:
+                self.client.subscribe([(sub_filter, self.qos) for sub_filter in self.counts])
+
+
+def member_payload(member: str, status: str) -> dict:
+    return {"member": member, "status": status, "ts": now_ts()}
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Virtual Factory central controller")
     parser.add_argument("--session", choices=["clean", "persistent"], default="clean")
     parser.add_argument("--client-id", default="controller")
+    parser.add_argument("--rules", help="JSON or YAML rule file (default: built-in alarm rules)")
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.0,
+        help="Seconds an alarm must persist before it triggers a command (0 = act on the first alarm)",
+    )
+    parser.add_argument(
+        "--hysteresis",
+        type=float,
+        default=0.05,
+        help="Fraction of the limit telemetry must move back inside before an alarm clears; the sensor's telemetry is "
+        "subscribed while its alarm is open (0 = only --clear-after)",
+    )
+    parser.add_argument("--clear-after", type=float, default=30.0, help="Seconds without alarms that clear one")
+    parser.add_argument(
+        "--command-retry",
+        type=float,
+        default=10.0,
+        help="Seconds to wait for the device to confirm a command before sending it again",
+    )
+    parser.add_argument("--report-interval", type=float, default=30.0, help="Seconds between counter reports (0 = off)")
+    parser.add_argument(
+        "--catch-up",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="After reconnecting to a persistent session, collapse the queued backlog before handling it",
+    )
+    parser.add_argument(
+        "--stale-after",
+        type=float,
+        default=60.0,
+        help="Seconds after which a queued alarm is dropped during catch-up",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Run N pool members in local processes; devices are split between them by consistent hashing",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=None,
+        help="Join the controller pool as <client-id>-<worker-id> (to spread members over several hosts)",
+    )
+    parser.add_argument(
+        "--pool-keepalive",
+        type=int,
+        default=5,
+        help="MQTT keepalive of pool members; a silent member's devices fail over after about 1.5x this",
+    )
     args = parser.parse_args()
 
+    if args.workers <= 0:
+        run(args, args.worker_id)
+        return
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    context = multiprocessing.get_context("spawn")
+
+    def spawn(index: int) -> multiprocessing.Process:
+        worker = context.Process(target=run, args=(args, str(index)), name=f"controller-{index}", daemon=True)
+        worker.start()
+        return worker
+
+    workers = [spawn(index) for index in range(args.workers)]
+    log("controller", f"started {args.workers} pool members")
+    try:
+        while True:
+            time.sleep(1.0)
+            for index, worker in enumerate(workers):
+                if not worker.is_alive():
+                    log("controller", f"member {index} exited (code {worker.exitcode}), restarting")
+                    workers[index] = spawn(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join(timeout=5)
+        log("controller", "shutdown")
+
+
+def run(args: argparse.Namespace, worker_id: str | None = None) -> None:
+    """One controller; with a worker id it is a pool member that only subscribes to the devices it owns."""
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        engine = RuleEngine(load_rules(args.rules) if args.rules else DEFAULT_RULES)
+    except (OSError, ValueError) as exc:
+        raise SystemExit(f"Invalid rules {args.rules}: {exc}")
+    subscriptions = engine.subscriptions()
+    scope = "" if worker_id is None else " for each owned device"
+    log("controller", f"{len(engine.rules)} rules, subscribing to {', '.join(subscriptions)}{scope}")
+
     clean_session = args.session == "clean"
-    client = create_client(client_id=args.client_id, clean_session=clean_session)
+    ring: ShardRing | None = None
+    if worker_id is None:
+        client_id = args.client_id
+        name = "controller"
+        client = create_client(client_id=client_id, clean_session=clean_session)
+    else:
+        client_id = name = f"{args.client_id}-{worker_id}"
+        member_topic = topic(f"controllers/{client_id}")
+        client = create_client(
+            client_id=client_id,
+            clean_session=clean_session,
+            lwt_topic=member_topic,
+            lwt_payload=member_payload(client_id, "offline"),
+        )
+        client.username_pw_set(POOL_USERNAME)
+        ring = ShardRing()
+        ring.update(client_id, True)
+    subs = Subscriptions(client)
+    # Pool members learn the devices from their retained status and subscribe per owned device.
+    known: set[str] = set()
+    owned: set[str] = set()
+    pool_lock = threading.RLock()
+    skipped = 0
+    members_mid: int | None = None
+    settle_at = 0.0
+    settled = threading.Event()
+    if ring is None:
+        settled.set()
 
     command_seq = 0
+    next_expire = 0.0
+    catch_up = CatchUp(args.stale_after)
+
+    if ring is None:
+        for sub_filter in (*subscriptions, topic("status/#"), topic("state/#")):
+            subs.want(sub_filter)
+    else:
+        subs.want(topic("status/+"))
+
+    def device_filters(device_id: str) -> list[str]:
+        return [*engine.subscriptions(device_id), topic(f"state/{device_id}")]
+
+    def episode_filters(device_id: str, sensor: str) -> list[str]:
+        """The telemetry an open alarm episode needs for the hysteresis check, unless a rule already reads it."""
+        wanted = (topic(f"telemetry/{device_id}"), topic(f"telemetry/{device_id}/{sensor}"))
+        return [name for name in wanted if not any(covers(sub_filter, name) for sub_filter in subscriptions)]
+
+    def on_episode(device_id: str, sensor: str, opened: bool) -> None:
+        for sub_filter in episode_filters(device_id, sensor):
+            if opened:
+                subs.want(sub_filter)
+            else:
+                subs.release(sub_filter)
+
+    gate = AlarmGate(
+        args.debounce,
+        args.hysteresis,
+        args.clear_after,
+        args.command_retry,
+        on_episode if args.hysteresis > 0 else None,
+    )
+
+    def rebalance() -> None:
+        """Subscribe to the devices this member now owns and drop those that moved to another member."""
+        with pool_lock:
+            for device_id in known:
+                mine = ring.owner(device_id) == client_id
+                if mine == (device_id in owned):
+                    continue
+                if mine:
+                    owned.add(device_id)
+                    for sub_filter in device_filters(device_id):
+                        subs.want(sub_filter)
+                else:
+                    owned.discard(device_id)
+                    for sub_filter in device_filters(device_id):
+                        subs.release(sub_filter)
+
+    def discover(device_id: str) -> None:
+        with pool_lock:
+            if device_id in known:
+                return
+            known.add(device_id)
+            if ring.owner(device_id) != client_id:
+                return
+            owned.add(device_id)
+            for sub_filter in device_filters(device_id):
+                subs.want(sub_filter)
 
     def on_connect(_client, _userdata, flags, rc):
+        nonlocal members_mid
         if rc == 0:
             session_present = flags.get("session present") or flags.get("session_present")
-            log("controller", f"connected (session_present={session_present})")
-            client.subscribe(topic("telemetry/#"), qos=1)
-            client.subscribe(topic("alarms/#"), qos=1)
-            client.subscribe(topic("status/#"), qos=1)
-            client.subscribe(topic("state/#"), qos=1)
+            log(name, f"connected (session_present={session_present})")
+            if session_present and args.catch_up:
+                catch_up.start()
+            if ring is None:
+                subs.resume()
+                return
+            subs.pause()
+            settled.clear()
+            _rc, members_mid = client.subscribe(topic("controllers/+"), qos=1)
+            online = encode_payload(member_topic, member_payload(client_id, "online"))
+            client.publish(member_topic, online, qos=1, retain=True)
         else:
-            log("controller", f"connect failed rc={rc}")
+            log(name, f"connect failed rc={rc}")
 
-    def on_message(_client, _userdata, msg):
+    def on_subscribe(_client, _userdata, mid, _granted_qos):
+        nonlocal settle_at
+        if mid == members_mid:
+            settle_at = time.monotonic() + MEMBER_SETTLE
+
+    def on_telemetry(path: TopicPath, msg) -> None:
+        try:
+            payload = decode_payload(msg.payload)
+        except ValueError:
+            return
+        if not isinstance(payload, dict):
+            return
+        device_id = path.device or payload.get("device_id")
+        device_type = payload.get("device_type")
+        ts_ns = payload.get("ts_ns")
+        time_s = ts_ns / 1e9 if type(ts_ns) is int else time.time()
+        now = time.monotonic()
+        for sensor, reading in telemetry_readings(path.sensor, payload):
+            value = reading.get("value")
+            if type(value) not in (int, float):
+                continue
+            gate.reading(device_id, sensor, value)
+            rule = engine.on_reading(device_id, device_type, sensor, value, time_s)
+            if rule is not None:
+                command = gate.command(device_id, rule.command, now)
+                if command is not None:
+                    send(device_id, command, rule.reason, f"{rule.name}: {sensor}={value}", None)
+
+    def send(device_id: str, command: str, reason: str, detail: str, alarm_ts_ns: int | None) -> None:
         nonlocal command_seq
-        if msg.topic.startswith(topic("alarms/")):
-            try:
-                payload = json.loads(msg.payload.decode("utf-8"))
-            except json.JSONDecodeError:
-                log("controller", "invalid alarm payload")
+        command_seq += 1
+        command_payload = {
+            "command": command,
+            "reason": reason,
+            "command_id": command_seq,
+            "device_id": device_id,
+            "ts": now_ts(),
+        }
+        if ring is not None:
+            command_payload["member"] = client_id
+        if type(alarm_ts_ns) is int:
+            command_payload["ts_ns"] = epoch_ns()
+            command_payload["alarm_ts_ns"] = alarm_ts_ns
+        command_topic = topic(f"commands/controller/{device_id}")
+        client.publish(command_topic, encode_payload(command_topic, command_payload), qos=QOS_COMMAND, retain=False)
+        log(name, f"sent {command} to {device_id} ({detail})")
+
+    def on_alarm(_path: TopicPath, msg) -> None:
+        try:
+            payload = decode_payload(msg.payload)
+        except ValueError:
+            log(name, "invalid alarm payload")
+            return
+        if not isinstance(payload, dict):
+            log(name, "invalid alarm payload")
+            return
+
+        device_id = payload.get("device_id")
+        sensor = payload.get("sensor")
+        alarm_type = payload.get("alarm_type")
+        rule = engine.on_alarm(device_id, payload.get("device_type"), sensor, alarm_type)
+        if rule is None:
+            return
+        now = time.monotonic()
+        if not gate.alarm(device_id, sensor, alarm_type, payload.get("limit"), now):
+            return
+        command = gate.command(device_id, rule.command, now)
+        if command is not None:
+            send(device_id, command, rule.reason, f"{rule.name}: {sensor}={payload.get('value')}", payload.get("ts_ns"))
+
+    def on_status(_path: TopicPath, msg) -> None:
+        log(name, f"status {payload_text(msg.payload)}")
+
+    def on_state(path: TopicPath, msg) -> None:
+        log(name, f"state {payload_text(msg.payload)}")
+        try:
+            payload = decode_payload(msg.payload)
+        except ValueError:
+            return
+        if isinstance(payload, dict):
+            gate.state(path.device or payload.get("device_id"), payload.get("state"))
+
+    def on_member(path: TopicPath, msg) -> None:
+        try:
+            payload = decode_payload(msg.payload)
+        except ValueError:
+            return
+        if not isinstance(payload, dict) or path.device == client_id:
+            return
+        with pool_lock:
+            if ring.update(path.device, payload.get("status") == "online"):
+                log(name, f"pool members: {', '.join(sorted(ring.members))}")
+                if settled.is_set():
+                    rebalance()
+
+    router = TopicRouter()
+    for sub_filter in subscriptions:
+        router.route(sub_filter, on_telemetry if TopicPath(sub_filter).category == "telemetry" else on_alarm)
+    if gate.on_episode is not None:
+        router.route(topic("telemetry/+"), on_telemetry)
+        router.route(topic("telemetry/+/+"), on_telemetry)
+    router.route(topic("status/#"), on_status)
+    router.route(topic("state/#"), on_state)
+    router.route(topic("controllers/+"), on_member)
+
+    def handle(msg) -> None:
+        nonlocal skipped
+        path, handlers = router.match(msg.topic)
+        if not handlers:
+            return
+        # Pool members see every device's status; anything else for a device they no longer own is still in flight
+        # from before a rebalance. Both are dropped before paying for payload decoding.
+        if ring is not None and path.category != "controllers":
+            if path.category == "status" and path.device is not None:
+                discover(path.device)
+            if path.device is None or ring.owner(path.device) != client_id:
+                skipped += 1
                 return
+        for handler in handlers:
+            handler(path, msg)
+
+    def finish_catch_up() -> None:
+        summary = catch_up.drain(handle)
+        if summary:
+            log(name, summary)
 
-            device_id = payload.get("device_id")
-            command, reason = choose_command(payload)
-            command_seq += 1
-            command_payload = {
-                "command": command,
-                "reason": reason,
-                "command_id": command_seq,
-                "device_id": device_id,
-                "ts": now_ts(),
-            }
-            command_topic = topic(f"commands/controller/{device_id}")
-            client.publish(command_topic, json_dumps(command_payload), qos=QOS_COMMAND, retain=False)
-            log("controller", f"sent {command} to {device_id} ({payload.get('sensor')})")
-        elif msg.topic.startswith(topic("status/")):
-            log("controller", f"status {msg.payload.decode('utf-8', errors='replace')}")
-        elif msg.topic.startswith(topic("state/")):
-            log("controller", f"state {msg.payload.decode('utf-8', errors='replace')}")
+    def on_message(_client, _userdata, msg):
+        nonlocal next_expire
+        now = time.monotonic()
+        if now >= next_expire:
+            next_expire = now + 1.0
+            gate.expire(now)
+        if catch_up.active and catch_up.offer(msg):
+            if settled.is_set() and catch_up.due(time.monotonic()):
+                finish_catch_up()
+            return
+        handle(msg)
 
     client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
     client.on_message = on_message
 
-    connect(client)
+    if ring is None:
+        connect(client)
+    else:
+        connect(client, args.pool_keepalive)
     client.loop_start()
 
+    def report() -> str:
+        line = f"{gate.report()} rule_evaluations={engine.evaluations} subscriptions={len(subs.counts)}"
+        if ring is not None:
+            line += f" skipped={skipped} members={len(ring.members)} devices={len(owned)}"
+        return line
+
+    next_report = time.monotonic() + args.report_interval
     try:
         while True:
-            time.sleep(0.5)
+            time.sleep(0.1)
+            if settle_at and time.monotonic() >= settle_at:
+                settle_at = 0.0
+                with pool_lock:
+                    log(name, f"pool members: {', '.join(sorted(ring.members))}")
+                    rebalance()
+                    subs.resume()
+                    settled.set()
+            if settled.is_set() and catch_up.due(time.monotonic()):
+                finish_catch_up()
+            if args.report_interval > 0 and time.monotonic() >= next_report:
+                next_report += args.report_interval
+                log(name, report())
     except KeyboardInterrupt:
         pass
     finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        if ring is not None:
+            offline = encode_payload(member_topic, member_payload(client_id, "offline"))
+            publish_and_wait(client, member_topic, offline, retain=True)
         client.loop_stop()
         client.disconnect()
-        log("controller", "shutdown")
+        log(name, report())
+        log(name, "shutdown")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,17 @@
 import argparse
 import asyncio
 import json
+import math
+import multiprocessing
+import os
 import pathlib
+import struct
+import tempfile
+import threading
+import time
+import zlib
 from collections import deque
+from typing import Callable
 
 from aiohttp import web
 
@@ -11,31 +20,310 @@ from vfactory.common import (
     BROKER_HOST,
     BROKER_PORT,
     QOS_COMMAND,
+    TopicPath,
+    TopicRouter,
     connect,
     create_client,
-    json_dumps,
+    decode_payload,
+    encode_payload,
+    epoch_ns,
     log,
     now_ts,
+    payload_text,
+    telemetry_readings,
     topic,
+    valid_filter,
 )
+from vfactory.history import METHODS, HistoryStore
+from vfactory.mqtt_asyncio import AsyncioMQTT
+from vfactory.tsdb import TSDB
 
 
 STATIC_DIR = pathlib.Path(__file__).parent / "static"
 
+MQTT_DRIVERS = ("asyncio", "thread")
+MQTT_READ_BATCH = 256
+
+DROP_OLDEST = "drop-oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DISCONNECT)
+MAX_HISTORY_POINTS = 5000
+RATE_PRUNE_MIN = 1024
+IPC_HEADER = struct.Struct("!I")
+IPC_MAX_BUFFER = 64 * 1024 * 1024
+WORKER_STATS_INTERVAL = 1.0
+WORKER_COUNTERS = ("clients", "frames_dropped", "clients_disconnected", "traffic_sent", "traffic_filtered")
+
+
+class MessageBridge:
+    """Bounded hand-off from the paho thread to the event loop.
+
+    The MQTT thread appends under a lock and only wakes the loop when the queue goes from empty to non-empty; the
+    loop drains up to `batch` messages per callback. Messages arriving while the queue is full are dropped and
+    counted.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        handler: Callable[[list], None],
+        max_queued: int = 50000,
+        batch: int = 1000,
+    ) -> None:
+        self.loop = loop
+        self.handler = handler
+        self.max_queued = max_queued
+        self.batch = batch
+        self.items: deque = deque()
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.dropped = 0
+        self.batches = 0
+
+    def put(self, item: object) -> None:
+        with self.lock:
+            if len(self.items) >= self.max_queued:
+                self.dropped += 1
+                return
+            self.items.append(item)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self) -> None:
+        with self.lock:
+            items = self.items
+            count = min(len(items), self.batch)
+            batch = [items.popleft() for _ in range(count)]
+            more = bool(items)
+            self.scheduled = more
+        if more:
+            self.loop.call_soon(self._drain)
+        self.batches += 1
+        self.handler(batch)
+
+
+class TrafficSubscription:
+    """A browser's traffic feed filters, compiled into a TopicRouter, each with an optional per-topic rate cap.
+
+    Every client starts subscribed to '#'. When several filters match a topic the loosest cap wins. The last send
+    time per capped topic is pruned of entries older than the longest cap whenever the table doubles, and of topics
+    no capped filter matches on unsubscribe.
+    """
+
+    def __init__(self) -> None:
+        self.intervals: dict[str, float] = {"#": 0.0}
+        self.last_sent: dict[str, float] = {}
+        self._prune_at = RATE_PRUNE_MIN
+        self._compile()
+
+    def _compile(self) -> None:
+        self.router = TopicRouter(max_cached=4096)
+        for sub_filter in self.intervals:
+            self.router.route(sub_filter, sub_filter)
+        self.everything = self.intervals == {"#": 0.0}
+
+    def subscribe(self, sub_filter: str, max_hz: float | None) -> None:
+        self.intervals[sub_filter] = 1.0 / max_hz if max_hz else 0.0
+        self._compile()
+
+    def unsubscribe(self, sub_filter: str) -> None:
+        if self.intervals.pop(sub_filter, None) is not None:
+            self._compile()
+            self.last_sent = {
+                topic_name: sent
+                for topic_name, sent in self.last_sent.items()
+                if any(self.intervals[name] > 0 for name in self.router.match(topic_name)[1])
+            }
+
+    def matches(self, topic_name: str) -> bool:
+        return bool(self.router.match(topic_name)[1])
+
+    def allows(self, topic_name: str, now: float) -> bool:
+        matched = self.router.match(topic_name)[1]
+        if not matched:
+            return False
+        interval = min(self.intervals[sub_filter] for sub_filter in matched)
+        if interval > 0:
+            last = self.last_sent.get(topic_name)
+            if last is not None and now - last < interval:
+                return False
+            self.last_sent[topic_name] = now
+            if len(self.last_sent) >= self._prune_at:
+                self._prune(now)
+        return True
+
+    def _prune(self, now: float) -> None:
+        longest = max(self.intervals.values(), default=0.0)
+        self.last_sent = {topic_name: sent for topic_name, sent in self.last_sent.items() if now - sent < longest}
+        self._prune_at = max(RATE_PRUNE_MIN, 2 * len(self.last_sent))
+
+    def describe(self) -> dict:
+        return {
+            "type": "subscriptions",
+            "filters": {
+                sub_filter: round(1.0 / interval, 3) if interval else None
+                for sub_filter, interval in self.intervals.items()
+            },
+        }
+
+
+class Frame:
+    """One serialized frame, shared by every client it is sent to and compressed at most once."""
+
+    __slots__ = ("text", "data")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.data: bytes | None = None
+
+
+class FrameCompressor:
+    """zlib-compresses frames of at least `min_bytes` into binary frames for clients that asked for them.
+
+    A shared frame is compressed once no matter how many clients receive it, unlike per-connection
+    permessage-deflate, which recompresses every frame for every socket.
+    """
+
+    def __init__(self, min_bytes: int = 8192, level: int = 6) -> None:
+        self.min_bytes = min_bytes
+        self.level = level
+        self.compressed = 0
+        self.seconds = 0.0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+
+    def encode(self, frame: Frame) -> str | bytes:
+        if len(frame.text) < self.min_bytes:
+            return frame.text
+        if frame.data is None:
+            started = time.perf_counter()
+            frame.data = zlib.compress(frame.text.encode("utf-8"), self.level)
+            self.seconds += time.perf_counter() - started
+            self.compressed += 1
+        self.raw_bytes += len(frame.text)
+        self.sent_bytes += len(frame.data)
+        return frame.data
+
+
+class ClientChannel:
+    """One browser: a bounded queue of serialized frames drained by its own writer task."""
+
+    def __init__(
+        self,
+        ws: web.WebSocketResponse,
+        max_queued: int,
+        policy: str,
+        compressor: FrameCompressor | None = None,
+    ) -> None:
+        self.ws = ws
+        self.subscription = TrafficSubscription()
+        self.max_queued = max_queued
+        self.policy = policy
+        self.compressor = compressor
+        self.queue: deque[str | bytes] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, frame: Frame) -> bool:
+        if self.closed:
+            return False
+        if len(self.queue) >= self.max_queued:
+            if self.policy == DISCONNECT:
+                self.close()
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(frame.text if self.compressor is None else self.compressor.encode(frame))
+        self.wakeup.set()
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        self.queue.clear()
+        self.wakeup.set()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                while self.queue:
+                    item = self.queue.popleft()
+                    if type(item) is bytes:
+                        await self.ws.send_bytes(item)
+                    else:
+                        await self.ws.send_str(item)
+                    self.sent += 1
+                if self.closed:
+                    break
+                self.wakeup.clear()
+                await self.wakeup.wait()
+        except ConnectionResetError:
+            self.closed = True
+        if not self.ws.closed:
+            await self.ws.close()
+
 
 class DashboardState:
-    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+    """Device and traffic state, owned by the event loop.
+
+    MQTT handlers mark changed device fields and sensors dirty; the loop flushes them at `update_hz` as one versioned
+    delta (changed fields only, plus the traffic entries seen since the previous frame). Clients that see a version
+    gap ask for a resync and get a fresh snapshot. Snapshots are serialized at most once per (version, broker
+    status); one built mid-interval may miss changes, but the next delta carries them.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        update_hz: float = 15.0,
+        client_queue: int = 256,
+        overflow: str = DROP_OLDEST,
+        history_points: int = 2400,
+        tsdb: TSDB | None = None,
+        compressor: FrameCompressor | None = None,
+        name: str = "dashboard",
+    ) -> None:
         self.loop = loop
+        self.name = name
+        self.update_interval = 1.0 / update_hz
+        self.client_queue = client_queue
+        self.overflow = overflow
+        self.version = 0
         self.devices: dict[str, dict] = {}
+        self.dirty_fields: dict[str, set[str]] = {}
+        self.dirty_sensors: dict[str, set[str]] = {}
+        self.new_devices: set[str] = set()
+        self.pending_traffic: list[dict] = []
         self.traffic = deque(maxlen=200)
-        self.websockets: set[web.WebSocketResponse] = set()
+        self.clients: set[ClientChannel] = set()
+        self.history = HistoryStore(history_points)
+        self.tsdb = tsdb
+        self.compressor = compressor
+        self.bridge: MessageBridge | None = None
         self.mqtt = None
+        self.mqtt_loop: AsyncioMQTT | None = None
+        self.messages = 0
+        self.ipc: IngestServer | None = None
+        self.upstream: IngestLink | None = None
         self.meta = {
             "base_topic": BASE_TOPIC,
             "broker_host": BROKER_HOST,
             "broker_port": BROKER_PORT,
         }
         self.broker_status = "disconnected"
+        self.dropped_frames = 0
+        self.disconnected_clients = 0
+        self.traffic_sent = 0
+        self.traffic_filtered = 0
+        self.snapshot_builds = 0
+        self.snapshot_hits = 0
+        self.snapshot_seconds = 0.0
+        self._snapshot_key: tuple[int, str] | None = None
+        self._snapshot_parts: tuple[str, list[tuple[str, str]]] = ("", [])
+        self._snapshot_frame: Frame | None = None
 
     def update_device(self, device_id: str) -> dict:
         device = self.devices.get(device_id)
@@ -50,174 +338,795 @@ class DashboardState:
                 "last_seen": None,
             }
             self.devices[device_id] = device
+            self.new_devices.add(device_id)
         return device
 
+    def set_field(self, device_id: str, device: dict, field: str, value: object) -> None:
+        if device.get(field) != value:
+            device[field] = value
+            self.dirty_fields.setdefault(device_id, set()).add(field)
+
+    def set_sensor(self, device_id: str, device: dict, name: str, reading: dict) -> None:
+        device["sensors"][name] = reading
+        self.dirty_sensors.setdefault(device_id, set()).add(name)
+
+    def set_broker_status(self, status: str) -> None:
+        self.broker_status = status
+        message = {"type": "broker", "status": status}
+        if self.ipc is not None:
+            self.ipc.broadcast(message)
+        self.broadcast(message)
+
     def record_traffic(self, entry: dict) -> None:
         self.traffic.append(entry)
+        self.pending_traffic.append(entry)
+        if len(self.pending_traffic) > self.traffic.maxlen:
+            del self.pending_traffic[: -self.traffic.maxlen]
 
-    def snapshot(self) -> dict:
+    def take_delta(self) -> dict | None:
+        if not (self.new_devices or self.dirty_fields or self.dirty_sensors or self.pending_traffic):
+            return None
+        changes: dict[str, dict] = {}
+        for device_id in self.new_devices:
+            changes[device_id] = self.devices[device_id]
+        for device_id, fields in self.dirty_fields.items():
+            if device_id not in self.new_devices:
+                device = self.devices[device_id]
+                changes.setdefault(device_id, {}).update((field, device[field]) for field in fields)
+        for device_id, names in self.dirty_sensors.items():
+            if device_id not in self.new_devices:
+                sensors = self.devices[device_id]["sensors"]
+                changes.setdefault(device_id, {})["sensors"] = {name: sensors[name] for name in names}
+        self.version += 1
+        delta = {
+            "type": "delta",
+            "version": self.version,
+            "devices": changes,
+            "traffic": self.pending_traffic,
+        }
+        self.new_devices = set()
+        self.dirty_fields = {}
+        self.dirty_sensors = {}
+        self.pending_traffic = []
+        return delta
+
+    def snapshot_message(self) -> dict:
         return {
             "type": "snapshot",
+            "version": self.version,
             "devices": self.devices,
             "traffic": list(self.traffic),
             "meta": self.meta,
             "broker_status": self.broker_status,
         }
 
-    async def broadcast(self, payload: dict) -> None:
-        if not self.websockets:
+    def apply_snapshot(self, snapshot: dict) -> None:
+        """Replace a worker's replica with the ingest process's state and resend it to every browser."""
+        self.devices = snapshot["devices"]
+        self.traffic.clear()
+        self.traffic.extend(snapshot["traffic"])
+        self.meta = snapshot["meta"]
+        self.broker_status = snapshot["broker_status"]
+        self.version = snapshot["version"]
+        self._snapshot_key = None
+        for channel in list(self.clients):
+            if not channel.offer(self.snapshot_frame(channel.subscription)):
+                self.drop_client(channel)
+
+    def apply_delta(self, delta: dict) -> None:
+        for device_id, changes in delta["devices"].items():
+            device = self.devices.get(device_id)
+            if device is None:
+                self.devices[device_id] = changes
+                continue
+            for field, value in changes.items():
+                if field == "sensors":
+                    device["sensors"].update(value)
+                else:
+                    device[field] = value
+        self.traffic.extend(delta["traffic"])
+        self.version = delta["version"]
+        self.send_delta(delta)
+
+    def send_command(self, device_id: str, command: str, reason: str) -> None:
+        if self.upstream is not None:
+            self.upstream.send({"type": "command", "device_id": device_id, "command": command, "reason": reason})
             return
-        dead = set()
-        for ws in self.websockets:
+        command_payload = {"command": command, "device_id": device_id, "reason": reason, "ts": now_ts()}
+        command_topic = topic(f"commands/dashboard/{device_id}")
+        self.mqtt.publish(command_topic, encode_payload(command_topic, command_payload), qos=QOS_COMMAND, retain=False)
+
+    def snapshot_frame(self, subscription: TrafficSubscription) -> Frame:
+        key = (self.version, self.broker_status)
+        if key != self._snapshot_key:
+            started = time.perf_counter()
+            traffic = [(entry["topic"], json.dumps(entry)) for entry in self.traffic]
+            self._snapshot_parts = (json.dumps(self.devices), traffic)
+            self._snapshot_key = key
+            self._snapshot_frame = None
+            self.snapshot_builds += 1
+            self.snapshot_seconds += time.perf_counter() - started
+        devices, traffic = self._snapshot_parts
+        if subscription.everything:
+            if self._snapshot_frame is None:
+                self._snapshot_frame = Frame(self._snapshot_text(devices, [text for _topic, text in traffic]))
+            else:
+                self.snapshot_hits += 1
+            return self._snapshot_frame
+        selected = [text for topic_name, text in traffic if subscription.matches(topic_name)]
+        return Frame(self._snapshot_text(devices, selected))
+
+    def _snapshot_text(self, devices: str, traffic: list[str]) -> str:
+        head = json.dumps(
+            {"type": "snapshot", "version": self.version, "meta": self.meta, "broker_status": self.broker_status}
+        )
+        return f'{head[:-1]}, "devices": {devices}, "traffic": [{", ".join(traffic)}]}}'
+
+    def broadcast(self, payload: dict) -> None:
+        if not self.clients:
+            return
+        frame = Frame(json.dumps(payload))
+        for channel in list(self.clients):
+            if not channel.offer(frame):
+                self.drop_client(channel)
+
+    def send_delta(self, delta: dict) -> None:
+        """Send one delta per client; traffic entries are serialized once, and only if some client selected them."""
+        if not self.clients:
+            return
+        traffic = delta.pop("traffic")
+        head = json.dumps(delta)[:-1]
+        texts: list[str | None] = [None] * len(traffic)
+
+        def frame(indexes) -> Frame:
+            selected = []
+            for index in indexes:
+                text = texts[index]
+                if text is None:
+                    text = texts[index] = json.dumps(traffic[index])
+                selected.append(text)
+            self.traffic_sent += len(selected)
+            return Frame(f'{head}, "traffic": [{", ".join(selected)}]}}')
+
+        everything = None
+        now = time.monotonic()
+        for channel in list(self.clients):
+            subscription = channel.subscription
+            if subscription.everything:
+                if everything is None:
+                    everything = frame(range(len(traffic)))
+                else:
+                    self.traffic_sent += len(traffic)
+                selected = everything
+            else:
+                indexes = [index for index, entry in enumerate(traffic) if subscription.allows(entry["topic"], now)]
+                self.traffic_filtered += len(traffic) - len(indexes)
+                selected = frame(indexes)
+            if not channel.offer(selected):
+                self.drop_client(channel)
+
+    def add_client(self, ws: web.WebSocketResponse, compressed: bool = False) -> ClientChannel:
+        channel = ClientChannel(ws, self.client_queue, self.overflow, self.compressor if compressed else None)
+        self.clients.add(channel)
+        return channel
+
+    def drop_client(self, channel: ClientChannel) -> None:
+        if channel in self.clients:
+            self.clients.discard(channel)
+            self.dropped_frames += channel.dropped
+            if channel.closed and channel.policy == DISCONNECT and not channel.ws.closed:
+                self.disconnected_clients += 1
+            channel.close()
+
+    def stats(self) -> dict:
+        stats = {
+            "broker_status": self.broker_status,
+            "messages": self.messages,
+            "cpu_seconds": round(time.process_time(), 3),
+            "clients": len(self.clients),
+            "bridge_queued": len(self.bridge.items) if self.bridge else 0,
+            "bridge_dropped": self.bridge.dropped if self.bridge else 0,
+            "frames_dropped": self.dropped_frames + sum(channel.dropped for channel in self.clients),
+            "clients_disconnected": self.disconnected_clients,
+            "history_series": len(self.history.series),
+            "traffic_sent": self.traffic_sent,
+            "traffic_filtered": self.traffic_filtered,
+            "snapshot_builds": self.snapshot_builds,
+            "snapshot_hits": self.snapshot_hits,
+            "snapshot_ms": round(self.snapshot_seconds * 1000, 1),
+        }
+        if self.compressor is not None:
+            compressor = self.compressor
+            stats["compressed_frames"] = compressor.compressed
+            stats["compress_ms"] = round(compressor.seconds * 1000, 1)
+            stats["bytes_saved"] = compressor.raw_bytes - compressor.sent_bytes
+        if self.ipc is not None:
+            stats["workers"] = len(self.ipc.workers)
+            stats["workers_dropped"] = self.ipc.dropped
+            # Browsers connect to the workers, so their counters are summed from what each worker last reported.
+            workers = dict(self.ipc.worker_stats.values())
+            for key in WORKER_COUNTERS:
+                stats[key] = sum(worker[key] for worker in workers.values())
+            stats["worker_stats"] = workers
+        return stats
+
+    async def flush_updates(self) -> None:
+        while True:
+            await asyncio.sleep(self.update_interval)
+            delta = self.take_delta()
+            if delta is not None:
+                if self.ipc is not None:
+                    self.ipc.broadcast(delta)
+                self.send_delta(delta)
+
+    async def report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.stats()
+            stats.pop("worker_stats", None)
+            log(self.name, " ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+def ipc_message(message: dict) -> bytes:
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return IPC_HEADER.pack(len(data)) + data
+
+
+async def read_ipc(reader: asyncio.StreamReader) -> dict:
+    (length,) = IPC_HEADER.unpack(await reader.readexactly(IPC_HEADER.size))
+    return json.loads(await reader.readexactly(length))
+
+
+class IngestServer:
+    """Ingest side of the multi-process mode: streams the snapshot and every delta to worker processes.
+
+    Messages are length-prefixed JSON on a Unix socket, serialized once for all workers. A worker whose socket
+    buffer passes IPC_MAX_BUFFER is disconnected; it reconnects and starts again from a fresh snapshot. Workers
+    send back dashboard commands, history and stats queries, and their own counters every WORKER_STATS_INTERVAL.
+    """
+
+    def __init__(self, state: DashboardState, path: str) -> None:
+        self.state = state
+        self.path = path
+        self.workers: set[asyncio.StreamWriter] = set()
+        self.worker_stats: dict[asyncio.StreamWriter, tuple[str, dict]] = {}
+        self.dropped = 0
+        self.server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    def broadcast(self, message: dict) -> None:
+        if not self.workers:
+            return
+        data = ipc_message(message)
+        for writer in list(self.workers):
+            if writer.transport.get_write_buffer_size() > IPC_MAX_BUFFER:
+                log(self.state.name, "dropping a worker that is not keeping up")
+                self.workers.discard(writer)
+                self.dropped += 1
+                writer.close()
+                continue
+            writer.write(data)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(ipc_message(self.state.snapshot_message()))
+        self.workers.add(writer)
+        try:
+            while True:
+                message = await read_ipc(reader)
+                if message.get("type") == "command":
+                    self.state.send_command(message["device_id"], message["command"], message["reason"])
+                elif message.get("type") == "history":
+                    result = await query_history(self.state, *message["query"])
+                    if writer in self.workers:
+                        writer.write(ipc_message({"type": "history", "id": message["id"], "result": result}))
+                elif message.get("type") == "stats":
+                    writer.write(ipc_message({"type": "stats", "id": message["id"], "result": self.state.stats()}))
+                elif message.get("type") == "worker_stats":
+                    self.worker_stats[writer] = (message["name"], message["stats"])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Shutdown; returning normally keeps asyncio's stream callback from logging the cancellation.
+            pass
+        finally:
+            self.workers.discard(writer)
+            self.worker_stats.pop(writer, None)
+            writer.close()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.workers):
+            writer.close()
+        self.workers.clear()
+        self.worker_stats.clear()
+
+
+class IngestLink:
+    """Worker side of the multi-process mode: keeps the local replica in step with the ingest process."""
+
+    def __init__(self, state: DashboardState, path: str) -> None:
+        self.state = state
+        self.path = path
+        self.writer: asyncio.StreamWriter | None = None
+        self.pending: dict[int, asyncio.Future] = {}
+        self.next_id = 0
+
+    def send(self, message: dict) -> None:
+        if self.writer is not None:
+            self.writer.write(ipc_message(message))
+
+    async def request(self, message: dict, timeout: float = 10.0) -> dict | None:
+        """Send a query to the ingest process and wait for the reply carrying the same id; None if not connected."""
+        if self.writer is None:
+            return None
+        self.next_id += 1
+        request_id = self.next_id
+        future = self.state.loop.create_future()
+        self.pending[request_id] = future
+        self.send({**message, "id": request_id})
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def request_history(self, query: list, timeout: float = 10.0) -> dict | None:
+        return await self.request({"type": "history", "query": query}, timeout)
+
+    async def request_stats(self, timeout: float = 2.0) -> dict | None:
+        return await self.request({"type": "stats"}, timeout)
+
+    async def push_stats(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_STATS_INTERVAL)
+            self.send({"type": "worker_stats", "name": self.state.name, "stats": self.state.stats()})
+
+    async def run(self) -> None:
+        state = self.state
+        while True:
             try:
-                await ws.send_str(json.dumps(payload))
-            except ConnectionResetError:
-                dead.add(ws)
-        for ws in dead:
-            self.websockets.discard(ws)
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(0.5)
+                continue
+            log(state.name, "connected to ingest")
+            try:
+                while True:
+                    message = await read_ipc(reader)
+                    kind = message["type"]
+                    if kind == "delta":
+                        state.apply_delta(message)
+                    elif kind == "snapshot":
+                        state.apply_snapshot(message)
+                    elif kind == "broker":
+                        state.set_broker_status(message["status"])
+                    elif kind in ("history", "stats"):
+                        future = self.pending.get(message["id"])
+                        if future is not None and not future.done():
+                            future.set_result(message["result"])
+            except (asyncio.IncompleteReadError, ConnectionError):
+                log(state.name, "lost ingest connection, reconnecting")
+            finally:
+                self.writer.close()
+                self.writer = None
+                for future in self.pending.values():
+                    if not future.done():
+                        future.set_result(None)
+            await asyncio.sleep(0.5)
 
 
 async def index(_request: web.Request) -> web.FileResponse:
     return web.FileResponse(STATIC_DIR / "index.html")
 
 
+async def stats_handler(request: web.Request) -> web.Response:
+    state: DashboardState = request.app["state"]
+    if state.upstream is None:
+        return web.json_response(state.stats())
+    try:
+        stats = await state.upstream.request_stats()
+    except asyncio.TimeoutError:
+        stats = None
+    if stats is None:
+        # Ingest is unreachable: this worker's replica counters are all there is.
+        return web.json_response({**state.stats(), "ingest": "unavailable", "served_by": state.name})
+    return web.json_response({**stats, "served_by": state.name})
+
+
+async def history_handler(request: web.Request) -> web.Response:
+    state: DashboardState = request.app["state"]
+    query = request.query
+    device_id = query.get("device")
+    sensor = query.get("sensor")
+    if not device_id or not sensor:
+        raise web.HTTPBadRequest(text="device and sensor are required")
+    method = query.get("method", METHODS[0])
+    if method not in METHODS:
+        raise web.HTTPBadRequest(text=f"method must be one of {', '.join(METHODS)}")
+    try:
+        start_ms = int(float(query["from"]) * 1000) if query.get("from") else None
+        end_ms = int(float(query["to"]) * 1000) if query.get("to") else None
+        points = min(max(int(query.get("points", 300)), 3), MAX_HISTORY_POINTS)
+    except ValueError:
+        raise web.HTTPBadRequest(text="from/to must be epoch seconds and points an integer")
+    if state.upstream is not None:
+        try:
+            result = await state.upstream.request_history([device_id, sensor, start_ms, end_ms, points, method])
+        except asyncio.TimeoutError:
+            raise web.HTTPServiceUnavailable(text="the ingest process did not answer the history query in time")
+    else:
+        result = await query_history(state, device_id, sensor, start_ms, end_ms, points, method)
+    if result is None:
+        raise web.HTTPNotFound(text=f"no history for {device_id}/{sensor}")
+    return web.json_response(result)
+
+
+async def query_history(
+    state: DashboardState,
+    device_id: str,
+    sensor: str,
+    start_ms: int | None,
+    end_ms: int | None,
+    points: int,
+    method: str,
+) -> dict | None:
+    oldest_ms = state.history.oldest_ms(device_id, sensor)
+    if state.tsdb is not None and (oldest_ms is None or (start_ms is not None and start_ms < oldest_ms)):
+        # Older than the in-memory rings: answer from the on-disk store as min/max buckets.
+        end_ms = end_ms if end_ms is not None else epoch_ns() // 1_000_000
+        start_ms = start_ms if start_ms is not None else end_ms - 3_600_000
+        bucket_ms = max((end_ms - start_ms) // points, 1)
+        rows = await asyncio.to_thread(state.tsdb.aggregate, device_id, sensor, start_ms, end_ms, bucket_ms)
+        if rows:
+            return {
+                "device": device_id,
+                "sensor": sensor,
+                "method": "minmax",
+                "source": "tsdb",
+                "count": sum(row[4] for row in rows),
+                "points": [row[:3] for row in rows],
+            }
+    result = state.history.query(device_id, sensor, start_ms, end_ms, points, method)
+    if result is not None:
+        result["source"] = "memory"
+    return result
+
+
 async def ws_handler(request: web.Request) -> web.WebSocketResponse:
     state: DashboardState = request.app["state"]
-    ws = web.WebSocketResponse(heartbeat=20)
+    # Clients that decompress binary frames themselves skip permessage-deflate, so shared frames are compressed once.
+    compressed = state.compressor is not None and request.query.get("compress") == "deflate"
+    ws = web.WebSocketResponse(heartbeat=20, compress=not compressed)
     await ws.prepare(request)
 
-    state.websockets.add(ws)
-    await ws.send_str(json.dumps(state.snapshot()))
+    channel = state.add_client(ws, compressed)
+    writer = asyncio.create_task(channel.run())
+    channel.offer(state.snapshot_frame(channel.subscription))
 
-    async for msg in ws:
-        if msg.type == web.WSMsgType.TEXT:
-            try:
-                payload = json.loads(msg.data)
-            except json.JSONDecodeError:
-                continue
-            if payload.get("type") == "command":
-                device_id = payload.get("device_id")
-                command = payload.get("command")
-                if device_id and command:
-                    command_payload = {
-                        "command": command,
-                        "device_id": device_id,
-                        "reason": payload.get("reason", "dashboard"),
-                        "ts": now_ts(),
-                    }
-                    state.mqtt.publish(
-                        topic(f"commands/dashboard/{device_id}"),
-                        json_dumps(command_payload),
-                        qos=QOS_COMMAND,
-                        retain=False,
-                    )
-        elif msg.type in (web.WSMsgType.CLOSE, web.WSMsgType.ERROR):
-            break
-
-    state.websockets.discard(ws)
+    try:
+        async for msg in ws:
+            if msg.type == web.WSMsgType.TEXT:
+                try:
+                    payload = json.loads(msg.data)
+                except json.JSONDecodeError:
+                    continue
+                if payload.get("type") == "resync":
+                    channel.offer(state.snapshot_frame(channel.subscription))
+                elif payload.get("type") in ("subscribe", "unsubscribe"):
+                    sub_filter = payload.get("filter")
+                    max_hz = payload.get("max_hz")
+                    if not isinstance(sub_filter, str) or not valid_filter(sub_filter):
+                        channel.offer(Frame(json.dumps({"type": "error", "error": f"invalid filter {sub_filter!r}"})))
+                        continue
+                    if max_hz is not None and (
+                        type(max_hz) not in (int, float) or not math.isfinite(max_hz) or max_hz <= 0
+                    ):
+                        channel.offer(Frame(json.dumps({"type": "error", "error": "max_hz must be a positive number"})))
+                        continue
+                    if payload["type"] == "subscribe":
+                        channel.subscription.subscribe(sub_filter, max_hz)
+                    else:
+                        channel.subscription.unsubscribe(sub_filter)
+                    channel.offer(Frame(json.dumps(channel.subscription.describe())))
+                elif payload.get("type") == "command":
+                    device_id = payload.get("device_id")
+                    command = payload.get("command")
+                    if device_id and command:
+                        state.send_command(device_id, command, payload.get("reason", "dashboard"))
+            elif msg.type in (web.WSMsgType.CLOSE, web.WSMsgType.ERROR):
+                break
+    finally:
+        state.drop_client(channel)
+        writer.cancel()
     return ws
 
 
-def start_mqtt(state: DashboardState) -> None:
+def start_mqtt(state: DashboardState, max_queued: int, driver: str = "asyncio") -> None:
+    """Subscribe to the factory topics and feed every message into `state`.
+
+    The asyncio driver runs the paho socket on the event loop, so callbacks update state directly. The thread
+    driver runs paho's network thread and hands messages over through a MessageBridge.
+    """
     client = create_client(client_id="dashboard", clean_session=True)
     state.mqtt = client
+    if driver == "asyncio":
+        set_broker_status = state.set_broker_status
+    else:
+
+        def set_broker_status(status: str) -> None:
+            state.loop.call_soon_threadsafe(state.set_broker_status, status)
 
     def on_connect(_client, _userdata, _flags, rc):
         if rc == 0:
             log("dashboard", "connected")
             client.subscribe(topic("#"), qos=1)
-            state.broker_status = "connected"
-            asyncio.run_coroutine_threadsafe(
-                state.broadcast({"type": "broker", "status": "connected"}), state.loop
-            )
+            set_broker_status("connected")
         else:
             log("dashboard", f"connect failed rc={rc}")
 
-    def on_message(_client, _userdata, msg):
-        entry = {
-            "ts": now_ts(),
-            "topic": msg.topic,
-            "qos": msg.qos,
-            "retain": msg.retain,
-            "payload": msg.payload.decode("utf-8", errors="replace"),
-        }
-        try:
-            payload = json.loads(entry["payload"])
-        except json.JSONDecodeError:
-            payload = None
-
-        parts = msg.topic.split("/")
-        if len(parts) >= 3:
-            category = parts[1]
-            if category == "commands" and len(parts) >= 4:
-                device_id = parts[3]
-            else:
-                device_id = parts[2]
-            device = state.update_device(device_id)
-            device["last_seen"] = entry["ts"]
-            if payload and isinstance(payload, dict):
-                device["device_type"] = payload.get("device_type", device.get("device_type"))
-                if category == "status":
-                    device["status"] = payload.get("status", device.get("status"))
-                elif category == "state":
-                    device["state"] = payload.get("state", device.get("state"))
-                elif category == "telemetry" and len(parts) >= 4:
-                    sensor = parts[3]
-                    device["sensors"][sensor] = {
-                        "value": payload.get("value"),
-                        "unit": payload.get("unit"),
-                        "ts": payload.get("ts"),
-                    }
-                elif category == "alarms":
-                    device["last_alarm"] = payload
-
-        state.record_traffic(entry)
-        asyncio.run_coroutine_threadsafe(state.broadcast({"type": "event", "entry": entry}), state.loop)
-        asyncio.run_coroutine_threadsafe(state.broadcast({"type": "devices", "devices": state.devices}), state.loop)
+    def on_status(path: TopicPath, device: dict, payload: dict) -> None:
+        state.set_field(path.device, device, "status", payload.get("status", device.get("status")))
+
+    def on_state(path: TopicPath, device: dict, payload: dict) -> None:
+        state.set_field(path.device, device, "state", payload.get("state", device.get("state")))
+
+    def on_telemetry(path: TopicPath, device: dict, payload: dict) -> None:
+        time_ms = epoch_ns() // 1_000_000
+        for name, reading in telemetry_readings(path.sensor, payload):
+            state.history.record(path.device, name, time_ms, reading.get("value"))
+            state.set_sensor(
+                path.device,
+                device,
+                name,
+                {"value": reading.get("value"), "unit": reading.get("unit"), "ts": payload.get("ts")},
+            )
+
+    def on_alarm(path: TopicPath, device: dict, payload: dict) -> None:
+        state.set_field(path.device, device, "last_alarm", payload)
+
+    router = TopicRouter()
+    router.route(topic("status/#"), on_status)
+    router.route(topic("state/#"), on_state)
+    router.route(topic("telemetry/#"), on_telemetry)
+    router.route(topic("alarms/#"), on_alarm)
+
+    def process(batch: list) -> None:
+        state.messages += len(batch)
+        ts = now_ts()
+        for topic_name, raw, qos, retain in batch:
+            entry = {
+                "ts": ts,
+                "topic": topic_name,
+                "qos": qos,
+                "retain": retain,
+                "payload": payload_text(raw),
+            }
+            try:
+                payload = decode_payload(raw)
+            except ValueError:
+                payload = None
+
+            path, handlers = router.match(topic_name)
+            if path.device is not None:
+                device = state.update_device(path.device)
+                state.set_field(path.device, device, "last_seen", ts)
+                if payload and isinstance(payload, dict):
+                    device_type = payload.get("device_type", device.get("device_type"))
+                    state.set_field(path.device, device, "device_type", device_type)
+                    for handler in handlers:
+                        handler(path, device, payload)
+            state.record_traffic(entry)
+
+    if driver == "asyncio":
+        pending: list[tuple] = []
+
+        def drain() -> None:
+            batch = pending[:]
+            pending.clear()
+            process(batch)
+
+        def on_message(_client, _userdata, msg):
+            if not pending:
+                state.loop.call_soon(drain)
+            pending.append((msg.topic, msg.payload, msg.qos, msg.retain))
+
+    else:
+        bridge = MessageBridge(state.loop, process, max_queued=max_queued)
+        state.bridge = bridge
+
+        def on_message(_client, _userdata, msg):
+            bridge.put((msg.topic, msg.payload, msg.qos, msg.retain))
 
     def on_disconnect(_client, _userdata, rc):
         if rc != 0:
             log("dashboard", f"disconnected rc={rc}")
-        state.broker_status = "disconnected"
-        asyncio.run_coroutine_threadsafe(
-            state.broadcast({"type": "broker", "status": "disconnected"}), state.loop
-        )
+        set_broker_status("disconnected")
 
     client.on_connect = on_connect
     client.on_message = on_message
     client.on_disconnect = on_disconnect
 
-    connect(client)
-    client.loop_start()
+    if driver == "asyncio":
+        state.mqtt_loop = AsyncioMQTT(state.loop, read_batch=MQTT_READ_BATCH)
+        state.mqtt_loop.attach(client)
+        connect(client)
+    else:
+        connect(client)
+        client.loop_start()
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="Virtual Factory dashboard")
-    parser.add_argument("--host", default="0.0.0.0")
-    parser.add_argument("--port", type=int, default=8080)
-    args = parser.parse_args()
+def stop_mqtt(state: DashboardState) -> None:
+    if state.mqtt_loop is not None:
+        state.mqtt_loop.stop()
+    elif state.mqtt is not None:
+        state.mqtt.loop_stop()
+        state.mqtt.disconnect()
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
 
-    state = DashboardState(loop)
-    start_mqtt(state)
+def create_state(args: argparse.Namespace, loop: asyncio.AbstractEventLoop, name: str = "dashboard") -> DashboardState:
+    history_points = max(int(args.history_hours * 3600 / args.history_sample_interval), 1)
+    compressor = FrameCompressor(args.compress_min_bytes, args.compress_level) if args.compress_min_bytes > 0 else None
+    return DashboardState(
+        loop,
+        update_hz=args.update_hz,
+        client_queue=args.client_queue,
+        overflow=args.overflow,
+        history_points=history_points,
+        tsdb=TSDB(args.tsdb) if args.tsdb else None,
+        compressor=compressor,
+        name=name,
+    )
 
+
+def build_app(state: DashboardState, args: argparse.Namespace, jobs: list[Callable]) -> web.Application:
     app = web.Application()
     app["state"] = state
     app.router.add_get("/", index)
     app.router.add_get("/ws", ws_handler)
+    app.router.add_get("/api/history", history_handler)
+    app.router.add_get("/api/stats", stats_handler)
     app.router.add_static("/static", STATIC_DIR)
+
+    async def on_startup(app: web.Application) -> None:
+        app["tasks"] = [asyncio.create_task(job()) for job in jobs]
+        if args.report_interval > 0:
+            app["tasks"].append(asyncio.create_task(app["state"].report(args.report_interval)))
+
     async def on_cleanup(app: web.Application) -> None:
-        mqtt_client = app["state"].mqtt
-        if mqtt_client:
-            mqtt_client.loop_stop()
-            mqtt_client.disconnect()
+        for task in app["tasks"]:
+            task.cancel()
+        stop_mqtt(app["state"])
 
+    app.on_startup.append(on_startup)
     app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def log_history(state: DashboardState) -> None:
+    log(
+        state.name,
+        f"history: {state.history.capacity} points/sensor ({state.history.bytes_per_series / 1024:.1f} KiB per sensor)",
+    )
+
+
+async def run_ingest(args: argparse.Namespace, ipc_path: str) -> None:
+    state = create_state(args, asyncio.get_running_loop(), "dashboard-ingest")
+    log_history(state)
+    state.ipc = IngestServer(state, ipc_path)
+    await state.ipc.start()
+    start_mqtt(state, args.bridge_queue, args.mqtt_driver)
+    tasks = [asyncio.create_task(state.flush_updates())]
+    if args.report_interval > 0:
+        tasks.append(asyncio.create_task(state.report(args.report_interval)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        state.ipc.close()
+        stop_mqtt(state)
+
+
+def run_worker(args: argparse.Namespace, ipc_path: str, index: int) -> None:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    # Workers only replicate state, so they keep no history rings of their own.
+    args.history_hours = 0.0
+    args.tsdb = None
+    state = create_state(args, loop, f"dashboard-{index}")
+    state.upstream = IngestLink(state, ipc_path)
+    app = build_app(state, args, [state.upstream.run, state.upstream.push_stats])
+    try:
+        web.run_app(app, host=args.host, port=args.port, loop=loop, reuse_port=True, print=None)
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Virtual Factory dashboard")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--update-hz", type=float, default=15.0, help="Device/traffic delta frames per second")
+    parser.add_argument(
+        "--mqtt-driver",
+        choices=MQTT_DRIVERS,
+        default="asyncio",
+        help="Drive the MQTT socket from the event loop, or from paho's network thread",
+    )
+    parser.add_argument(
+        "--bridge-queue",
+        type=int,
+        default=50000,
+        help="MQTT messages buffered for the event loop (thread driver)",
+    )
+    parser.add_argument("--client-queue", type=int, default=256, help="Frames buffered per browser")
+    parser.add_argument(
+        "--overflow",
+        choices=OVERFLOW_POLICIES,
+        default=DROP_OLDEST,
+        help="What to do when a browser's queue is full",
+    )
+    parser.add_argument("--report-interval", type=float, default=30.0, help="Log queue/drop counters (0 disables)")
+    parser.add_argument("--history-hours", type=float, default=1.0, help="Telemetry history kept per sensor")
+    parser.add_argument(
+        "--history-sample-interval",
+        type=float,
+        default=1.5,
+        help="Expected seconds between samples of one sensor; sizes the history ring buffers",
+    )
+    parser.add_argument("--tsdb", metavar="DIR", help="Serve history older than the rings from a vfactory.tsdb store")
+    parser.add_argument(
+        "--compress-min-bytes",
+        type=int,
+        default=8192,
+        help="Send frames at least this large pre-compressed to browsers that support it (0 disables)",
+    )
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(1, 10), metavar="1-9")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Serve HTTP/WebSocket from N worker processes fed by one ingest process (0 = single process)",
+    )
+    parser.add_argument("--ipc-path", default=None, help="Unix socket between ingest and workers")
+    args = parser.parse_args()
+
+    if args.workers <= 0:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        state = create_state(args, loop)
+        log_history(state)
+        start_mqtt(state, args.bridge_queue, args.mqtt_driver)
+        app = build_app(state, args, [state.flush_updates])
+        log("dashboard", f"serving on http://{args.host}:{args.port}")
+        web.run_app(app, host=args.host, port=args.port, loop=loop)
+        return
 
-    log("dashboard", f"serving on http://{args.host}:{args.port}")
-    web.run_app(app, host=args.host, port=args.port, loop=loop)
+    ipc_path = args.ipc_path or os.path.join(tempfile.gettempdir(), f"vfactory-dashboard-{args.port}.sock")
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(args, ipc_path, index), name=f"dashboard-{index}", daemon=True)
+        for index in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    log("dashboard", f"serving on http://{args.host}:{args.port} from {args.workers} workers")
+    try:
+        asyncio.run(run_ingest(args, ipc_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join(timeout=5)
+        if os.path.exists(ipc_path):
+            os.unlink(ipc_path)
+        log("dashboard", "shutdown")
 
 
 if __name__ == "__main__":
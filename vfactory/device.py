@@ -1,8 +1,8 @@
 import argparse
-import json
 import os
 import random
-import time
+import sys
+from datetime import datetime, timezone
 
 from vfactory.common import (
     QOS_ALARM,
@@ -10,14 +10,24 @@ from vfactory.common import (
     QOS_STATE,
     QOS_STATUS,
     QOS_TELEMETRY,
+    TELEMETRY_FLAG_TS_NS,
+    TELEMETRY_NUMBERS,
+    TELEMETRY_TS_NS,
+    BinaryCodec,
+    codec_for,
     connect,
     create_client,
+    decode_payload,
+    encode_payload,
+    epoch_ns,
     json_dumps,
     log,
     now_ts,
     topic,
 )
+from vfactory.scheduler import POLICIES, SKIP, Scheduler
 from vfactory.sim_config import ENV_STATION, MACHINES
+from vfactory.sim_engine import ALARM_HIGH, ENGINES, alarm_from_code, classify, create_engine
 
 
 STATE_OPTIONS = ["running", "idle", "maintenance"]
@@ -41,14 +51,220 @@ def pick_state(current: str) -> str:
     return current
 
 
-def simulate_value(sensor: dict, anomaly: bool) -> float:
-    value = random.gauss(sensor["base"], sensor["variance"])
-    if anomaly and random.random() < 0.06:
-        if "alarm_high" in sensor:
-            value = sensor["alarm_high"] + random.uniform(1.0, 6.0)
-        elif "alarm_low" in sensor:
-            value = sensor["alarm_low"] - random.uniform(1.0, 6.0)
-    return round(max(value, 0.0), 2)
+def resolve_config(device_id: str) -> dict | None:
+    if device_id == ENV_STATION["device_id"]:
+        return ENV_STATION
+    return MACHINES.get(device_id)
+
+
+def apply_command(state: str, command: str | None) -> str:
+    if command == "stop":
+        return "idle"
+    if command == "start":
+        return "running"
+    if command == "maintenance":
+        return "maintenance"
+    return state
+
+
+def check_alarm(sensor: dict, value: float) -> dict | None:
+    return alarm_from_code(sensor, classify(sensor, value))
+
+
+def decode_command(raw: bytes) -> dict:
+    try:
+        payload = decode_payload(raw)
+    except ValueError:
+        return {"raw": raw.decode("utf-8", errors="replace")}
+    return payload if isinstance(payload, dict) else {"raw": payload}
+
+
+def state_payload(device_id: str, device_type: str, state: str, command_ts_ns: int | None = None) -> dict:
+    payload = {
+        "device_id": device_id,
+        "device_type": device_type,
+        "state": state,
+        "ts": now_ts(),
+    }
+    if command_ts_ns is not None:
+        payload["ts_ns"] = epoch_ns()
+        payload["command_ts_ns"] = command_ts_ns
+    return payload
+
+
+def command_ts_ns(command: dict) -> int | None:
+    ts_ns = command.get("ts_ns")
+    return ts_ns if type(ts_ns) is int else None
+
+
+def status_payload(device_id: str, status: str) -> dict:
+    return {"device_id": device_id, "status": status, "ts": now_ts()}
+
+
+def telemetry_payload(
+    device_id: str,
+    device_type: str,
+    sensor: dict,
+    value: float,
+    seq: int,
+    ts: str | None = None,
+    ts_ns: int | None = None,
+) -> dict:
+    payload = {
+        "device_id": device_id,
+        "device_type": device_type,
+        "sensor": sensor["name"],
+        "unit": sensor["unit"],
+        "value": value,
+        "seq": seq,
+        "ts": ts or now_ts(),
+    }
+    if ts_ns is not None:
+        payload["ts_ns"] = ts_ns
+    return payload
+
+
+def frame_payload(
+    device_id: str,
+    device_type: str,
+    readings: list[tuple[dict, float]],
+    seq: int,
+    ts: str | None = None,
+    ts_ns: int | None = None,
+) -> dict:
+    payload = {
+        "device_id": device_id,
+        "device_type": device_type,
+        "seq": seq,
+        "ts": ts or now_ts(),
+        "sensors": {sensor["name"]: {"value": value, "unit": sensor["unit"]} for sensor, value in readings},
+    }
+    if ts_ns is not None:
+        payload["ts_ns"] = ts_ns
+    return payload
+
+
+def alarm_payload(
+    device_id: str,
+    device_type: str,
+    sensor: dict,
+    value: float,
+    alarm: dict,
+    ts: str | None = None,
+    ts_ns: int | None = None,
+) -> dict:
+    payload = {
+        "device_id": device_id,
+        "device_type": device_type,
+        "sensor": sensor["name"],
+        "unit": sensor["unit"],
+        "value": value,
+        "limit": alarm["limit"],
+        "alarm_type": alarm["type"],
+        "severity": "warning",
+        "ts": ts or now_ts(),
+    }
+    if ts_ns is not None:
+        payload["ts_ns"] = ts_ns
+    return payload
+
+
+class Tick:
+    __slots__ = ("ts", "json_suffix", "seconds", "ts_ns")
+
+    def __init__(self, high_res: bool = False) -> None:
+        self.ts_ns = epoch_ns() if high_res else None
+        now = datetime.now(timezone.utc)
+        self.ts = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+        if self.ts_ns is None:
+            self.json_suffix = f',"ts":"{self.ts}"}}'.encode("ascii")
+        else:
+            self.json_suffix = f',"ts":"{self.ts}","ts_ns":{self.ts_ns}}}'.encode("ascii")
+        self.seconds = int(now.timestamp())
+
+
+class SensorPlan:
+    __slots__ = (
+        "sensor",
+        "telemetry_topic",
+        "alarm_topic",
+        "json_prefix",
+        "binary_header",
+        "binary_header_ns",
+        "limits",
+    )
+
+    def __init__(self, device_id: str, device_type: str, sensor: dict) -> None:
+        name = sensor["name"]
+        self.sensor = sensor
+        self.telemetry_topic = sys.intern(topic(f"telemetry/{device_id}/{name}"))
+        self.alarm_topic = sys.intern(topic(f"alarms/{device_id}/{name}"))
+        fields = {"device_id": device_id, "device_type": device_type, "sensor": name, "unit": sensor["unit"]}
+        self.json_prefix = (json_dumps(fields)[:-1] + ',"value":').encode("utf-8")
+        self.binary_header = BinaryCodec.telemetry_header(device_id, device_type, name, sensor["unit"])
+        self.binary_header_ns = BinaryCodec.telemetry_header(
+            device_id, device_type, name, sensor["unit"], TELEMETRY_FLAG_TS_NS
+        )
+        self.limits = (None, sensor.get("alarm_high"), sensor.get("alarm_low"))
+
+
+class PublishPlan:
+    """Everything a device publishes per tick, resolved once: topics, codecs, payload templates and limits.
+
+    JSON telemetry is rendered as prefix + value + seq + a per-tick timestamp suffix, binary telemetry as a
+    cached header + packed numbers, so the hot loop builds no dicts and formats the timestamp once per tick.
+    """
+
+    def __init__(self, device_id: str, device_type: str, sensors: list[dict]) -> None:
+        self.device_id = device_id
+        self.device_type = device_type
+        self.sensors = [SensorPlan(device_id, device_type, sensor) for sensor in sensors]
+        self.frame_topic = sys.intern(topic(f"telemetry/{device_id}"))
+        self.state_topic = sys.intern(topic(f"state/{device_id}"))
+        self.status_topic = sys.intern(topic(f"status/{device_id}"))
+        self.binary = isinstance(codec_for(self.frame_topic), BinaryCodec)
+
+    def telemetry(self, plan: SensorPlan, value: float, seq: int, tick: Tick) -> bytes:
+        if self.binary:
+            if plan.binary_header is not None and 0 <= seq <= 0xFFFFFFFF:
+                if tick.ts_ns is None:
+                    return plan.binary_header + TELEMETRY_NUMBERS.pack(seq, tick.seconds, value)
+                numbers = TELEMETRY_NUMBERS.pack(seq, tick.seconds, value)
+                return plan.binary_header_ns + numbers + TELEMETRY_TS_NS.pack(tick.ts_ns)
+            return encode_payload(plan.telemetry_topic, self._telemetry_dict(plan, value, seq, tick))
+        return b'%b%r,"seq":%d%b' % (plan.json_prefix, value, seq, tick.json_suffix)
+
+    def _telemetry_dict(self, plan: SensorPlan, value: float, seq: int, tick: Tick) -> dict:
+        return telemetry_payload(self.device_id, self.device_type, plan.sensor, value, seq, tick.ts, tick.ts_ns)
+
+    def frame(self, values: list[float], seq: int, tick: Tick) -> bytes | str:
+        readings = [(plan.sensor, value) for plan, value in zip(self.sensors, values)]
+        payload = frame_payload(self.device_id, self.device_type, readings, seq, tick.ts, tick.ts_ns)
+        return encode_payload(self.frame_topic, payload)
+
+    def alarm(self, plan: SensorPlan, value: float, code: int, tick: Tick) -> bytes | str:
+        alarm = {"limit": plan.limits[code], "type": "high" if code == ALARM_HIGH else "low"}
+        payload = alarm_payload(self.device_id, self.device_type, plan.sensor, value, alarm, tick.ts, tick.ts_ns)
+        return encode_payload(plan.alarm_topic, payload)
+
+    def publish_telemetry(
+        self, client, values: list[float], alarms: list[int], seq: int, frames: bool, tick: Tick
+    ) -> tuple[int, int]:
+        sent = 0
+        if frames:
+            seq += 1
+            client.publish(self.frame_topic, self.frame(values, seq, tick), qos=QOS_TELEMETRY, retain=False)
+            sent += 1
+        for plan, value, code in zip(self.sensors, values, alarms):
+            if not frames:
+                seq += 1
+                payload = self.telemetry(plan, value, seq, tick)
+                client.publish(plan.telemetry_topic, payload, qos=QOS_TELEMETRY, retain=False)
+                sent += 1
+            if code:
+                client.publish(plan.alarm_topic, self.alarm(plan, value, code, tick), qos=QOS_ALARM, retain=False)
+                sent += 1
+        return sent, seq
 
 
 def main() -> None:
@@ -56,13 +272,28 @@ def main() -> None:
     parser.add_argument("--device", required=True, help="Device id (e.g., conveyor, robot_arm, press, env_station)")
     parser.add_argument("--crash-after", type=float, default=None, help="Crash after N seconds to trigger LWT")
     parser.add_argument("--anomaly", action="store_true", help="Enable random sensor anomalies")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="python", help="Telemetry generator")
+    parser.add_argument("--seed", type=int, default=None, help="Seed the simulation for reproducible runs")
+    parser.add_argument(
+        "--tick-policy",
+        choices=POLICIES,
+        default=SKIP,
+        help="What to do with ticks missed while the process was busy",
+    )
+    parser.add_argument("--lateness-report", type=float, default=0.0, help="Log tick lateness every N seconds")
+    parser.add_argument(
+        "--frames",
+        action="store_true",
+        help="Publish one telemetry/<device> frame per tick instead of one message per sensor",
+    )
+    parser.add_argument(
+        "--ts-ns",
+        action="store_true",
+        help="Add a high-resolution ts_ns (epoch nanoseconds) to telemetry and alarms",
+    )
     args = parser.parse_args()
 
-    if args.device == ENV_STATION["device_id"]:
-        config = ENV_STATION
-    else:
-        config = MACHINES.get(args.device)
-
+    config = resolve_config(args.device)
     if not config:
         raise SystemExit(f"Unknown device: {args.device}")
 
@@ -71,15 +302,19 @@ def main() -> None:
     interval = config.get("interval", 1.5)
     state_interval = config.get("state_interval", 10.0)
     device_type = config.get("type", "environment")
+    if args.seed is not None:
+        random.seed(args.seed)
+    engine = create_engine(args.engine, sensors, anomaly=args.anomaly, seed=args.seed)
 
-    status_topic = topic(f"status/{device_id}")
-    lwt_payload = {"device_id": device_id, "status": "offline", "ts": now_ts()}
+    plan = PublishPlan(device_id, device_type, sensors)
+    status_topic = plan.status_topic
+    state_topic = plan.state_topic
 
     client = create_client(
         client_id=device_id,
         clean_session=True,
         lwt_topic=status_topic,
-        lwt_payload=lwt_payload,
+        lwt_payload=status_payload(device_id, "offline"),
         lwt_qos=QOS_STATUS,
         lwt_retain=True,
     )
@@ -87,42 +322,28 @@ def main() -> None:
     state = "running"
     seq = 0
 
-    def publish_state() -> None:
-        payload = {
-            "device_id": device_id,
-            "device_type": device_type,
-            "state": state,
-            "ts": now_ts(),
-        }
-        client.publish(topic(f"state/{device_id}"), json_dumps(payload), qos=QOS_STATE, retain=True)
+    def publish_state(command_ts: int | None = None) -> None:
+        payload = encode_payload(state_topic, state_payload(device_id, device_type, state, command_ts))
+        client.publish(state_topic, payload, qos=QOS_STATE, retain=True)
 
     def on_connect(_client, _userdata, _flags, rc):
         if rc == 0:
             log(device_id, "connected")
             client.subscribe(topic(f"commands/controller/{device_id}"), qos=QOS_COMMAND)
             client.subscribe(topic(f"commands/dashboard/{device_id}"), qos=QOS_COMMAND)
-            online_payload = {"device_id": device_id, "status": "online", "ts": now_ts()}
-            client.publish(status_topic, json_dumps(online_payload), qos=QOS_STATUS, retain=True)
+            online_payload = encode_payload(status_topic, status_payload(device_id, "online"))
+            client.publish(status_topic, online_payload, qos=QOS_STATUS, retain=True)
             publish_state()
         else:
             log(device_id, f"connect failed rc={rc}")
 
     def on_message(_client, _userdata, msg):
         nonlocal state
-        try:
-            payload = json.loads(msg.payload.decode("utf-8"))
-        except json.JSONDecodeError:
-            payload = {"raw": msg.payload.decode("utf-8", errors="replace")}
-
-        command = payload.get("command")
-        if command == "stop":
-            state = "idle"
-        elif command == "start":
-            state = "running"
-        elif command == "maintenance":
-            state = "maintenance"
+        decoded = decode_command(msg.payload)
+        command = decoded.get("command")
+        state = apply_command(state, command)
         log(device_id, f"command {command} from {msg.topic}")
-        publish_state()
+        publish_state(command_ts_ns(decoded))
 
     client.on_connect = on_connect
     client.on_message = on_message
@@ -130,73 +351,30 @@ def main() -> None:
     connect(client)
     client.loop_start()
 
-    last_state = time.time()
-    last_telemetry = time.time()
-    start_time = time.time()
+    def tick_state() -> None:
+        nonlocal state
+        state = pick_state(state)
+        publish_state()
+
+    def tick_telemetry() -> None:
+        nonlocal seq
+        values, alarms = engine.generate()
+        _sent, seq = plan.publish_telemetry(client, values[0], alarms[0], seq, args.frames, Tick(args.ts_ns))
+
+    def crash() -> None:
+        log(device_id, "simulating crash")
+        os._exit(1)
+
+    scheduler = Scheduler()
+    scheduler.every(state_interval, tick_state, name="state", policy=args.tick_policy)
+    scheduler.every(interval, tick_telemetry, name="telemetry", policy=args.tick_policy)
+    if args.crash_after:
+        scheduler.once(args.crash_after, crash)
+    if args.lateness_report:
+        scheduler.every(args.lateness_report, lambda: log(device_id, scheduler.report()), name="report")
 
     try:
-        while True:
-            now = time.time()
-
-            if now - last_state >= state_interval:
-                state = pick_state(state)
-                publish_state()
-                last_state = now
-
-            if now - last_telemetry >= interval:
-                for sensor in sensors:
-                    seq += 1
-                    value = simulate_value(sensor, args.anomaly)
-                    payload = {
-                        "device_id": device_id,
-                        "device_type": device_type,
-                        "sensor": sensor["name"],
-                        "unit": sensor["unit"],
-                        "value": value,
-                        "seq": seq,
-                        "ts": now_ts(),
-                    }
-                    client.publish(
-                        topic(f"telemetry/{device_id}/{sensor['name']}"),
-                        json_dumps(payload),
-                        qos=QOS_TELEMETRY,
-                        retain=False,
-                    )
-
-                    alarm_high = sensor.get("alarm_high")
-                    alarm_low = sensor.get("alarm_low")
-                    alarm = None
-                    if alarm_high is not None and value >= alarm_high:
-                        alarm = {"limit": alarm_high, "type": "high"}
-                    elif alarm_low is not None and value <= alarm_low:
-                        alarm = {"limit": alarm_low, "type": "low"}
-
-                    if alarm:
-                        alarm_payload = {
-                            "device_id": device_id,
-                            "device_type": device_type,
-                            "sensor": sensor["name"],
-                            "unit": sensor["unit"],
-                            "value": value,
-                            "limit": alarm["limit"],
-                            "alarm_type": alarm["type"],
-                            "severity": "warning",
-                            "ts": now_ts(),
-                        }
-                        client.publish(
-                            topic(f"alarms/{device_id}/{sensor['name']}"),
-                            json_dumps(alarm_payload),
-                            qos=QOS_ALARM,
-                            retain=False,
-                        )
-
-                last_telemetry = now
-
-            if args.crash_after and now - start_time >= args.crash_after:
-                log(device_id, "simulating crash")
-                os._exit(1)
-
-            time.sleep(0.2)
+        scheduler.run()
     except KeyboardInterrupt:
         pass
     finally:
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import os
+import random
+import resource
+import time
+from functools import partial
+from typing import Callable
+
+from vfactory.common import (
+    QOS_COMMAND,
+    QOS_STATE,
+    QOS_STATUS,
+    connect,
+    create_client,
+    encode_payload,
+    log,
+    topic,
+)
+from vfactory.device import (
+    PublishPlan,
+    Tick,
+    apply_command,
+    command_ts_ns,
+    decode_command,
+    pick_state,
+    resolve_config,
+    state_payload,
+    status_payload,
+)
+from vfactory.mqtt_asyncio import AsyncioMQTT
+from vfactory.scheduler import POLICIES, SKIP, Scheduler
+from vfactory.sim_config import ENV_STATION, MACHINES
+from vfactory.sim_engine import ENGINES, NumpyEngine, PythonEngine, create_engine, np
+
+
+TEMPLATES = [*MACHINES, ENV_STATION["device_id"]]
+
+
+class FleetDevice:
+    def __init__(self, device_id: str, config: dict, frames: bool = False) -> None:
+        self.device_id = device_id
+        self.frames = frames
+        self.device_type = config.get("type", "environment")
+        self.plan = PublishPlan(device_id, self.device_type, config["sensors"])
+        self.state = "running"
+        self.seq = 0
+        self.connected = False
+        self.status_topic = self.plan.status_topic
+        self.state_topic = self.plan.state_topic
+        self.client = create_client(
+            client_id=device_id,
+            clean_session=True,
+            lwt_topic=self.status_topic,
+            lwt_payload=status_payload(device_id, "offline"),
+            lwt_qos=QOS_STATUS,
+            lwt_retain=True,
+        )
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+
+    def publish_state(self, command_ts: int | None = None) -> None:
+        payload = state_payload(self.device_id, self.device_type, self.state, command_ts)
+        self.client.publish(self.state_topic, encode_payload(self.state_topic, payload), qos=QOS_STATE, retain=True)
+
+    def publish_telemetry(self, values: list[float], alarms: list[int], tick: Tick) -> int:
+        sent, self.seq = self.plan.publish_telemetry(self.client, values, alarms, self.seq, self.frames, tick)
+        return sent
+
+    def on_connect(self, client, _userdata, _flags, rc):
+        if rc != 0:
+            log(self.device_id, f"connect failed rc={rc}")
+            return
+        self.connected = True
+        client.subscribe(
+            [
+                (topic(f"commands/controller/{self.device_id}"), QOS_COMMAND),
+                (topic(f"commands/dashboard/{self.device_id}"), QOS_COMMAND),
+            ]
+        )
+        client.publish(
+            self.status_topic,
+            encode_payload(self.status_topic, status_payload(self.device_id, "online")),
+            qos=QOS_STATUS,
+            retain=True,
+        )
+        self.publish_state()
+
+    def on_disconnect(self, _client, _userdata, rc):
+        self.connected = False
+        if rc != 0:
+            log(self.device_id, f"disconnected rc={rc}")
+
+    def on_message(self, _client, _userdata, msg):
+        decoded = decode_command(msg.payload)
+        command = decoded.get("command")
+        self.state = apply_command(self.state, command)
+        log(self.device_id, f"command {command} from {msg.topic}")
+        self.publish_state(command_ts_ns(decoded))
+
+
+class Fleet:
+    def __init__(
+        self,
+        templates: list[str],
+        count: int,
+        prefix: str,
+        anomaly: bool,
+        engine: str,
+        seed: int | None = None,
+        frames: bool = False,
+        high_res: bool = False,
+    ) -> None:
+        self.high_res = high_res
+        self.groups: dict[str, list[FleetDevice]] = {}
+        self.configs: dict[str, dict] = {}
+        self.engines: dict[str, PythonEngine | NumpyEngine] = {}
+        self.published = 0
+        for group_index, template in enumerate(templates):
+            config = resolve_config(template)
+            if not config:
+                raise SystemExit(f"Unknown device template: {template}")
+            self.configs[template] = config
+            self.groups[template] = [
+                FleetDevice(f"{prefix}{template}-{index:05d}", config, frames) for index in range(count)
+            ]
+            self.engines[template] = create_engine(
+                engine,
+                config["sensors"],
+                devices=count,
+                anomaly=anomaly,
+                seed=None if seed is None else seed + group_index,
+            )
+
+    @property
+    def devices(self) -> list[FleetDevice]:
+        return [device for group in self.groups.values() for device in group]
+
+    async def connect_all(self, mqtt_loop: AsyncioMQTT, rate: float) -> None:
+        delay = 1.0 / rate if rate > 0 else 0.0
+        for device in self.devices:
+            mqtt_loop.attach(device.client)
+            try:
+                connect(device.client)
+            except OSError as exc:
+                log("fleet", f"{device.device_id} connect error: {exc}")
+                mqtt_loop.schedule_reconnect(device.client)
+            await asyncio.sleep(delay)
+        log("fleet", f"connect ramp complete ({len(mqtt_loop.clients)} clients)")
+
+    def schedule(self, scheduler: Scheduler, policy: str) -> None:
+        for template, config in self.configs.items():
+            scheduler.every(
+                config.get("interval", 1.5),
+                partial(self.tick_telemetry, template),
+                name=f"{template}.telemetry",
+                policy=policy,
+            )
+            scheduler.every(
+                config.get("state_interval", 10.0),
+                partial(self.tick_state, template),
+                name=f"{template}.state",
+                policy=policy,
+            )
+
+    def tick_telemetry(self, template: str) -> None:
+        values, alarms = self.engines[template].generate()
+        tick = Tick(self.high_res)
+        for device, device_values, device_alarms in zip(self.groups[template], values, alarms):
+            if device.connected:
+                self.published += device.publish_telemetry(device_values, device_alarms, tick)
+
+    def tick_state(self, template: str) -> None:
+        for device in self.groups[template]:
+            if device.connected:
+                device.state = pick_state(device.state)
+                device.publish_state()
+                self.published += 1
+
+    def reporter(self, scheduler: Scheduler) -> Callable[[], None]:
+        last = [self.published, time.monotonic()]
+
+        def report() -> None:
+            now = time.monotonic()
+            connected = sum(1 for device in self.devices if device.connected)
+            rate = (self.published - last[0]) / (now - last[1])
+            log("fleet", f"connected={connected}/{len(self.devices)} published={self.published} rate={rate:.0f}/s")
+            log("fleet", f"lateness {scheduler.report()}")
+            last[:] = [self.published, now]
+
+        return report
+
+
+def raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def crash() -> None:
+    log("fleet", "simulating crash")
+    os._exit(1)
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.seed is not None:
+        random.seed(args.seed)
+    fleet = Fleet(args.types, args.count, args.prefix, args.anomaly, args.engine, args.seed, args.frames, args.ts_ns)
+    mqtt_loop = AsyncioMQTT(asyncio.get_running_loop())
+    log("fleet", f"starting {len(fleet.devices)} devices")
+
+    scheduler = Scheduler()
+    fleet.schedule(scheduler, args.tick_policy)
+    scheduler.every(args.report_interval, fleet.reporter(scheduler), name="report")
+    if args.crash_after:
+        scheduler.once(args.crash_after, crash)
+
+    tasks = [
+        asyncio.create_task(fleet.connect_all(mqtt_loop, args.connect_rate)),
+        asyncio.create_task(scheduler.run_async()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        mqtt_loop.stop()
+        await asyncio.sleep(0.5)
+        log("fleet", "shutdown")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many simulated devices in one process")
+    parser.add_argument(
+        "--types",
+        type=lambda value: value.split(","),
+        default=TEMPLATES,
+        help=f"Comma separated device templates (default: {','.join(TEMPLATES)})",
+    )
+    parser.add_argument("--count", type=int, default=10, help="Devices per template")
+    parser.add_argument("--prefix", default="", help="Prefix for generated device ids")
+    parser.add_argument("--anomaly", action="store_true", help="Enable random sensor anomalies")
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default="numpy" if np is not None else "python",
+        help="Telemetry generator (numpy draws a whole template group per tick)",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed the simulation for reproducible runs")
+    parser.add_argument("--frames", action="store_true", help="Publish one telemetry frame per device per tick")
+    parser.add_argument("--ts-ns", action="store_true", help="Add high-resolution ts_ns to telemetry and alarms")
+    parser.add_argument("--connect-rate", type=float, default=500.0, help="New connections per second")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Log publish rate and tick lateness")
+    parser.add_argument("--tick-policy", choices=POLICIES, default=SKIP, help="How to handle missed ticks")
+    parser.add_argument("--crash-after", type=float, default=None, help="Crash after N seconds to trigger LWTs")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+POINT_BYTES = 16
+METHODS = ("minmax", "lttb", "raw")
+PRESELECT_RATIO = 4
+
+
+class RingBuffer:
+    """Fixed-capacity series of (epoch ms, float64) samples in two preallocated typed arrays."""
+
+    __slots__ = ("capacity", "times", "values", "head", "count")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.times = array("q", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, time_ms: int, value: float) -> None:
+        index = self.head
+        self.times[index] = time_ms
+        self.values[index] = value
+        self.head = index + 1 if index + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    @property
+    def oldest_ms(self) -> int | None:
+        if self.count == 0:
+            return None
+        return self.times[self.head if self.count == self.capacity else 0]
+
+    def ordered(self) -> tuple[array, array]:
+        if self.count < self.capacity:
+            return self.times[: self.count], self.values[: self.count]
+        head = self.head
+        return self.times[head:] + self.times[:head], self.values[head:] + self.values[:head]
+
+    def window(self, start_ms: int | None, end_ms: int | None) -> tuple[array, array]:
+        times, values = self.ordered()
+        low = 0 if start_ms is None else bisect_left(times, start_ms)
+        high = len(times) if end_ms is None else bisect_right(times, end_ms)
+        return times[low:high], values[low:high]
+
+    def window_arrays(self, start_ms: int | None, end_ms: int | None) -> tuple["np.ndarray", "np.ndarray"]:
+        times = np.frombuffer(self.times, dtype=np.int64)
+        values = np.frombuffer(self.values, dtype=np.float64)
+        if self.count < self.capacity:
+            times = times[: self.count]
+            values = values[: self.count]
+        elif self.head:
+            times = np.concatenate((times[self.head :], times[: self.head]))
+            values = np.concatenate((values[self.head :], values[: self.head]))
+        low = 0 if start_ms is None else int(np.searchsorted(times, start_ms, "left"))
+        high = len(times) if end_ms is None else int(np.searchsorted(times, end_ms, "right"))
+        return times[low:high], values[low:high]
+
+
+def minmax(times: array, values: array, buckets: int) -> list[list]:
+    """One [bucket start ms, min, max] row per bucket of equal sample count."""
+    count = len(values)
+    rows = []
+    for bucket in range(buckets):
+        start = bucket * count // buckets
+        end = (bucket + 1) * count // buckets
+        if start == end:
+            continue
+        chunk = values[start:end]
+        rows.append([times[start], min(chunk), max(chunk)])
+    return rows
+
+
+def minmax_arrays(times: "np.ndarray", values: "np.ndarray", buckets: int) -> list[list]:
+    starts = np.unique(np.arange(buckets) * len(values) // buckets)
+    rows = zip(
+        times[starts].tolist(),
+        np.minimum.reduceat(values, starts).tolist(),
+        np.maximum.reduceat(values, starts).tolist(),
+    )
+    return [list(row) for row in rows]
+
+
+def preselect(times: "np.ndarray", values: "np.ndarray", buckets: int) -> tuple["np.ndarray", "np.ndarray"]:
+    """MinMaxLTTB preselection: keep each bucket's min and max sample (plus the ends) before running LTTB."""
+    count = len(values)
+    size = count // buckets
+    body = values[: size * buckets].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    keep = np.concatenate(
+        (
+            [0, count - 1],
+            offsets + body.argmin(axis=1),
+            offsets + body.argmax(axis=1),
+            np.arange(size * buckets, count),
+        )
+    )
+    keep = np.unique(keep)
+    return times[keep], values[keep]
+
+
+def lttb(times: array, values: array, threshold: int) -> list[list]:
+    """Largest-Triangle-Three-Buckets: keeps the visual shape of a series with `threshold` points."""
+    count = len(values)
+    times = times.tolist()
+    values = values.tolist()
+    if threshold >= count or threshold < 3:
+        return [[time_ms, value] for time_ms, value in zip(times, values)]
+    out = [[times[0], values[0]]]
+    every = (count - 2) / (threshold - 2)
+    anchor_time = times[0]
+    anchor_value = values[0]
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        if next_end > end:
+            avg_time = sum(times[end:next_end]) / (next_end - end)
+            avg_value = sum(values[end:next_end]) / (next_end - end)
+        else:
+            avg_time = times[count - 1]
+            avg_value = values[count - 1]
+        time_span = anchor_time - avg_time
+        value_span = avg_value - anchor_value
+        best_area = -1.0
+        for time_ms, value in zip(times[start:end], values[start:end]):
+            area = abs(time_span * (value - anchor_value) + (time_ms - anchor_time) * value_span)
+            if area > best_area:
+                best_area = area
+                best_time = time_ms
+                best_value = value
+        out.append([best_time, best_value])
+        anchor_time = best_time
+        anchor_value = best_value
+    out.append([times[count - 1], values[count - 1]])
+    return out
+
+
+class HistoryStore:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.series: dict[tuple[str, str], RingBuffer] = {}
+
+    @property
+    def bytes_per_series(self) -> int:
+        return self.capacity * POINT_BYTES
+
+    def record(self, device_id: str, sensor: str, time_ms: int, value: object) -> None:
+        if type(value) is not float and type(value) is not int:
+            return
+        key = (device_id, sensor)
+        ring = self.series.get(key)
+        if ring is None:
+            ring = self.series[key] = RingBuffer(self.capacity)
+        ring.append(time_ms, value)
+
+    def oldest_ms(self, device_id: str, sensor: str) -> int | None:
+        ring = self.series.get((device_id, sensor))
+        return None if ring is None else ring.oldest_ms
+
+    def query(
+        self,
+        device_id: str,
+        sensor: str,
+        start_ms: int | None = None,
+        end_ms: int | None = None,
+        points: int = 300,
+        method: str = "minmax",
+    ) -> dict | None:
+        ring = self.series.get((device_id, sensor))
+        if ring is None:
+            return None
+        if np is None:
+            times, values = ring.window(start_ms, end_ms)
+        else:
+            times, values = ring.window_arrays(start_ms, end_ms)
+        count = len(values)
+        if method == "raw" or count <= points:
+            method = "raw"
+            rows = [[time_ms, value] for time_ms, value in zip(times.tolist(), values.tolist())]
+        elif method == "minmax":
+            rows = minmax(times, values, points) if np is None else minmax_arrays(times, values, points)
+        else:
+            if np is not None and count > points * PRESELECT_RATIO:
+                times, values = preselect(times, values, points * PRESELECT_RATIO // 2)
+            rows = lttb(times, values, points)
+        return {"device": device_id, "sensor": sensor, "method": method, "count": count, "points": rows}
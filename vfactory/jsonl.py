@@ -0,0 +1,172 @@
+"""Batched JSON Lines message log written from a background thread, with size/time rotation and gzip."""
+import gzip
+import json
+import os
+import pathlib
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from vfactory.common import decode_payload, payload_text
+
+
+DROP = "drop"
+BLOCK = "block"
+FULL_POLICIES = (DROP, BLOCK)
+
+
+class JsonlWriter:
+    """Queues (recv_ns, topic, payload, qos, retain) tuples and writes them as JSON Lines from a writer thread.
+
+    The caller only appends a tuple to a deque. The writer wakes every `flush_interval`, serializes everything
+    queued and writes it with one call, so payload decoding and disk I/O stay off the MQTT network thread. When
+    `max_queued` tuples are waiting, `on_full="drop"` discards new messages and `"block"` makes the caller wait;
+    both are counted. Files roll over at `max_bytes` or every `rotate_seconds`, and closed files are gzipped by a
+    separate thread when `compress` is set.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "observer",
+        max_bytes: int = 64 * 1024 * 1024,
+        rotate_seconds: float = 0.0,
+        compress: bool = False,
+        max_queued: int = 100_000,
+        on_full: str = DROP,
+        flush_interval: float = 0.2,
+    ) -> None:
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.max_queued = max_queued
+        self.on_full = on_full
+        self.flush_interval = flush_interval
+        self.items: deque[tuple] = deque()
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self.files = 0
+        self.bytes = 0
+        self._file = None
+        self._path: pathlib.Path | None = None
+        self._size = 0
+        self._opened = 0.0
+        self._stopping = threading.Event()
+        self._compress_queue: queue.Queue[pathlib.Path | None] = queue.Queue()
+        self._compressor = threading.Thread(target=self._compress_loop, name="jsonl-gzip", daemon=True)
+        self._thread = threading.Thread(target=self._run, name="jsonl-writer", daemon=True)
+        self._compressor.start()
+        self._thread.start()
+
+    def append(self, topic_name: str, payload: bytes, qos: int, retain: bool) -> None:
+        items = self.items
+        depth = len(items)
+        if depth >= self.max_queued:
+            if self.on_full == DROP:
+                self.dropped += 1
+                return
+            started = time.monotonic()
+            while len(items) >= self.max_queued and not self._stopping.is_set():
+                time.sleep(0.001)
+            self.blocked += 1
+            self.blocked_seconds += time.monotonic() - started
+        items.append((time.time_ns(), topic_name, payload, qos, retain))
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.flush_interval):
+            self._drain()
+        self._drain()
+        if self._file is not None:
+            self._close_file()
+
+    def _drain(self) -> None:
+        items = self.items
+        count = len(items)
+        if not count:
+            if self._file is not None and self._due():
+                self._close_file()
+            return
+        lines = []
+        for _ in range(count):
+            recv_ns, topic_name, payload, qos, retain = items.popleft()
+            try:
+                body = decode_payload(payload)
+            except ValueError:
+                body = payload_text(payload)
+            record = {
+                "ts": datetime.utcfromtimestamp(recv_ns / 1e9).isoformat(timespec="milliseconds") + "Z",
+                "recv_ns": recv_ns,
+                "topic": topic_name,
+                "qos": qos,
+                "retain": bool(retain),
+                "payload": body,
+            }
+            lines.append(json.dumps(record, separators=(",", ":"), default=str))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        if self._file is None or self._due():
+            if self._file is not None:
+                self._close_file()
+            self._open_file()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self.bytes += len(data)
+        self.written += count
+
+    def _due(self) -> bool:
+        if self._size >= self.max_bytes:
+            return True
+        return self.rotate_seconds > 0 and time.monotonic() - self._opened >= self.rotate_seconds
+
+    def _open_file(self) -> None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = self.directory / f"{self.prefix}-{stamp}.jsonl"
+        serial = 1
+        while path.exists() or path.with_suffix(".jsonl.gz").exists():
+            serial += 1
+            path = self.directory / f"{self.prefix}-{stamp}-{serial}.jsonl"
+        self._path = path
+        self._file = open(path, "wb")
+        self._size = 0
+        self._opened = time.monotonic()
+        self.files += 1
+
+    def _close_file(self) -> None:
+        self._file.close()
+        self._file = None
+        if self.compress:
+            self._compress_queue.put(self._path)
+
+    def _compress_loop(self) -> None:
+        while True:
+            path = self._compress_queue.get()
+            if path is None:
+                return
+            target = path.with_suffix(".jsonl.gz")
+            with open(path, "rb") as source, gzip.open(target, "wb") as sink:
+                shutil.copyfileobj(source, sink, 1024 * 1024)
+            os.unlink(path)
+
+    def report(self) -> str:
+        return (
+            f"written={self.written} dropped={self.dropped} blocked={self.blocked} "
+            f"blocked_ms={self.blocked_seconds * 1000:.0f} queued={len(self.items)} max_queued={self.max_depth} "
+            f"files={self.files} mb={self.bytes / 1e6:.1f}"
+        )
+
+    def close(self) -> None:
+        self._stopping.set()
+        self._thread.join()
+        self._compress_queue.put(None)
+        self._compressor.join()
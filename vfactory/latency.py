@@ -0,0 +1,183 @@
+import argparse
+import threading
+import time
+
+from vfactory.common import connect, create_client, decode_payload, epoch_ns, log, topic
+
+
+class Histogram:
+    """HDR-style log-linear histogram of non-negative integers.
+
+    Values below 2**(bits + 1) get their own bucket; above that every power of two is split into 2**bits
+    sub-buckets, so any recorded value is reported within 1/2**bits of its true magnitude.
+    """
+
+    def __init__(self, bits: int = 7) -> None:
+        self.bits = bits
+        self.sub_buckets = 1 << bits
+        self.linear_limit = 1 << (bits + 1)
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.linear_limit:
+            return value
+        shift = value.bit_length() - self.bits - 1
+        return self.linear_limit + (shift - 1) * self.sub_buckets + (value >> shift) - self.sub_buckets
+
+    def _value(self, index: int) -> int:
+        if index < self.linear_limit:
+            return index
+        shift, mantissa = divmod(index - self.linear_limit, self.sub_buckets)
+        shift += 1
+        return ((mantissa + self.sub_buckets) << shift) + (1 << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = max(int(value), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "Histogram") -> None:
+        if other.bits != self.bits:
+            raise ValueError("cannot merge histograms with different precision")
+        if other.count == 0:
+            return
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.min = other.min if self.count == 0 else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, percent: float) -> int:
+        if self.count == 0:
+            return 0
+        target = max(1, int(self.count * percent / 100.0 + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "min": self.min,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
+
+
+METRICS = (
+    ("telemetry", "telemetry publish -> observer"),
+    ("alarm", "alarm publish -> observer"),
+    ("alarm_command", "alarm publish -> controller command"),
+    ("command_state", "command -> device state"),
+)
+
+
+def format_table(histograms: dict[str, Histogram], skews: dict[str, int]) -> str:
+    lines = [f"{'path':<36} {'count':>8} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9} {'max ms':>9} {'neg':>5}"]
+    for key, label in METRICS:
+        summary = histograms[key].summary()
+        lines.append(
+            f"{label:<36} {summary['count']:>8} {summary['p50'] / 1e6:>9.3f} {summary['p99'] / 1e6:>9.3f} "
+            f"{summary['p999'] / 1e6:>9.3f} {summary['max'] / 1e6:>9.3f} {skews[key]:>5}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure end-to-end latency from ts_ns fields (run devices or the fleet with --ts-ns)"
+    )
+    parser.add_argument("--client-id", default="latency")
+    parser.add_argument("--interval", type=float, default=10.0, help="Print the table every N seconds")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after N seconds")
+    args = parser.parse_args()
+
+    histograms = {key: Histogram() for key, _label in METRICS}
+    skews = {key: 0 for key, _label in METRICS}
+    lock = threading.Lock()
+    client = create_client(client_id=args.client_id, clean_session=True)
+
+    def record(key: str, start: object, end: object) -> None:
+        if type(start) is not int or type(end) is not int:
+            return
+        delta = end - start
+        if delta < 0:
+            skews[key] += 1
+        histograms[key].record(delta)
+
+    def on_connect(_client, _userdata, _flags, rc):
+        if rc == 0:
+            log("latency", "connected")
+            client.subscribe(
+                [(topic("telemetry/#"), 0), (topic("alarms/#"), 1), (topic("commands/#"), 1), (topic("state/#"), 1)]
+            )
+        else:
+            log("latency", f"connect failed rc={rc}")
+
+    def on_message(_client, _userdata, msg):
+        received = epoch_ns()
+        try:
+            payload = decode_payload(msg.payload)
+        except ValueError:
+            return
+        if not isinstance(payload, dict):
+            return
+        category = msg.topic.split("/")[1]
+        with lock:
+            if category == "telemetry":
+                record("telemetry", payload.get("ts_ns"), received)
+            elif category == "alarms":
+                record("alarm", payload.get("ts_ns"), received)
+            elif category == "commands":
+                record("alarm_command", payload.get("alarm_ts_ns"), payload.get("ts_ns"))
+            elif category == "state":
+                record("command_state", payload.get("command_ts_ns"), payload.get("ts_ns"))
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    connect(client)
+    client.loop_start()
+
+    started = time.monotonic()
+    next_report = started + args.interval
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            time.sleep(0.2)
+            if time.monotonic() >= next_report:
+                next_report += args.interval
+                with lock:
+                    print(format_table(histograms, skews), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        with lock:
+            print(format_table(histograms, skews), flush=True)
+        log("latency", "shutdown")
+
+
+if __name__ == "__main__":
+    main()
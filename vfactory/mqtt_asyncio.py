@@ -0,0 +1,92 @@
+"""Drive paho MQTT clients from an asyncio event loop instead of network threads."""
+import asyncio
+import socket
+
+import paho.mqtt.client as mqtt
+
+from vfactory.common import log
+
+
+class AsyncioMQTT:
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        misc_interval: float = 1.0,
+        reconnect_delay: float = 2.0,
+        read_batch: int = 1,
+    ) -> None:
+        self.loop = loop
+        self.misc_interval = misc_interval
+        self.reconnect_delay = reconnect_delay
+        self.read_batch = read_batch
+        self.clients: set[mqtt.Client] = set()
+        self._misc_task: asyncio.Task | None = None
+        self._stopping = False
+
+    def attach(self, client: mqtt.Client) -> None:
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        self.clients.add(client)
+        if self._misc_task is None:
+            self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def detach(self, client: mqtt.Client) -> None:
+        self.clients.discard(client)
+
+    def _on_socket_open(self, client: mqtt.Client, _userdata, sock: socket.socket) -> None:
+        if self.read_batch > 1:
+            self.loop.add_reader(sock, self._read, client, sock)
+        else:
+            self.loop.add_reader(sock, client.loop_read)
+
+    def _read(self, client: mqtt.Client, sock: socket.socket) -> None:
+        """paho reads one packet per loop_read; keep reading while the kernel has more buffered."""
+        for _ in range(self.read_batch):
+            client.loop_read()
+            if client.socket() is not sock:
+                return
+            try:
+                if not sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT):
+                    return
+            except (BlockingIOError, InterruptedError):
+                return
+
+    def _on_socket_close(self, client: mqtt.Client, _userdata, sock: socket.socket) -> None:
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if not self._stopping and client in self.clients:
+            self.schedule_reconnect(client)
+
+    def _on_socket_register_write(self, client: mqtt.Client, _userdata, sock: socket.socket) -> None:
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, _client: mqtt.Client, _userdata, sock: socket.socket) -> None:
+        self.loop.remove_writer(sock)
+
+    def schedule_reconnect(self, client: mqtt.Client) -> None:
+        self.loop.call_later(self.reconnect_delay, self._reconnect, client)
+
+    def _reconnect(self, client: mqtt.Client) -> None:
+        if self._stopping or client not in self.clients or client.socket() is not None:
+            return
+        try:
+            client.reconnect()
+        except OSError as exc:
+            log("mqtt", f"reconnect failed: {exc}")
+            self.schedule_reconnect(client)
+
+    async def _misc_loop(self) -> None:
+        while not self._stopping:
+            for client in list(self.clients):
+                client.loop_misc()
+            await asyncio.sleep(self.misc_interval)
+
+    def stop(self) -> None:
+        self._stopping = True
+        for client in list(self.clients):
+            client.disconnect()
+            client.loop_write()
+        if self._misc_task:
+            self._misc_task.cancel()
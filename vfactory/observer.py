@@ -1,44 +1,158 @@
 import argparse
+import threading
 import time
 
-from vfactory.common import connect, create_client, log, topic
+from vfactory.capture import SEGMENT_BYTES, CaptureWriter
+from vfactory.common import (
+    TopicPath,
+    TopicRouter,
+    connect,
+    create_client,
+    json_dumps,
+    log,
+    payload_text,
+    publish_and_wait,
+    topic,
+)
+from vfactory.jsonl import DROP, FULL_POLICIES, JsonlWriter
+from vfactory.traffic import TrafficStats, format_table
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="MQTT traffic observer")
     parser.add_argument("--client-id", default="observer")
-    parser.add_argument("--topic", default=topic("#"))
+    parser.add_argument("--topic", action="append", help="Subscription filter (repeatable, default factory/#)")
     parser.add_argument("--qos", type=int, default=1)
+    parser.add_argument("--record", metavar="DIR", help="Append every message to a capture in DIR")
+    parser.add_argument("--segment-mb", type=int, default=SEGMENT_BYTES // (1024 * 1024), help="Capture segment size")
+    parser.add_argument("--quiet", action="store_true", help="Do not print messages")
+    parser.add_argument("--jsonl", metavar="DIR", help="Write messages as JSON Lines files in DIR instead of printing")
+    parser.add_argument("--jsonl-max-mb", type=float, default=64.0, help="Rotate JSONL files at this size")
+    parser.add_argument("--jsonl-rotate-minutes", type=float, default=0.0, help="Also rotate every N minutes")
+    parser.add_argument("--jsonl-gzip", action="store_true", help="Compress rotated JSONL files")
+    parser.add_argument("--jsonl-queue", type=int, default=100_000, help="Messages buffered for the JSONL writer")
+    parser.add_argument(
+        "--jsonl-on-full",
+        choices=FULL_POLICIES,
+        default=DROP,
+        help="When the JSONL queue is full, drop new messages or block the MQTT thread",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print rolling per-pattern traffic statistics instead of messages and publish them as retained JSON",
+    )
+    parser.add_argument("--stats-topic", help="Retained summary topic (default factory/stats/<client-id>)")
+    parser.add_argument("--stats-top", type=int, default=10, help="Hot and lossy devices listed per report")
+    parser.add_argument(
+        "--stats-max-tracked",
+        type=int,
+        default=100_000,
+        help="Topics and devices whose last arrival and seq are remembered",
+    )
+    parser.add_argument(
+        "--report-interval", type=float, default=10.0, help="Seconds between JSONL writer and --stats reports"
+    )
     args = parser.parse_args()
+    filters = args.topic or [topic("#")]
+    stats_topic = args.stats_topic or topic(f"stats/{args.client_id}")
 
+    writer = CaptureWriter(args.record, segment_bytes=args.segment_mb * 1024 * 1024) if args.record else None
+    jsonl = None
+    if args.jsonl:
+        jsonl = JsonlWriter(
+            args.jsonl,
+            max_bytes=int(args.jsonl_max_mb * 1024 * 1024),
+            rotate_seconds=args.jsonl_rotate_minutes * 60,
+            compress=args.jsonl_gzip,
+            max_queued=args.jsonl_queue,
+            on_full=args.jsonl_on_full,
+        )
     client = create_client(client_id=args.client_id, clean_session=True)
 
     def on_connect(_client, _userdata, _flags, rc):
         if rc == 0:
             log("observer", "connected")
-            client.subscribe(args.topic, qos=args.qos)
+            client.subscribe([(sub_filter, args.qos) for sub_filter in filters])
         else:
             log("observer", f"connect failed rc={rc}")
 
-    def on_message(_client, _userdata, msg):
-        payload = msg.payload.decode("utf-8", errors="replace")
+    def show(_path: TopicPath, msg) -> None:
+        payload = payload_text(msg.payload)
         log("observer", f"{msg.topic} qos={msg.qos} retain={msg.retain} {payload}")
 
+    traffic = TrafficStats(max_tracked=args.stats_max_tracked) if args.stats else None
+    traffic_lock = threading.Lock()
+
+    def observe(path: TopicPath, msg) -> None:
+        if msg.topic == stats_topic:
+            return
+        with traffic_lock:
+            traffic.observe(path, msg)
+
+    router = TopicRouter()
+    for sub_filter in filters:
+        if traffic is not None:
+            router.route(sub_filter, observe)
+        elif not args.quiet and jsonl is None:
+            router.route(sub_filter, show)
+
+    def on_message(_client, _userdata, msg):
+        if writer is not None:
+            writer.append(msg.topic, msg.payload, msg.qos, msg.retain)
+        if jsonl is not None:
+            jsonl.append(msg.topic, msg.payload, msg.qos, msg.retain)
+        router.dispatch(msg.topic, msg)
+
     client.on_connect = on_connect
     client.on_message = on_message
 
     connect(client)
     client.loop_start()
 
+    def report() -> None:
+        nonlocal dropped, blocked
+        if jsonl.dropped > dropped or jsonl.blocked > blocked:
+            behind = f"{jsonl.dropped - dropped} dropped, {jsonl.blocked - blocked} blocked"
+            log("observer", f"jsonl writer falling behind: {behind}")
+            dropped, blocked = jsonl.dropped, jsonl.blocked
+        log("observer", f"jsonl {jsonl.report()}")
+
+    def report_stats() -> dict:
+        with traffic_lock:
+            summary = traffic.snapshot(args.stats_top)
+        print(format_table(summary), flush=True)
+        return summary
+
+    dropped = blocked = 0
+    next_report = time.monotonic() + args.report_interval
     try:
         while True:
             time.sleep(0.5)
+            if args.report_interval > 0 and time.monotonic() >= next_report:
+                next_report += args.report_interval
+                if jsonl is not None:
+                    report()
+                if traffic is not None:
+                    client.publish(stats_topic, json_dumps(report_stats()), qos=1, retain=True)
     except KeyboardInterrupt:
         pass
     finally:
-        client.loop_stop()
-        client.disconnect()
-        log("observer", "shutdown")
+        try:
+            if traffic is not None:
+                summary = json_dumps(report_stats())
+                if not publish_and_wait(client, stats_topic, summary, retain=True):
+                    log("observer", f"could not publish the final summary to {stats_topic}")
+            client.loop_stop()
+            client.disconnect()
+        finally:
+            if writer is not None:
+                writer.close()
+                log("observer", f"recorded {writer.records} messages to {args.record}")
+            if jsonl is not None:
+                jsonl.close()
+                report()
+            log("observer", "shutdown")
 
 
 if __name__ == "__main__":
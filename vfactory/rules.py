@@ -0,0 +1,256 @@
+"""Declarative controller rules: alarm and telemetry conditions compiled into per-sensor decision tables."""
+import json
+from collections import deque
+from pathlib import Path
+
+from vfactory.common import topic
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+SOURCES = ("alarm", "telemetry")
+AGGREGATES = ("value", "mean", "rate", "time_above", "time_below")
+ALARM_TYPES = ("high", "low")
+
+DEFAULT_RULES = [
+    {
+        "name": "critical-high",
+        "on": "alarm",
+        "sensor": ["temperature", "pressure", "current"],
+        "alarm_type": "high",
+        "command": "stop",
+        "reason": "critical threshold",
+    },
+    {"name": "low", "on": "alarm", "alarm_type": "low", "command": "maintenance", "reason": "low threshold"},
+    {"name": "alarm", "on": "alarm", "command": "maintenance", "reason": "alarm triggered"},
+]
+
+
+def number(spec: dict, key: str) -> float | None:
+    value = spec.get(key)
+    if value is None:
+        return None
+    if type(value) not in (int, float):
+        raise ValueError(f"{spec.get('name')}: {key} must be a number, got {value!r}")
+    return float(value)
+
+
+def valid_level(level: object) -> bool:
+    """A device or sensor name, or '+' for any."""
+    if not isinstance(level, str) or not level:
+        return False
+    return level == "+" or not any(char in level for char in "/#+")
+
+
+class Rule:
+    __slots__ = (
+        "name",
+        "source",
+        "sensors",
+        "device",
+        "device_type",
+        "alarm_type",
+        "aggregate",
+        "window",
+        "threshold",
+        "above",
+        "below",
+        "command",
+        "reason",
+    )
+
+    def __init__(self, spec: dict) -> None:
+        if not isinstance(spec, dict):
+            raise ValueError(f"rule must be a mapping, got {spec!r}")
+        self.name = str(spec.get("name") or "")
+        if not self.name:
+            raise ValueError(f"rule without a name: {spec!r}")
+        self.source = spec.get("on", "alarm" if "alarm_type" in spec else "telemetry")
+        if self.source not in SOURCES:
+            raise ValueError(f"{self.name}: 'on' must be one of {', '.join(SOURCES)}")
+        sensors = spec.get("sensor", "+")
+        self.sensors = (sensors,) if isinstance(sensors, str) else tuple(sensors)
+        self.device = spec.get("device", "+")
+        self.device_type = spec.get("device_type")
+        for level in (*self.sensors, self.device):
+            if not valid_level(level):
+                raise ValueError(f"{self.name}: invalid device or sensor {level!r}")
+        self.alarm_type = spec.get("alarm_type")
+        if self.alarm_type is not None and self.alarm_type not in ALARM_TYPES:
+            raise ValueError(f"{self.name}: alarm_type must be one of {', '.join(ALARM_TYPES)}")
+        self.aggregate = spec.get("aggregate", "value")
+        if self.aggregate not in AGGREGATES:
+            raise ValueError(f"{self.name}: aggregate must be one of {', '.join(AGGREGATES)}")
+        self.window = float(spec.get("window", 0.0))
+        self.threshold = number(spec, "threshold")
+        self.above = number(spec, "above")
+        self.below = number(spec, "below")
+        if self.source == "telemetry":
+            if self.above is None and self.below is None:
+                raise ValueError(f"{self.name}: telemetry rules need 'above' or 'below'")
+            if self.aggregate != "value" and self.window <= 0:
+                raise ValueError(f"{self.name}: {self.aggregate} needs a positive 'window' in seconds")
+            if self.aggregate in ("time_above", "time_below") and self.threshold is None:
+                raise ValueError(f"{self.name}: {self.aggregate} needs a 'threshold'")
+        self.command = spec.get("command")
+        if not self.command:
+            raise ValueError(f"{self.name}: missing 'command'")
+        self.reason = spec.get("reason", self.name)
+
+    def applies(self, device_id: str, device_type: str | None) -> bool:
+        if self.device != "+" and self.device != device_id:
+            return False
+        return self.device_type is None or self.device_type == device_type
+
+    def holds(self, value: float | None) -> bool:
+        if value is None:
+            return False
+        if self.above is not None and not value > self.above:
+            return False
+        return self.below is None or value < self.below
+
+    def filters(self, device: str | None = None) -> list[str]:
+        """Topic filters this rule reads, for every device it covers or only for `device`."""
+        if device is None:
+            device = self.device
+        elif self.device not in ("+", device):
+            return []
+        if self.source == "alarm":
+            return [f"alarms/{device}/{sensor}" for sensor in self.sensors]
+        # Devices started with --frames publish every sensor on telemetry/<device>.
+        return [f"telemetry/{device}", *(f"telemetry/{device}/{sensor}" for sensor in self.sensors)]
+
+
+class Window:
+    """Sliding time window over one sensor stream with amortized O(1) updates.
+
+    `mean` keeps a running sum, `rate` compares the newest sample with the oldest one still in the window, and
+    `time_above`/`time_below` sum the seconds each sample held the previous value on that side of the threshold.
+    Nothing is reported until the stream has been seen for one full window, so a single first sample cannot fire.
+    """
+
+    __slots__ = ("aggregate", "seconds", "threshold", "samples", "total", "started")
+
+    def __init__(self, aggregate: str, seconds: float, threshold: float | None) -> None:
+        self.aggregate = aggregate
+        self.seconds = seconds
+        self.threshold = threshold
+        self.samples: deque[tuple[float, float, float]] = deque()
+        self.total = 0.0
+        self.started = 0.0
+
+    def add(self, time_s: float, value: float) -> float | None:
+        aggregate = self.aggregate
+        if aggregate == "value":
+            return value
+        samples = self.samples
+        weight = value if aggregate == "mean" else 0.0
+        if samples:
+            last_time, last_value, _ = samples[-1]
+            time_s = max(time_s, last_time)
+            if aggregate == "time_above" and last_value > self.threshold:
+                weight = time_s - last_time
+            elif aggregate == "time_below" and last_value < self.threshold:
+                weight = time_s - last_time
+        else:
+            self.started = time_s
+        samples.append((time_s, value, weight))
+        self.total += weight
+        cutoff = time_s - self.seconds
+        while samples[0][0] < cutoff:
+            self.total -= samples.popleft()[2]
+        if time_s - self.started < self.seconds:
+            return None
+        if aggregate == "mean":
+            return self.total / len(samples)
+        if aggregate == "rate":
+            first_time, first_value, _ = samples[0]
+            return (value - first_value) / (time_s - first_time) if time_s > first_time else 0.0
+        return self.total
+
+
+def covers(outer: str, inner: str) -> bool:
+    outer_levels = outer.split("/")
+    inner_levels = inner.split("/")
+    for index, level in enumerate(outer_levels):
+        if level == "#":
+            return True
+        if index >= len(inner_levels) or (level != "+" and level != inner_levels[index]):
+            return False
+    return len(outer_levels) == len(inner_levels)
+
+
+class RuleEngine:
+    """Evaluates rules in file order; the first rule whose condition holds decides the command."""
+
+    def __init__(self, specs: list[dict]) -> None:
+        self.rules = [Rule(spec) for spec in specs]
+        self._tables: dict[tuple[str, str], tuple[Rule, ...]] = {}
+        self.streams: dict[tuple[str, str], list[Window | None]] = {}
+        self.evaluations = 0
+        self.matches = 0
+
+    def table(self, source: str, sensor: str) -> tuple[Rule, ...]:
+        """The rows for one sensor, compiled once: rules naming it or '+', in file order."""
+        key = (source, sensor)
+        rows = self._tables.get(key)
+        if rows is None:
+            rows = tuple(rule for rule in self.rules if rule.source == source and {sensor, "+"} & set(rule.sensors))
+            self._tables[key] = rows
+        return rows
+
+    def subscriptions(self, device: str | None = None) -> list[str]:
+        """The smallest set of topic filters that delivers every message some rule reads (about `device` only)."""
+        wanted = list(dict.fromkeys(name for rule in self.rules for name in rule.filters(device)))
+        minimal = [name for name in wanted if not any(other != name and covers(other, name) for other in wanted)]
+        return [topic(name) for name in minimal]
+
+    def on_alarm(self, device_id: str, device_type: str | None, sensor: str, alarm_type: str | None) -> Rule | None:
+        self.evaluations += 1
+        for rule in self.table("alarm", sensor):
+            if rule.applies(device_id, device_type) and (rule.alarm_type is None or rule.alarm_type == alarm_type):
+                self.matches += 1
+                return rule
+        return None
+
+    def on_reading(
+        self, device_id: str, device_type: str | None, sensor: str, value: float, time_s: float
+    ) -> Rule | None:
+        rows = self.table("telemetry", sensor)
+        if not rows:
+            return None
+        key = (device_id, sensor)
+        windows = self.streams.get(key)
+        if windows is None:
+            windows = self.streams[key] = [
+                Window(rule.aggregate, rule.window, rule.threshold) if rule.applies(device_id, device_type) else None
+                for rule in rows
+            ]
+        self.evaluations += 1
+        fired = None
+        for rule, window in zip(rows, windows):
+            if window is None:
+                continue
+            if rule.holds(window.add(time_s, value)) and fired is None:
+                fired = rule
+        if fired is not None:
+            self.matches += 1
+        return fired
+
+
+def load_rules(path: str) -> list[dict]:
+    text = Path(path).read_text()
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ValueError("YAML rule files need PyYAML (pip install pyyaml); use JSON instead")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("rules")
+    if not isinstance(data, list):
+        raise ValueError('expected a list of rules or {"rules": [...]}')
+    return data
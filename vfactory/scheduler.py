@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable
+
+
+CATCH_UP = "catch-up"
+SKIP = "skip"
+POLICIES = (SKIP, CATCH_UP)
+
+
+class Timer:
+    __slots__ = (
+        "name",
+        "interval",
+        "callback",
+        "policy",
+        "deadline",
+        "cancelled",
+        "fired",
+        "skipped",
+        "late_sum",
+        "late_max",
+        "window_fired",
+        "window_late_sum",
+        "window_late_max",
+        "window_skipped",
+    )
+
+    def __init__(self, name: str, interval: float | None, callback: Callable[[], None], policy: str, deadline: float):
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.policy = policy
+        self.deadline = deadline
+        self.cancelled = False
+        self.fired = 0
+        self.skipped = 0
+        self.late_sum = 0.0
+        self.late_max = 0.0
+        self.window_fired = 0
+        self.window_late_sum = 0.0
+        self.window_late_max = 0.0
+        self.window_skipped = 0
+
+    def record(self, lateness: float) -> None:
+        self.fired += 1
+        self.late_sum += lateness
+        self.window_fired += 1
+        self.window_late_sum += lateness
+        if lateness > self.late_max:
+            self.late_max = lateness
+        if lateness > self.window_late_max:
+            self.window_late_max = lateness
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "fired": self.fired,
+            "skipped": self.skipped,
+            "late_mean_ms": self.late_sum / self.fired * 1000 if self.fired else 0.0,
+            "late_max_ms": self.late_max * 1000,
+        }
+
+
+class Scheduler:
+    """Heap of absolute deadlines on a monotonic clock.
+
+    Periodic timers are rescheduled from their previous deadline, not from the time they ran, so the cadence
+    never drifts. When the process falls behind, `skip` jumps to the next future deadline (counting the
+    missed ticks) and `catch-up` fires every missed tick back to back.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self.timers: list[tuple[float, int, Timer]] = []
+        self._counter = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+
+    def every(
+        self,
+        interval: float,
+        callback: Callable[[], None],
+        name: str | None = None,
+        policy: str = SKIP,
+        first: float | None = None,
+    ) -> Timer:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if policy not in POLICIES:
+            raise ValueError(f"unknown tick policy: {policy}")
+        delay = interval if first is None else first
+        timer = Timer(name or callback.__name__, interval, callback, policy, self.clock() + delay)
+        self._push(timer)
+        return timer
+
+    def once(self, delay: float, callback: Callable[[], None], name: str | None = None) -> Timer:
+        timer = Timer(name or callback.__name__, None, callback, SKIP, self.clock() + delay)
+        self._push(timer)
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        timer.cancelled = True
+
+    def _push(self, timer: Timer) -> None:
+        heapq.heappush(self.timers, (timer.deadline, next(self._counter), timer))
+        if self._wakeup is not None and self.timers[0][2] is timer:
+            self._wakeup.set()
+
+    def next_deadline(self) -> float | None:
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        return self.timers[0][0] if self.timers else None
+
+    def run_due(self, limit: int = 10000) -> int:
+        fired = 0
+        timers = self.timers
+        while timers and fired < limit:
+            deadline, _, timer = timers[0]
+            now = self.clock()
+            if deadline > now:
+                break
+            heapq.heappop(timers)
+            if timer.cancelled:
+                continue
+            timer.record(now - deadline)
+            if timer.interval is not None:
+                next_deadline = deadline + timer.interval
+                if timer.policy == SKIP and next_deadline <= now:
+                    missed = int((now - next_deadline) // timer.interval) + 1
+                    timer.skipped += missed
+                    timer.window_skipped += missed
+                    next_deadline += missed * timer.interval
+                timer.deadline = next_deadline
+                heapq.heappush(timers, (next_deadline, next(self._counter), timer))
+            timer.callback()
+            fired += 1
+        return fired
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            deadline = self.next_deadline()
+            if deadline is None:
+                return
+            delay = deadline - self.clock()
+            if delay > 0 and stop.wait(delay):
+                return
+            self.run_due()
+
+    async def run_async(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            deadline = self.next_deadline()
+            delay = None if deadline is None else deadline - self.clock()
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.run_due()
+            await asyncio.sleep(0)
+
+    def stats(self) -> list[dict]:
+        return [timer.stats() for _, _, timer in sorted(self.timers) if not timer.cancelled]
+
+    def report(self) -> str:
+        """Summarize lateness (count, mean, max) and skipped ticks since the previous report per timer name."""
+        windows: dict[str, list[float]] = {}
+        for _, _, timer in self.timers:
+            if timer.cancelled or timer.interval is None:
+                continue
+            window = windows.setdefault(timer.name, [0, 0.0, 0.0, 0])
+            window[0] += timer.window_fired
+            window[1] += timer.window_late_sum
+            window[2] = max(window[2], timer.window_late_max)
+            window[3] += timer.window_skipped
+            timer.window_fired = 0
+            timer.window_late_sum = 0.0
+            timer.window_late_max = 0.0
+            timer.window_skipped = 0
+        parts = []
+        for name, (fired, late_sum, late_max, skipped) in sorted(windows.items()):
+            mean = late_sum / fired * 1000 if fired else 0.0
+            parts.append(
+                f"{name} ticks={fired} late_mean={mean:.2f}ms late_max={late_max * 1000:.2f}ms skipped={skipped}"
+            )
+        return "; ".join(parts)
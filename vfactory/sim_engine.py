@@ -0,0 +1,110 @@
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ALARM_NONE = 0
+ALARM_HIGH = 1
+ALARM_LOW = 2
+
+ANOMALY_RATE = 0.06
+SPIKE_MIN = 1.0
+SPIKE_MAX = 6.0
+
+
+def alarm_from_code(sensor: dict, code: int) -> dict | None:
+    if code == ALARM_HIGH:
+        return {"limit": sensor["alarm_high"], "type": "high"}
+    if code == ALARM_LOW:
+        return {"limit": sensor["alarm_low"], "type": "low"}
+    return None
+
+
+def simulate_value(sensor: dict, anomaly: bool, rng=random) -> float:
+    value = rng.gauss(sensor["base"], sensor["variance"])
+    if anomaly and rng.random() < ANOMALY_RATE:
+        if "alarm_high" in sensor:
+            value = sensor["alarm_high"] + rng.uniform(SPIKE_MIN, SPIKE_MAX)
+        elif "alarm_low" in sensor:
+            value = sensor["alarm_low"] - rng.uniform(SPIKE_MIN, SPIKE_MAX)
+    return round(max(value, 0.0), 2)
+
+
+def classify(sensor: dict, value: float) -> int:
+    alarm_high = sensor.get("alarm_high")
+    alarm_low = sensor.get("alarm_low")
+    if alarm_high is not None and value >= alarm_high:
+        return ALARM_HIGH
+    if alarm_low is not None and value <= alarm_low:
+        return ALARM_LOW
+    return ALARM_NONE
+
+
+class PythonEngine:
+    """Reference engine: one random draw per sensor per tick, as vfactory.device always did."""
+
+    def __init__(self, sensors: list[dict], devices: int = 1, anomaly: bool = False, seed: int | None = None) -> None:
+        self.sensors = sensors
+        self.devices = devices
+        self.anomaly = anomaly
+        self.rng = random.Random(seed) if seed is not None else random
+
+    def generate(self) -> tuple[list[list[float]], list[list[int]]]:
+        values = []
+        alarms = []
+        for _ in range(self.devices):
+            row = [simulate_value(sensor, self.anomaly, self.rng) for sensor in self.sensors]
+            values.append(row)
+            alarms.append([classify(sensor, value) for sensor, value in zip(self.sensors, row)])
+        return values, alarms
+
+
+class NumpyEngine:
+    """Generates a (devices x sensors) block of readings per tick with array ops only."""
+
+    def __init__(self, sensors: list[dict], devices: int = 1, anomaly: bool = False, seed: int | None = None) -> None:
+        if np is None:
+            raise RuntimeError("the numpy engine requires numpy (pip install -r requirements.txt)")
+        self.sensors = sensors
+        self.devices = devices
+        self.anomaly = anomaly
+        self.rng = np.random.default_rng(seed)
+        self.shape = (devices, len(sensors))
+        self.base = np.array([sensor["base"] for sensor in sensors], dtype=np.float64)
+        self.variance = np.array([sensor["variance"] for sensor in sensors], dtype=np.float64)
+        self.alarm_high = np.array([sensor.get("alarm_high", np.nan) for sensor in sensors], dtype=np.float64)
+        self.alarm_low = np.array([sensor.get("alarm_low", np.nan) for sensor in sensors], dtype=np.float64)
+        has_high = ~np.isnan(self.alarm_high)
+        self.spike_base = np.where(has_high, self.alarm_high, self.alarm_low)
+        self.spike_sign = np.where(has_high, 1.0, -1.0)
+        self.can_spike = has_high | ~np.isnan(self.alarm_low)
+
+    def generate_arrays(self) -> tuple["np.ndarray", "np.ndarray"]:
+        values = self.rng.normal(self.base, self.variance, self.shape)
+        if self.anomaly:
+            hit = (self.rng.random(self.shape) < ANOMALY_RATE) & self.can_spike
+            spike = self.spike_base + self.spike_sign * self.rng.uniform(SPIKE_MIN, SPIKE_MAX, self.shape)
+            values = np.where(hit, spike, values)
+        values = np.round(np.maximum(values, 0.0), 2)
+        alarms = np.where(
+            values >= self.alarm_high,
+            ALARM_HIGH,
+            np.where(values <= self.alarm_low, ALARM_LOW, ALARM_NONE),
+        ).astype(np.int8)
+        return values, alarms
+
+    def generate(self) -> tuple[list[list[float]], list[list[int]]]:
+        values, alarms = self.generate_arrays()
+        return values.tolist(), alarms.tolist()
+
+
+ENGINES = {"python": PythonEngine, "numpy": NumpyEngine}
+
+
+def create_engine(
+    name: str, sensors: list[dict], devices: int = 1, anomaly: bool = False, seed: int | None = None
+) -> PythonEngine | NumpyEngine:
+    return ENGINES[name](sensors, devices=devices, anomaly=anomaly, seed=seed)
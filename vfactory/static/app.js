@@ -1,5 +1,7 @@
 const state = {
   devices: {},
+  version: 0,
+  resyncing: false,
   traffic: [],
   meta: {},
   brokerStatus: "disconnected",
@@ -11,6 +13,7 @@ const state = {
     commands: false,
     alarms: false,
   },
+  trafficFilter: "#",
   filters: {
     category: "all",
     qos: "any",
@@ -181,7 +184,10 @@ function setupFilters() {
     return;
   }
   const update = () => {
-    state.filters.category = filterCategoryEl.value;
+    if (state.filters.category !== filterCategoryEl.value) {
+      state.filters.category = filterCategoryEl.value;
+      syncTrafficSubscription();
+    }
     state.filters.qos = filterQosEl.value;
     state.filters.retain = filterRetainEl.value;
     state.filters.text = filterTextEl.value.trim();
@@ -193,6 +199,18 @@ function setupFilters() {
   filterTextEl.addEventListener("input", update);
 }
 
+function syncTrafficSubscription() {
+  // Ask the server to send only the selected category instead of filtering everything client-side.
+  const category = state.filters.category;
+  const wanted = category === "all" ? "#" : `${state.meta.base_topic || "factory"}/${category}/#`;
+  if (wanted === state.trafficFilter || ws.readyState !== WebSocket.OPEN) {
+    return;
+  }
+  ws.send(JSON.stringify({ type: "subscribe", filter: wanted }));
+  ws.send(JSON.stringify({ type: "unsubscribe", filter: state.trafficFilter }));
+  state.trafficFilter = wanted;
+}
+
 function setupCopyButtons() {
   document.querySelectorAll("[data-copy]").forEach((button) => {
     button.addEventListener("click", async () => {
@@ -502,6 +520,7 @@ function setupInfoTooltips() {
 }
 
 function renderDeviceOptions() {
+  const selected = commandDeviceEl.value;
   commandDeviceEl.innerHTML = "";
   Object.keys(state.devices).forEach((deviceId) => {
     const option = document.createElement("option");
@@ -509,6 +528,9 @@ function renderDeviceOptions() {
     option.textContent = deviceId;
     commandDeviceEl.appendChild(option);
   });
+  if (selected && state.devices[selected]) {
+    commandDeviceEl.value = selected;
+  }
   setCommandAvailability();
 }
 
@@ -572,6 +594,8 @@ function renderTraffic() {
 
 function applySnapshot(snapshot) {
   state.devices = snapshot.devices || {};
+  state.version = snapshot.version || 0;
+  state.resyncing = false;
   state.traffic = snapshot.traffic || [];
   state.meta = snapshot.meta || {};
   state.brokerStatus = snapshot.broker_status || "disconnected";
@@ -596,21 +620,58 @@ function applySnapshot(snapshot) {
   setBrokerStatus(state.brokerStatus, state.brokerStatus === "connected");
 }
 
-function handleEvent(entry) {
-  state.traffic.push(entry);
-  if (state.traffic.length > 200) {
-    state.traffic.shift();
+function requestResync() {
+  if (state.resyncing || ws.readyState !== WebSocket.OPEN) {
+    return;
   }
-  updateConcepts(entry);
-  renderTraffic();
-  updateStats();
-  renderConcepts();
+  state.resyncing = true;
+  ws.send(JSON.stringify({ type: "resync" }));
 }
 
-function handleDevices(devices) {
-  state.devices = devices;
-  renderDeviceOptions();
-  renderDevices();
+function handleDelta(delta) {
+  if (state.resyncing) {
+    return;
+  }
+  if (delta.version !== state.version + 1) {
+    requestResync();
+    return;
+  }
+  state.version = delta.version;
+
+  let added = false;
+  Object.entries(delta.devices || {}).forEach(([deviceId, changes]) => {
+    const device = state.devices[deviceId];
+    if (!device) {
+      state.devices[deviceId] = changes;
+      added = true;
+      return;
+    }
+    const { sensors, ...fields } = changes;
+    Object.assign(device, fields);
+    if (sensors) {
+      device.sensors = { ...device.sensors, ...sensors };
+    }
+  });
+
+  const traffic = delta.traffic || [];
+  traffic.forEach((entry) => {
+    state.traffic.push(entry);
+    updateConcepts(entry);
+  });
+  if (state.traffic.length > 200) {
+    state.traffic.splice(0, state.traffic.length - 200);
+  }
+
+  if (added) {
+    renderDeviceOptions();
+  }
+  if (Object.keys(delta.devices || {}).length > 0) {
+    renderDevices();
+  }
+  if (traffic.length > 0) {
+    renderTraffic();
+    renderConcepts();
+  }
   updateStats();
 }
 
@@ -636,8 +697,28 @@ function setCommandAvailability() {
   }
 }
 
-const wsUrl = `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws`;
+// Large frames arrive as zlib-compressed binary when the browser can inflate them itself.
+const canInflate = typeof DecompressionStream !== "undefined";
+const wsUrl = `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/ws${canInflate ? "?compress=deflate" : ""}`;
 const ws = new WebSocket(wsUrl);
+ws.binaryType = "arraybuffer";
+let inbox = Promise.resolve();
+
+function inflate(data) {
+  const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Response(stream).text();
+}
+
+function handleMessage(payload) {
+  if (payload.type === "snapshot") {
+    applySnapshot(payload);
+  } else if (payload.type === "delta") {
+    handleDelta(payload);
+  } else if (payload.type === "broker") {
+    state.brokerStatus = payload.status;
+    setBrokerStatus(payload.status, payload.status === "connected");
+  }
+}
 
 ws.addEventListener("open", () => {
   setBrokerStatus("ws connected", false);
@@ -648,17 +729,12 @@ ws.addEventListener("close", () => {
 });
 
 ws.addEventListener("message", (event) => {
-  const payload = JSON.parse(event.data);
-  if (payload.type === "snapshot") {
-    applySnapshot(payload);
-  } else if (payload.type === "event") {
-    handleEvent(payload.entry);
-  } else if (payload.type === "devices") {
-    handleDevices(payload.devices);
-  } else if (payload.type === "broker") {
-    state.brokerStatus = payload.status;
-    setBrokerStatus(payload.status, payload.status === "connected");
-  }
+  // Chain every frame so text frames never overtake a binary frame that is still inflating.
+  const text = typeof event.data === "string" ? event.data : inflate(event.data);
+  inbox = inbox
+    .then(() => text)
+    .then((raw) => handleMessage(JSON.parse(raw)))
+    .catch((error) => console.error("bad frame", error));
 });
 
 const commandForm = document.getElementById("command-form");
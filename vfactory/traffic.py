@@ -0,0 +1,244 @@
+"""Streaming traffic statistics in bounded memory: per-pattern rates, inter-arrival histograms and hot devices."""
+import heapq
+import time
+
+from vfactory.common import BASE_TOPIC, TopicPath, decode_payload, now_ts
+from vfactory.latency import Histogram
+
+
+OTHER = "(other)"
+
+
+class SpaceSaving:
+    """Top-k heavy hitters (Metwally et al.) in `capacity` counters.
+
+    A key not being tracked replaces the smallest counter and inherits its count as `error`, so every count is an
+    overestimate by at most that error and any key with more than total/capacity weight is guaranteed to be kept.
+    The min-heap is updated lazily: entries go stale as counts grow and are refreshed when they reach the top.
+    """
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+        self.total = 0
+
+    def add(self, key: str, weight: int = 1) -> None:
+        self.total += weight
+        counts = self.counts
+        count = counts.get(key)
+        if count is not None:
+            counts[key] = count + weight
+            return
+        if len(counts) < self.capacity:
+            counts[key] = weight
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (weight, key))
+            return
+        heap = self._heap
+        while True:
+            smallest, victim = heap[0]
+            current = counts[victim]
+            if current == smallest:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        del counts[victim]
+        del self.errors[victim]
+        counts[key] = smallest + weight
+        self.errors[key] = smallest
+        heapq.heapreplace(heap, (smallest + weight, key))
+
+    def top(self, limit: int) -> list[tuple[str, int, int]]:
+        """(key, count, error) for the `limit` largest counters."""
+        ranked = heapq.nlargest(limit, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in ranked]
+
+
+class PatternStats:
+    __slots__ = ("messages", "bytes", "qos", "retained", "interval", "arrivals")
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.bytes = 0
+        self.qos = [0, 0, 0]
+        self.retained = 0
+        self.interval = Histogram()
+        self.arrivals = Histogram()
+
+    def summary(self, seconds: float) -> dict:
+        arrivals = self.interval.summary()
+        return {
+            "msg_rate": self.messages / seconds,
+            "byte_rate": self.bytes / seconds,
+            "messages": self.messages,
+            "qos": self.qos,
+            "retained": self.retained,
+            "inter_arrival_ms": {key: arrivals[key] / 1e6 for key in ("p50", "p90", "p99", "max")},
+            "inter_arrival_p99_ms_all": self.arrivals.percentile(99) / 1e6,
+        }
+
+
+def topic_pattern(path: TopicPath) -> str:
+    """The topic with its device (and command source's device) replaced by '+': one pattern per message kind."""
+    if path.category is None:
+        return OTHER
+    if path.category == "commands":
+        return f"{BASE_TOPIC}/commands/{path.source}/+" if path.device is not None else path.topic
+    if path.device is None:
+        return path.topic
+    levels = len(path.levels)
+    suffix = "" if levels == 3 else f"/{path.sensor}" if levels == 4 else f"/{path.sensor}/#"
+    return f"{BASE_TOPIC}/{path.category}/+{suffix}"
+
+
+class TrafficStats:
+    """Per-pattern message/byte rates, QoS and retain mix, per-topic inter-arrival times and telemetry seq gaps.
+
+    Memory is bounded whatever the topic cardinality: at most `max_patterns` patterns (the rest count as
+    "(other)"), the last arrival and last seq are kept for the `max_tracked` most recently seen topics and devices,
+    and hot devices come from fixed-size Space-Saving sketches. Rates, percentiles and sketches cover the interval
+    since the previous `snapshot()`; totals and the all-time inter-arrival histograms keep accumulating.
+    """
+
+    def __init__(self, max_patterns: int = 256, max_tracked: int = 100_000, sketch_size: int = 64) -> None:
+        self.max_patterns = max_patterns
+        self.max_tracked = max_tracked
+        self.patterns: dict[str, PatternStats] = {}
+        self.last_arrival: dict[str, int] = {}
+        self.last_seq: dict[str, int] = {}
+        self.hot_messages = SpaceSaving(sketch_size)
+        self.hot_bytes = SpaceSaving(sketch_size)
+        self.lossy = SpaceSaving(sketch_size)
+        self.messages = 0
+        self.bytes = 0
+        self.missed = 0
+        self.duplicates = 0
+        self.resets = 0
+        self.evicted = 0
+        self.interval_missed = 0
+        self.since_ns = time.monotonic_ns()
+
+    def observe(self, path: TopicPath, msg) -> None:
+        received_ns = time.monotonic_ns()
+        size = len(msg.payload)
+        self.messages += 1
+        self.bytes += size
+        name = topic_pattern(path)
+        stats = self.patterns.get(name)
+        if stats is None:
+            if len(self.patterns) >= self.max_patterns:
+                name = OTHER
+                stats = self.patterns.get(OTHER)
+            if stats is None:
+                stats = self.patterns[name] = PatternStats()
+        stats.messages += 1
+        stats.bytes += size
+        stats.qos[msg.qos] += 1
+        if msg.retain:
+            stats.retained += 1
+        else:
+            previous = self._remember(self.last_arrival, path.topic, received_ns)
+            if previous is not None:
+                stats.interval.record(received_ns - previous)
+        device = path.device
+        if device is None:
+            return
+        self.hot_messages.add(device)
+        self.hot_bytes.add(device, size)
+        if path.category == "telemetry" and not msg.retain:
+            self._check_seq(device, msg.payload)
+
+    def _remember(self, table: dict[str, int], key: str, value: int) -> int | None:
+        """Store `value` as the most recent entry for `key`, evicting the least recently seen key when full."""
+        previous = table.pop(key, None)
+        if previous is None and len(table) >= self.max_tracked:
+            del table[next(iter(table))]
+            self.evicted += 1
+        table[key] = value
+        return previous
+
+    def _check_seq(self, device: str, raw: bytes) -> None:
+        try:
+            payload = decode_payload(raw)
+        except ValueError:
+            return
+        seq = payload.get("seq") if isinstance(payload, dict) else None
+        if type(seq) is not int:
+            return
+        previous = self._remember(self.last_seq, device, seq)
+        if previous is None or seq == previous + 1:
+            return
+        if seq > previous:
+            gap = seq - previous - 1
+            self.missed += gap
+            self.interval_missed += gap
+            self.lossy.add(device, gap)
+        elif seq == previous:
+            self.duplicates += 1
+        else:
+            # Devices count from 1 again after a restart; anything else arriving late is rare enough to lump in.
+            self.resets += 1
+
+    def snapshot(self, top: int = 10) -> dict:
+        """Summarize the interval since the previous snapshot and start a new one."""
+        now_ns = time.monotonic_ns()
+        seconds = max((now_ns - self.since_ns) / 1e9, 1e-9)
+        patterns = {}
+        for name, stats in sorted(self.patterns.items(), key=lambda item: -item[1].messages):
+            stats.arrivals.merge(stats.interval)
+            if stats.messages:
+                patterns[name] = stats.summary(seconds)
+            stats.interval.reset()
+            stats.messages = stats.bytes = stats.retained = 0
+            stats.qos = [0, 0, 0]
+        summary = {
+            "ts": now_ts(),
+            "interval_s": seconds,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "patterns": patterns,
+            "hot_devices": [list(entry) for entry in self.hot_messages.top(top)],
+            "hot_devices_bytes": [list(entry) for entry in self.hot_bytes.top(top)],
+            "seq": {
+                "missed": self.missed,
+                "missed_interval": self.interval_missed,
+                "duplicates": self.duplicates,
+                "resets": self.resets,
+                "lossy_devices": [list(entry) for entry in self.lossy.top(top)],
+            },
+            "tracked": len(self.last_arrival) + len(self.last_seq),
+            "evicted": self.evicted,
+        }
+        self.hot_messages.reset()
+        self.hot_bytes.reset()
+        self.lossy.reset()
+        self.interval_missed = 0
+        self.since_ns = now_ns
+        return summary
+
+
+def format_table(summary: dict) -> str:
+    lines = [
+        f"{'pattern':<40} {'msg/s':>9} {'KB/s':>9} {'qos0/1/2':>14} {'retain':>6} "
+        f"{'ia p50 ms':>10} {'p99 ms':>9} {'max ms':>9}"
+    ]
+    for name, stats in summary["patterns"].items():
+        mix = "/".join(str(count) for count in stats["qos"])
+        arrivals = stats["inter_arrival_ms"]
+        lines.append(
+            f"{name:<40} {stats['msg_rate']:>9,.1f} {stats['byte_rate'] / 1024:>9,.1f} {mix:>14} "
+            f"{stats['retained']:>6} {arrivals['p50']:>10.1f} {arrivals['p99']:>9.1f} {arrivals['max']:>9.1f}"
+        )
+    seq = summary["seq"]
+    hot = ", ".join(f"{key} {count}" for key, count, _error in summary["hot_devices"][:5]) or "-"
+    lossy = ", ".join(f"{key} {count}" for key, count, _error in seq["lossy_devices"][:5]) or "-"
+    lines.append(f"hot devices (msgs): {hot}")
+    lines.append(
+        f"seq gaps: {seq['missed_interval']} missed this interval, {seq['missed']} total, "
+        f"{seq['duplicates']} duplicates, {seq['resets']} resets; lossy: {lossy}"
+    )
+    return "\n".join(lines)
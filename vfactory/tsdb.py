@@ -0,0 +1,482 @@
+import argparse
+import json
+import mmap
+import os
+import pathlib
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from typing import Iterator
+
+from vfactory.common import (
+    TopicPath,
+    TopicRouter,
+    connect,
+    create_client,
+    decode_payload,
+    epoch_ns,
+    log,
+    telemetry_readings,
+    topic,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+SEGMENT_SECONDS = 3600
+ROLLUP_SECONDS = 60
+PARTITION_SECONDS = 86400
+RAW_RETENTION_HOURS = 24.0
+RETENTION_DAYS = 30.0
+RAW_COLUMNS = {"ts": "q", "val": "d"}
+ROLLUP_COLUMNS = {"ts": "q", "min": "d", "max": "d", "sum": "d", "cnt": "q"}
+META_FILE = "tsdb.json"
+
+
+def bucketize(times: array, values: array, bucket_ms: int) -> list[tuple[int, float, float, float, int]]:
+    """(bucket start ms, min, max, sum, count) for consecutive time-ordered samples."""
+    if not times:
+        return []
+    if np is not None:
+        keys = np.frombuffer(times, dtype=np.int64) // bucket_ms * bucket_ms
+        data = np.frombuffer(values, dtype=np.float64)
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        counts = np.diff(np.append(starts, len(keys)))
+        return list(
+            zip(
+                keys[starts].tolist(),
+                np.minimum.reduceat(data, starts).tolist(),
+                np.maximum.reduceat(data, starts).tolist(),
+                np.add.reduceat(data, starts).tolist(),
+                counts.tolist(),
+            )
+        )
+    rows = []
+    current = None
+    for time_ms, value in zip(times, values):
+        key = time_ms // bucket_ms * bucket_ms
+        if current is None or current[0] != key:
+            current = [key, value, value, 0.0, 0]
+            rows.append(current)
+        elif value < current[1]:
+            current[1] = value
+        elif value > current[2]:
+            current[2] = value
+        current[3] += value
+        current[4] += 1
+    return [tuple(row) for row in rows]
+
+
+@contextmanager
+def mapped(path: pathlib.Path, typecode: str) -> Iterator[memoryview]:
+    """Read-only typed view of a column file; callers copy out what they need before the map closes."""
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError:
+        yield memoryview(array(typecode))
+        return
+    with handle:
+        size = os.fstat(handle.fileno()).st_size // 8 * 8
+        if size == 0:
+            yield memoryview(array(typecode))
+            return
+        with mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_READ) as region:
+            view = memoryview(region).cast(typecode)
+            try:
+                yield view
+            finally:
+                view.release()
+
+
+def copy_range(view: memoryview, typecode: str, low: int, high: int) -> array:
+    out = array(typecode)
+    out.frombytes(view[low:high].cast("B"))
+    return out
+
+
+def safe_name(name: object) -> bool:
+    return isinstance(name, str) and name not in ("", ".", "..") and "/" not in name
+
+
+class TSDB:
+    """Columnar per-series store under `root/<device>/<series>/`.
+
+    Raw data lives in time-partitioned segments (`raw-<start s>.ts` int64 epoch ms, `.val` float64), appended in
+    place and read back through mmap. Compaction turns raw segments older than the raw retention into
+    `rollup-<day s>` columns (ts, min, max, sum, cnt per ROLLUP_SECONDS bucket) and drops rollups past the retention.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        segment_seconds: int = SEGMENT_SECONDS,
+        rollup_seconds: int = ROLLUP_SECONDS,
+        flush_interval: float = 5.0,
+    ) -> None:
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        meta_path = self.root / META_FILE
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        else:
+            meta = {"segment_seconds": segment_seconds, "rollup_seconds": rollup_seconds}
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        self.segment_ms = int(meta["segment_seconds"]) * 1000
+        self.rollup_ms = int(meta["rollup_seconds"]) * 1000
+        self.flush_interval = flush_interval
+        self.appended = 0
+        self._pending: dict[tuple[str, str], tuple[int, array, array]] = {}
+        self._last: dict[tuple[str, str], int] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # Held for every file append. It is taken while holding _lock, so buffers reach disk in the order they left
+        # _pending and a segment's rows stay sorted; flush() drops _lock before writing so appends are not blocked.
+        self._write_lock = threading.Lock()
+
+    def _series_dir(self, device_id: str, series: str) -> pathlib.Path:
+        return self.root / device_id / series
+
+    def append(self, device_id: str, series: str, time_ms: int, value: float) -> None:
+        """Buffer one sample; timestamps are clamped so each series stays sorted for bisect."""
+        key = (device_id, series)
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and time_ms < last:
+                time_ms = last
+            self._last[key] = time_ms
+            segment = time_ms // self.segment_ms * self.segment_ms
+            pending = self._pending.get(key)
+            if pending is None or pending[0] != segment:
+                if pending is not None:
+                    with self._write_lock:
+                        self._write(key, pending)
+                pending = self._pending[key] = (segment, array("q"), array("d"))
+            pending[1].append(time_ms)
+            pending[2].append(value)
+            self.appended += 1
+
+    def _write(self, key: tuple[str, str], pending: tuple[int, array, array]) -> None:
+        segment, times, values = pending
+        directory = self._series_dir(*key)
+        directory.mkdir(parents=True, exist_ok=True)
+        base = directory / f"raw-{segment // 1000}"
+        with open(base.with_suffix(".ts"), "ab") as handle:
+            handle.write(times)
+        with open(base.with_suffix(".val"), "ab") as handle:
+            handle.write(values)
+
+    def flush(self, force: bool = False) -> int:
+        if not force and time.monotonic() - self._last_flush < self.flush_interval:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            self._write_lock.acquire()
+        try:
+            for key, buffers in pending.items():
+                self._write(key, buffers)
+        finally:
+            self._write_lock.release()
+        return len(pending)
+
+    def series(self) -> list[tuple[str, str]]:
+        return sorted((path.parent.name, path.name) for path in self.root.glob("*/*") if path.is_dir())
+
+    def _segments(self, device_id: str, series: str, prefix: str) -> list[tuple[int, pathlib.Path]]:
+        directory = self._series_dir(device_id, series)
+        segments = []
+        for path in directory.glob(f"{prefix}-*.ts"):
+            segments.append((int(path.stem.split("-")[1]) * 1000, path.with_suffix("")))
+        segments.sort()
+        return segments
+
+    def _read(self, base: pathlib.Path, columns: dict[str, str], start_ms: int, end_ms: int) -> dict[str, array]:
+        """Copy the rows of one segment whose ts falls in [start_ms, end_ms]."""
+        with mapped(base.with_suffix(".ts"), "q") as times:
+            low = bisect_left(times, start_ms)
+            high = bisect_right(times, end_ms)
+            out = {"ts": copy_range(times, "q", low, high)}
+        for name, typecode in columns.items():
+            if name == "ts":
+                continue
+            with mapped(base.with_suffix(f".{name}"), typecode) as column:
+                out[name] = copy_range(column, typecode, low, min(high, len(column)))
+        count = min(len(column) for column in out.values())
+        return {name: column[:count] for name, column in out.items()}
+
+    def points(self, device_id: str, series: str, start_ms: int, end_ms: int) -> tuple[array, array]:
+        times = array("q")
+        values = array("d")
+        for segment, base in self._segments(device_id, series, "raw"):
+            if segment > end_ms or segment + self.segment_ms <= start_ms:
+                continue
+            columns = self._read(base, RAW_COLUMNS, start_ms, end_ms)
+            times.extend(columns["ts"])
+            values.extend(columns["val"])
+        return times, values
+
+    def aggregate(self, device_id: str, series: str, start_ms: int, end_ms: int, bucket_ms: int) -> list[list]:
+        """[bucket start ms, min, max, mean, count] rows, from raw segments and, before them, rollups."""
+        buckets: dict[int, list] = {}
+
+        def merge(key: int, low: float, high: float, total: float, count: int) -> None:
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [low, high, total, count]
+                return
+            if low < bucket[0]:
+                bucket[0] = low
+            if high > bucket[1]:
+                bucket[1] = high
+            bucket[2] += total
+            bucket[3] += count
+
+        raw = self._segments(device_id, series, "raw")
+        raw_start = raw[0][0] if raw else end_ms + 1
+        rollup_end = min(end_ms, raw_start - 1)
+        if start_ms <= rollup_end:
+            for partition, base in self._segments(device_id, series, "rollup"):
+                if partition > rollup_end or partition + PARTITION_SECONDS * 1000 <= start_ms:
+                    continue
+                columns = self._read(base, ROLLUP_COLUMNS, start_ms, rollup_end)
+                for row in zip(columns["ts"], columns["min"], columns["max"], columns["sum"], columns["cnt"]):
+                    merge(row[0] // bucket_ms * bucket_ms, *row[1:])
+        for segment, base in raw:
+            if segment > end_ms or segment + self.segment_ms <= start_ms:
+                continue
+            columns = self._read(base, RAW_COLUMNS, start_ms, end_ms)
+            for row in bucketize(columns["ts"], columns["val"], bucket_ms):
+                merge(*row)
+        return [[key, low, high, total / count, count] for key, (low, high, total, count) in sorted(buckets.items())]
+
+    def compact(self, raw_retention_ms: int, retention_ms: int, now_ms: int | None = None) -> dict[str, int]:
+        """Roll up raw segments older than raw_retention_ms and delete rollup partitions older than retention_ms."""
+        now_ms = epoch_ns() // 1_000_000 if now_ms is None else now_ms
+        stats = {"segments": 0, "rows": 0, "expired": 0}
+        for device_id, series in self.series():
+            for segment, base in self._segments(device_id, series, "raw"):
+                if segment + self.segment_ms > now_ms - raw_retention_ms:
+                    break
+                columns = self._read(base, RAW_COLUMNS, segment, segment + self.segment_ms - 1)
+                rows = bucketize(columns["ts"], columns["val"], self.rollup_ms)
+                stats["rows"] += self._append_rollup(device_id, series, rows)
+                for suffix in RAW_COLUMNS:
+                    base.with_suffix(f".{suffix}").unlink(missing_ok=True)
+                stats["segments"] += 1
+            for partition, base in self._segments(device_id, series, "rollup"):
+                if partition + PARTITION_SECONDS * 1000 > now_ms - retention_ms:
+                    break
+                for suffix in ROLLUP_COLUMNS:
+                    base.with_suffix(f".{suffix}").unlink(missing_ok=True)
+                stats["expired"] += 1
+        return stats
+
+    def _append_rollup(self, device_id: str, series: str, rows: list[tuple]) -> int:
+        partition_ms = PARTITION_SECONDS * 1000
+        written = 0
+        index = 0
+        while index < len(rows):
+            partition = rows[index][0] // partition_ms * partition_ms
+            end = index
+            while end < len(rows) and rows[end][0] < partition + partition_ms:
+                end += 1
+            base = self._series_dir(device_id, series) / f"rollup-{partition // 1000}"
+            with mapped(base.with_suffix(".ts"), "q") as times:
+                last = times[len(times) - 1] if len(times) else None
+            # Skip rows a previous, interrupted compaction already wrote.
+            chunk = [row for row in rows[index:end] if last is None or row[0] > last]
+            for position, (name, typecode) in enumerate(ROLLUP_COLUMNS.items()):
+                with open(base.with_suffix(f".{name}"), "ab") as handle:
+                    handle.write(array(typecode, [row[position] for row in chunk]))
+            written += len(chunk)
+            index = end
+        return written
+
+    def disk_usage(self) -> int:
+        return sum(path.stat().st_size for path in self.root.glob("*/*/*") if path.is_file())
+
+
+def run_ingest(args: argparse.Namespace) -> None:
+    store = TSDB(args.directory, args.segment_minutes * 60, args.rollup_seconds, args.flush_interval)
+    client = create_client(client_id=args.client_id, clean_session=True)
+    raw_retention_ms = int(args.raw_retention_hours * 3_600_000)
+    retention_ms = int(args.retention_days * 86_400_000)
+    stop = threading.Event()
+
+    def on_connect(_client, _userdata, _flags, rc):
+        if rc == 0:
+            log("tsdb", "connected")
+            client.subscribe([(topic("telemetry/#"), 0), (topic("alarms/#"), 1)])
+        else:
+            log("tsdb", f"connect failed rc={rc}")
+
+    def sample_ms(payload: dict) -> int:
+        ts_ns = payload.get("ts_ns")
+        return (ts_ns if type(ts_ns) is int else epoch_ns()) // 1_000_000
+
+    def on_telemetry(path: TopicPath, payload: dict) -> None:
+        time_ms = sample_ms(payload)
+        for name, reading in telemetry_readings(path.sensor, payload):
+            value = reading.get("value")
+            if (type(value) is float or type(value) is int) and safe_name(name):
+                store.append(path.device, name, time_ms, value)
+
+    def on_alarm(path: TopicPath, payload: dict) -> None:
+        value = payload.get("value")
+        if (type(value) is float or type(value) is int) and safe_name(path.sensor):
+            store.append(path.device, f"alarm.{path.sensor}", sample_ms(payload), value)
+
+    router = TopicRouter()
+    router.route(topic("telemetry/#"), on_telemetry)
+    router.route(topic("alarms/#"), on_alarm)
+
+    def on_message(_client, _userdata, msg):
+        path, handlers = router.match(msg.topic)
+        if not handlers or not safe_name(path.device):
+            return
+        try:
+            payload = decode_payload(msg.payload)
+        except ValueError:
+            return
+        if isinstance(payload, dict):
+            for handler in handlers:
+                handler(path, payload)
+
+    def compactor() -> None:
+        while not stop.wait(args.compact_interval):
+            started = time.perf_counter()
+            stats = store.compact(raw_retention_ms, retention_ms)
+            if stats["segments"] or stats["expired"]:
+                log(
+                    "tsdb",
+                    f"compacted {stats['segments']} segments into {stats['rows']} rollup rows, "
+                    f"expired {stats['expired']} partitions in {time.perf_counter() - started:.2f}s",
+                )
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    connect(client)
+    client.loop_start()
+    compaction = threading.Thread(target=compactor, name="tsdb-compact", daemon=True)
+    compaction.start()
+
+    next_report = time.monotonic() + args.report_interval
+    try:
+        while True:
+            time.sleep(0.5)
+            store.flush()
+            if args.report_interval > 0 and time.monotonic() >= next_report:
+                next_report += args.report_interval
+                log("tsdb", f"points={store.appended} series={len(store._last)}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        client.loop_stop()
+        client.disconnect()
+        store.flush(force=True)
+        compaction.join(timeout=5)
+        log("tsdb", f"stored {store.appended} points in {args.directory}")
+
+
+def parse_time(value: str | None, default_ms: int) -> int:
+    return default_ms if value is None else int(float(value) * 1000)
+
+
+def query(args: argparse.Namespace) -> None:
+    store = TSDB(args.directory)
+    now_ms = epoch_ns() // 1_000_000
+    end_ms = parse_time(args.end, now_ms)
+    start_ms = parse_time(args.start, end_ms - 3_600_000)
+    if args.bucket:
+        rows = store.aggregate(args.device, args.series, start_ms, end_ms, int(args.bucket * 1000))
+        print("bucket_ms,min,max,mean,count")
+    else:
+        times, values = store.points(args.device, args.series, start_ms, end_ms)
+        rows = zip(times, values)
+        print("ts_ms,value")
+    for row in rows:
+        print(",".join(str(field) for field in row))
+
+
+def info(args: argparse.Namespace) -> None:
+    store = TSDB(args.directory)
+    series = store.series()
+    print(
+        f"{len(series)} series, {store.disk_usage() / 2**20:.1f} MiB, "
+        f"{store.segment_ms // 1000}s segments, {store.rollup_ms // 1000}s rollups"
+    )
+    if args.series:
+        for device_id, name in series:
+            raw = store._segments(device_id, name, "raw")
+            rollups = store._segments(device_id, name, "rollup")
+            print(f"  {device_id}/{name}: {len(raw)} raw segments, {len(rollups)} rollup partitions")
+
+
+def compact(args: argparse.Namespace) -> None:
+    store = TSDB(args.directory)
+    stats = store.compact(int(args.raw_retention_hours * 3_600_000), int(args.retention_days * 86_400_000))
+    log("tsdb", f"compacted {stats['segments']} segments ({stats['rows']} rows), expired {stats['expired']}")
+
+
+def add_retention_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--raw-retention-hours",
+        type=float,
+        default=RAW_RETENTION_HOURS,
+        help="Keep raw samples this long, then roll them up",
+    )
+    parser.add_argument("--retention-days", type=float, default=RETENTION_DAYS, help="Drop rollups after this long")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Columnar telemetry store with mmap reads and rollup compaction")
+    subparsers = parser.add_subparsers(dest="command")
+
+    ingest_parser = subparsers.add_parser("ingest", help="Subscribe to telemetry/# and alarms/# and store samples")
+    ingest_parser.add_argument("directory")
+    ingest_parser.add_argument("--client-id", default="tsdb")
+    ingest_parser.add_argument("--segment-minutes", type=int, default=SEGMENT_SECONDS // 60)
+    ingest_parser.add_argument("--rollup-seconds", type=int, default=ROLLUP_SECONDS)
+    ingest_parser.add_argument("--flush-interval", type=float, default=5.0, help="Seconds between appends to disk")
+    ingest_parser.add_argument("--compact-interval", type=float, default=300.0, help="Seconds between compactions")
+    ingest_parser.add_argument("--report-interval", type=float, default=60.0, help="Log counters (0 disables)")
+    add_retention_arguments(ingest_parser)
+
+    query_parser = subparsers.add_parser("query", help="Print raw samples or bucket aggregates as CSV")
+    query_parser.add_argument("directory")
+    query_parser.add_argument("device")
+    query_parser.add_argument("series", help="Sensor name, or alarm.<sensor> for alarm values")
+    query_parser.add_argument("--start", default=None, help="Epoch seconds (default: one hour before --end)")
+    query_parser.add_argument("--end", default=None, help="Epoch seconds (default: now)")
+    query_parser.add_argument("--bucket", type=float, default=None, help="Aggregate into buckets of N seconds")
+
+    info_parser = subparsers.add_parser("info", help="Summarize a store")
+    info_parser.add_argument("directory")
+    info_parser.add_argument("--series", action="store_true", help="List every series")
+
+    compact_parser = subparsers.add_parser("compact", help="Run one compaction pass")
+    compact_parser.add_argument("directory")
+    add_retention_arguments(compact_parser)
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        run_ingest(args)
+    elif args.command == "query":
+        query(args)
+    elif args.command == "info":
+        info(args)
+    elif args.command == "compact":
+        compact(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()